@@ -0,0 +1,171 @@
+import datetime
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from oneguardsite import metrics
+from .cache import get_activity_version
+from .models import ClientData, ClientHistory
+
+
+BUCKETS = ['hour', 'day', 'week', 'month']
+
+# Сколько корзин показывать без явного диапазона дат
+DEFAULT_BUCKETS = {'hour': 48, 'day': 30, 'week': 26, 'month': 12}
+MAX_BUCKETS = 1000
+
+# До скольких корзин считать условными COUNT вместо группировки по Trunc
+FILTERED_BUCKETS = 4
+
+# Корзина считается закрытой не сразу после окончания: запись, начатая до
+# границы, может закоммититься чуть позже, а история пишется с задержкой
+CLOSE_DELAY = datetime.timedelta(minutes=5)
+
+# Модель -> (поле времени, поле владельца для инженера, поля разбивки)
+SOURCES = {
+    'clients': (ClientData, 'created_at', 'engineer_id', {
+        'city': 'building_object__city_id',
+        'engineer': 'engineer_id',
+        'object_type': 'building_object__object_type',
+    }),
+    'history': (ClientHistory, 'timestamp', 'client_data__engineer_id', {
+        'city': 'client_data__building_object__city_id',
+        'engineer': 'user_id',
+        'object_type': 'client_data__building_object__object_type',
+    }),
+}
+SPLITS = ['city', 'engineer', 'object_type']
+
+
+def bucket_start(moment, bucket):
+    """Начало корзины с моментом moment в местной зоне (как у Trunc)"""
+    local = timezone.localtime(moment).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    if bucket != 'hour':
+        local = local.replace(hour=0)
+    if bucket == 'week':
+        local -= datetime.timedelta(days=local.weekday())
+    elif bucket == 'month':
+        local = local.replace(day=1)
+    return timezone.make_aware(local)
+
+
+def next_bucket(start, bucket):
+    if bucket == 'hour':
+        return start + datetime.timedelta(hours=1)
+    local = timezone.localtime(start).replace(tzinfo=None)
+    if bucket == 'day':
+        local += datetime.timedelta(days=1)
+    elif bucket == 'week':
+        local += datetime.timedelta(weeks=1)
+    else:
+        local = (local.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+    return timezone.make_aware(local)
+
+
+def bucket_range(bucket, date_from=None, date_to=None, now=None):
+    """Начала корзин от date_from до date_to включительно, не дальше текущей"""
+    now = now or timezone.now()
+    end = now
+    if date_to:
+        end = min(end, timezone.make_aware(
+            datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min)
+        ))
+    if date_from:
+        start = bucket_start(timezone.make_aware(datetime.datetime.combine(date_from, datetime.time.min)), bucket)
+    else:
+        start = bucket_start(end, bucket)
+        for _ in range(DEFAULT_BUCKETS[bucket] - 1):
+            start = bucket_start(start - datetime.timedelta(microseconds=1), bucket)
+
+    periods = []
+    while start < end:
+        if len(periods) == MAX_BUCKETS:
+            raise ValueError(f'Слишком много корзин: не больше {MAX_BUCKETS}')
+        periods.append(start)
+        start = next_bucket(start, bucket)
+    return periods
+
+
+def count_buckets(user, source, bucket, split, periods):
+    """{начало корзины: {значение разбивки: число}} по корзинам periods - одним запросом"""
+    model, time_field, owner_field, split_fields = SOURCES[source]
+    end = next_bucket(periods[-1], bucket)
+    queryset = model.objects.filter(**{f'{time_field}__gte': periods[0], f'{time_field}__lt': end}).order_by()
+    if user.role != 'admin':
+        queryset = queryset.filter(**{owner_field: user.pk})
+    groups = [split_fields[split]] if split else []
+
+    counts = {}
+    if len(periods) <= FILTERED_BUCKETS:
+        # Несколько открытых корзин - условными COUNT по границам: Trunc в
+        # SQLite вызывает функцию Python на каждую строку, а это основное время
+        bounds = list(zip(periods, periods[1:] + [end]))
+        aggregates = {
+            f'bucket{index}': Count('pk', filter=Q(**{f'{time_field}__gte': start, f'{time_field}__lt': stop}))
+            for index, (start, stop) in enumerate(bounds)
+        }
+        if groups:
+            rows = queryset.values(*groups).annotate(**aggregates)
+        else:
+            rows = [queryset.aggregate(**aggregates)]
+        for row in rows:
+            group = row[groups[0]] if groups else None
+            for index, period in enumerate(periods):
+                if row[f'bucket{index}']:
+                    counts.setdefault(period, {})[group] = row[f'bucket{index}']
+        return counts
+
+    rows = (
+        queryset
+        .annotate(period=Trunc(time_field, bucket))
+        .values_list('period', *groups)
+        .annotate(count=Count('pk'))
+    )
+    for row in rows:
+        group = row[1] if groups else None
+        counts.setdefault(row[0], {})[group] = row[-1]
+    return counts
+
+
+def activity_series(user, source='clients', bucket='day', split=None, date_from=None, date_to=None):
+    """Число записей по корзинам времени
+
+    Закрытые корзины не меняются, поэтому хранятся в кэше без срока: одна
+    запись на (видимость, модель, корзина, разбивка) со словарем уже
+    посчитанных корзин. Запрос к БД читает только открытые корзины и те
+    закрытые, которых еще нет в кэше. Изменения прошлого (удаление, перенос
+    записи, загрузка задним числом) меняют версию и сбрасывают весь кэш.
+    """
+    now = timezone.now()
+    periods = bucket_range(bucket, date_from, date_to, now)
+    if not periods:
+        return []
+    closed_before = bucket_start(now - CLOSE_DELAY, bucket)
+
+    scope = 'all' if user.role == 'admin' else f'user{user.pk}'
+    key = f'clients:activity:v{get_activity_version()}:{scope}:{source}:{bucket}:{split or "total"}'
+    closed = cache.get(key)
+    metrics.record_cache('activity', closed)
+    closed = closed or {}
+
+    missing = [period for period in periods if period < closed_before and period not in closed]
+    start = missing[0] if missing else closed_before
+    pending = [period for period in periods if period >= start]
+    counts = count_buckets(user, source, bucket, split, pending) if pending else {}
+    if missing:
+        for period in missing:
+            closed[period] = counts.get(period, {})
+        cache.set(key, closed, None)
+
+    series = []
+    for period in periods:
+        groups = closed[period] if period in closed else counts.get(period, {})
+        entry = {
+            'period': period if bucket == 'hour' else timezone.localtime(period).date(),
+            'count': sum(groups.values()),
+        }
+        if split:
+            entry['groups'] = {str(group): count for group, count in groups.items()}
+        series.append(entry)
+    return series
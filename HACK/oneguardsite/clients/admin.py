@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
 from .models import ClientData, ClientHistory
+from .search import search_clients
+
 
 @admin.register(ClientData)
 class ClientDataAdmin(admin.ModelAdmin):
@@ -14,6 +17,18 @@ class ClientDataAdmin(admin.ModelAdmin):
     search_fields = ('apartment_number', 'contact_phone', 'notes')
     readonly_fields = ('created_at', 'updated_at')
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск через полнотекстовый индекс вместо LIKE по search_fields.
+        # ChangeList сортирует до поиска, поэтому результаты идут по
+        # релевантности; сортировку по колонке, выбранную явно, возвращаем
+        if not search_term:
+            return queryset, False
+        results = search_clients(queryset, search_term)
+        if ORDER_VAR in request.GET:
+            results = results.order_by(*queryset.query.order_by)
+        return results, False
+
+
 @admin.register(ClientHistory)
 class ClientHistoryAdmin(admin.ModelAdmin):
     list_display = ('client_data', 'user', 'action', 'timestamp')
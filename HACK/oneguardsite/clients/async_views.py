@@ -0,0 +1,20 @@
+from rest_framework import status
+from oneguardsite.async_api import async_api_view, async_read_view, render
+from .reports import aget_city_report
+from .serializers import ClientReportSerializer
+from .views import ClientDataListView, ClientDataDetailView
+
+
+client_list = async_read_view(ClientDataListView)
+client_detail = async_read_view(ClientDataDetailView, 'retrieve')
+
+
+@async_api_view
+async def client_reports(request):
+    """Асинхронная версия отчета по городам"""
+    if request.user.role != 'admin':
+        return render(
+            {'error': 'Только администраторы могут просматривать отчеты'},
+            status.HTTP_403_FORBIDDEN
+        )
+    return render(ClientReportSerializer(await aget_city_report(), many=True).data)
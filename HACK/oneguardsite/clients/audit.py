@@ -0,0 +1,209 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from oneguardsite.db import write_transaction
+from users.models import User
+from .models import ClientData, ClientHistory
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class HistoryWriter:
+    """Фоновая запись ClientHistory пакетами
+
+    События складываются в очередь процесса и пишутся одним bulk_create,
+    когда набралось batch_size событий или прошло flush_interval секунд.
+    При остановке процесса очередь дописывается до конца. Если очередь
+    переполнена или асинхронный режим выключен (CLIENT_HISTORY_ASYNC = False,
+    например в тестах), запись идет сразу в текущем потоке.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=1.0, max_queue=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'failed': 0,
+            'written_sync': 0,
+            'flushes': 0,
+            'flush_seconds_total': 0.0,
+            'flush_seconds_max': 0.0,
+            'last_flush_seconds': 0.0,
+        }
+
+    @property
+    def asynchronous(self):
+        return getattr(settings, 'CLIENT_HISTORY_ASYNC', True)
+
+    def record(self, client_data_id, user_id, action):
+        """Добавляет запись истории; в асинхронном режиме - после коммита транзакции"""
+        event = ClientHistory(
+            client_data_id=client_data_id,
+            user_id=user_id,
+            action=action,
+            timestamp=timezone.now(),
+        )
+        if not self.asynchronous:
+            self.write_now([event])
+            return
+        transaction.on_commit(lambda: self.enqueue(event))
+
+    def enqueue(self, event):
+        self.start()
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Не теряем событие: пишем его сами, пока воркер разгребает очередь
+            self.write_now([event])
+            return
+        with self.lock:
+            self.stats['enqueued'] += 1
+
+    def write_now(self, events):
+        write_transaction(ClientHistory.objects.bulk_create)(events)
+        with self.lock:
+            self.stats['written_sync'] += len(events)
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='client-history-writer', daemon=True
+                )
+                self.thread.start()
+
+    def run(self):
+        try:
+            while True:
+                batch, stop = self.collect()
+                if batch:
+                    self.flush(batch)
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+    def collect(self):
+        """Ждет первое событие, затем добирает пакет до размера или до таймаута"""
+        batch = []
+        event = self.queue.get()
+        if event is _STOP:
+            return batch, True
+        batch.append(event)
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                event = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if event is _STOP:
+                return batch, True
+            batch.append(event)
+        return batch, False
+
+    def flush(self, batch):
+        close_old_connections()
+        started = time.perf_counter()
+        try:
+            write_transaction(ClientHistory.objects.bulk_create)(batch)
+            written = len(batch)
+        except Exception:
+            logger.exception('Не удалось записать пакет из %d событий истории', len(batch))
+            written = self.salvage(batch)
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.stats['failed'] += len(batch) - written
+            self.stats['written'] += written
+            self.stats['flushes'] += 1
+            self.stats['flush_seconds_total'] += elapsed
+            self.stats['flush_seconds_max'] = max(self.stats['flush_seconds_max'], elapsed)
+            self.stats['last_flush_seconds'] = elapsed
+
+    def salvage(self, batch):
+        """Пишет то, что можно, из пакета, который не удалось записать целиком
+
+        Обычная причина - клиент или пользователь удален раньше, чем пакет
+        дошел до БД: такие события отбрасываются, остальные пишутся повторно,
+        а если пакет снова не пишется - по одному. Теряются только плохие
+        события. Возвращает число записанных.
+        """
+        clients = set(ClientData.objects.filter(
+            pk__in={event.client_data_id for event in batch}
+        ).values_list('pk', flat=True))
+        users = set(User.objects.filter(
+            pk__in={event.user_id for event in batch}
+        ).values_list('pk', flat=True))
+        events = [event for event in batch if event.client_data_id in clients and event.user_id in users]
+        if len(events) < len(batch):
+            logger.warning('Отброшено %d событий истории удаленных клиентов или пользователей',
+                           len(batch) - len(events))
+        for event in events:
+            # bulk_create мог успеть назначить id до отката транзакции
+            event.pk = None
+            event._state.adding = True
+        try:
+            write_transaction(ClientHistory.objects.bulk_create)(events)
+            return len(events)
+        except Exception:
+            logger.exception('Пакет истории снова не записан, пишем по одному')
+
+        written = 0
+        for event in events:
+            event.pk = None
+            try:
+                write_transaction(event.save)(force_insert=True)
+                written += 1
+            except Exception:
+                logger.exception('Не удалось записать событие истории клиента %s', event.client_data_id)
+        return written
+
+    def shutdown(self, timeout=10):
+        """Дописывает очередь и останавливает воркер"""
+        thread = self.thread
+        if thread is None or not thread.is_alive():
+            return
+        self.queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning('Запись истории не завершилась за %s с, в очереди %d событий',
+                           timeout, self.queue.qsize())
+
+    def metrics(self):
+        with self.lock:
+            data = dict(self.stats)
+        data['queue_depth'] = self.queue.qsize()
+        data['flush_seconds_avg'] = (
+            data['flush_seconds_total'] / data['flushes'] if data['flushes'] else 0.0
+        )
+        data['asynchronous'] = self.asynchronous
+        return data
+
+
+history_writer = HistoryWriter(
+    batch_size=getattr(settings, 'CLIENT_HISTORY_BATCH_SIZE', 100),
+    flush_interval=getattr(settings, 'CLIENT_HISTORY_FLUSH_INTERVAL', 1.0),
+    max_queue=getattr(settings, 'CLIENT_HISTORY_MAX_QUEUE', 10000),
+)
+atexit.register(history_writer.shutdown)
+
+
+def record_history(client_data, user, action):
+    history_writer.record(client_data.pk, user.pk, action)
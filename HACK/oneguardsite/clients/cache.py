@@ -0,0 +1,40 @@
+from oneguardsite.caching import aget_version, bump_version, get_version
+
+
+DATA_VERSION_KEY = 'clients:data_version'
+
+# Версия прошлых данных для закрытых корзин рядов активности (clients/activity.py):
+# меняется, только когда изменилось уже прошедшее время, а не с каждой новой записью
+ACTIVITY_VERSION_KEY = 'clients:activity_version'
+
+
+def get_data_version():
+    """Текущая версия данных клиентов"""
+    return get_version(DATA_VERSION_KEY)
+
+
+async def aget_data_version():
+    return await aget_version(DATA_VERSION_KEY)
+
+
+def bump_data_version():
+    """Инвалидирует все закэшированные результаты, зависящие от ClientData"""
+    bump_version(DATA_VERSION_KEY)
+
+
+def versioned_key(*parts):
+    """Ключ кэша, привязанный к текущей версии данных"""
+    return ':'.join(['clients', f'v{get_data_version()}', *map(str, parts)])
+
+
+async def aversioned_key(*parts):
+    return ':'.join(['clients', f'v{await aget_data_version()}', *map(str, parts)])
+
+
+def get_activity_version():
+    return get_version(ACTIVITY_VERSION_KEY)
+
+
+def bump_activity_version():
+    """Сбрасывает закрытые корзины рядов активности"""
+    bump_version(ACTIVITY_VERSION_KEY)
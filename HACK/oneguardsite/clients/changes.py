@@ -0,0 +1,146 @@
+import base64
+import datetime
+import json
+
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from objects.models import City, BuildingObject
+from objects.serializers import CitySerializer, BuildingObjectSerializer
+from oneguardsite.pagination import CursorEncoder
+from .models import ClientData, Tombstone
+from .serializers import ClientDataSerializer
+
+
+# Сколько изменений каждого вида отдается за один запрос
+CHANGES_LIMIT = 500
+
+# Изменения моложе этого интервала откладываются до следующего запроса:
+# транзакция, начатая раньше, может зафиксироваться позже и получить
+# updated_at меньше уже выданной отметки
+SAFETY_WINDOW = datetime.timedelta(seconds=2)
+
+
+class InvalidWatermark(Exception):
+    pass
+
+
+def _clients(user):
+    return (
+        ClientData.objects
+        .visible_to(user)
+        .select_related('engineer', 'building_object__city')
+    )
+
+
+def _cities(user):
+    return City.objects.all()
+
+
+def _objects(user):
+    return BuildingObject.objects.select_related('city')
+
+
+# Раздел ответа -> (набор записей, сериализатор, вид отметки удаления)
+RESOURCES = {
+    'clients': (_clients, ClientDataSerializer, 'client'),
+    'cities': (_cities, CitySerializer, 'city'),
+    'objects': (_objects, BuildingObjectSerializer, 'object'),
+}
+
+
+def encode_watermark(watermark):
+    payload = json.dumps(watermark, cls=CursorEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_watermark(token):
+    if not token:
+        return {}
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        watermark = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        for name in RESOURCES:
+            if watermark.get(name) is not None:
+                updated_at, pk = watermark[name]
+                watermark[name] = [parse_datetime(updated_at), int(pk)]
+                if watermark[name][0] is None:
+                    raise ValueError
+        watermark['deleted'] = int(watermark.get('deleted') or 0)
+    except Exception:
+        raise InvalidWatermark('Неверная отметка синхронизации')
+    return watermark
+
+
+def record_reassignments(moves):
+    """Отметки для прежних инженеров записей, переданных другому инженеру
+
+    moves - пары (id записи, прежний инженер): запись выпадает из выборки
+    прежнего инженера, и его устройство должно удалить ее у себя.
+    """
+    Tombstone.objects.bulk_create([
+        Tombstone(model='client', object_id=pk, owner_id=owner_id)
+        for pk, owner_id in moves if owner_id is not None
+    ])
+
+
+def collect_changes(user, token=None):
+    """Изменения после отметки token: новые и измененные записи и удаления
+
+    Для каждого вида записей отдается не больше CHANGES_LIMIT строк по
+    порядку (updated_at, id); has_more означает, что нужно запросить еще раз
+    с новой отметкой.
+    """
+    watermark = decode_watermark(token)
+    cutoff = timezone.now() - SAFETY_WINDOW
+    changes = {}
+    has_more = False
+
+    for name, (get_queryset, serializer_class, _) in RESOURCES.items():
+        queryset = get_queryset(user).filter(updated_at__lte=cutoff)
+        if watermark.get(name):
+            updated_at, pk = watermark[name]
+            queryset = queryset.filter(
+                Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk)
+            )
+        rows = list(queryset.order_by('updated_at', 'id')[:CHANGES_LIMIT + 1])
+        if len(rows) > CHANGES_LIMIT:
+            has_more = True
+            rows = rows[:CHANGES_LIMIT]
+        if rows:
+            watermark[name] = [rows[-1].updated_at, rows[-1].id]
+        changes[name] = {
+            'updated': serializer_class(rows, many=True).data,
+            'deleted': [],
+        }
+
+    if 'deleted' not in watermark:
+        # Новое устройство получает записи целиком, прошлые удаления ему не нужны
+        watermark['deleted'] = Tombstone.objects.aggregate(last=Max('id'))['last'] or 0
+
+    tombstones = Tombstone.objects.filter(
+        id__gt=watermark['deleted'], deleted_at__lte=cutoff
+    )
+    if user.role != 'admin':
+        tombstones = tombstones.filter(~Q(model='client') | Q(owner_id=user.pk))
+    # Отметки о передаче записи не касаются тех, кому она по-прежнему видна:
+    # нового инженера, администратора и прежнего, если запись к нему вернулась
+    tombstones = tombstones.exclude(model='client', object_id__in=_clients(user).values('pk'))
+    tombstones = list(
+        tombstones.order_by('id').values_list('id', 'model', 'object_id')[:CHANGES_LIMIT + 1]
+    )
+    if len(tombstones) > CHANGES_LIMIT:
+        has_more = True
+        tombstones = tombstones[:CHANGES_LIMIT]
+    if tombstones:
+        watermark['deleted'] = tombstones[-1][0]
+
+    by_kind = {kind: name for name, (_, _, kind) in RESOURCES.items()}
+    for _, kind, object_id in tombstones:
+        changes[by_kind[kind]]['deleted'].append(object_id)
+
+    return {
+        **changes,
+        'watermark': encode_watermark(watermark),
+        'has_more': has_more,
+    }
@@ -0,0 +1,107 @@
+import datetime
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from objects.models import BuildingObject
+from oneguardsite import metrics
+from .cache import versioned_key
+from .models import ClientData
+from .reports import SERVICE_CODES
+from .search import get_backend
+
+
+DASHBOARD_CACHE_TIMEOUT = 10 * 60
+
+# Сколько дней показывает график активности без явного диапазона дат
+ACTIVITY_DAYS = 7
+MAX_ACTIVITY_DAYS = 366
+
+
+def build_dashboard(user, date_from=None, date_to=None, q=None, **filters):
+    """Ряды для графиков админ-панели, посчитанные группировкой в БД"""
+    today = timezone.localdate()
+    clients = (
+        ClientData.objects
+        .visible_to(user)
+        .filter_by(date_from=date_from, date_to=date_to, **filters)
+        .order_by()
+    )
+    # Поиск - подзапросом, чтобы группировки не тянули за собой ранг
+    if q:
+        clients = clients.filter(pk__in=get_backend().search(ClientData.objects.order_by(), q).values('pk'))
+
+    # Итоги и интерес к услугам - одним запросом
+    week_ago = timezone.now() - datetime.timedelta(days=7)
+    totals = clients.aggregate(
+        total_clients=Count('id'),
+        new_this_week=Count('id', filter=Q(created_at__gt=week_ago)),
+        **{
+            code: Count('id', filter=ClientData.services_q('interested_services', [code]))
+            for code in SERVICE_CODES
+        }
+    )
+
+    type_counts = dict(
+        clients
+        .values_list('building_object__object_type')
+        .annotate(count=Count('id'))
+    )
+
+    # Активность по дням: либо выбранный диапазон, либо последние 7 дней
+    activity_to = min(date_to or today, today)
+    activity_from = date_from or activity_to - datetime.timedelta(days=ACTIVITY_DAYS - 1)
+    activity_from = max(
+        activity_from, activity_to - datetime.timedelta(days=MAX_ACTIVITY_DAYS - 1)
+    )
+    day_counts = dict(
+        clients
+        .filter(created_at__date__gte=activity_from, created_at__date__lte=activity_to)
+        .annotate(day=TruncDate('created_at'))
+        .values_list('day')
+        .annotate(count=Count('id'))
+    )
+    days = (activity_to - activity_from).days + 1
+
+    service_labels = dict(ClientData.SERVICE_CHOICES)
+    return {
+        'total_clients': totals['total_clients'],
+        'new_this_week': totals['new_this_week'],
+        'types': [
+            {'object_type': code, 'label': label, 'count': type_counts[code]}
+            for code, label in BuildingObject.OBJECT_TYPES
+            if type_counts.get(code)
+        ],
+        'services': [
+            {'service': code, 'label': service_labels[code], 'count': totals[code]}
+            for code in SERVICE_CODES
+            if totals[code]
+        ],
+        'activity': [
+            {'date': day.isoformat(), 'count': day_counts.get(day, 0)}
+            for day in (activity_from + datetime.timedelta(days=i) for i in range(days))
+        ],
+    }
+
+
+def get_dashboard(user, **filters):
+    """Закэшированная сводка; ключ учитывает видимость данных, фильтры и текущую дату"""
+    scope = 'all' if user.role == 'admin' else f'user{user.pk}'
+    key = versioned_key(
+        'dashboard', scope, timezone.localdate(),
+        *(f'{name}={_key_value(filters.get(name))}' for name in sorted(filters))
+    )
+    data = cache.get(key)
+    metrics.record_cache('dashboard', data)
+    if data is None:
+        data = build_dashboard(user, **filters)
+        cache.set(key, data, DASHBOARD_CACHE_TIMEOUT)
+    return data
+
+
+def _key_value(value):
+    # Списки услуг - через запятую, чтобы ключ не содержал пробелов
+    if isinstance(value, list):
+        return ','.join(sorted(value))
+    return value or ''
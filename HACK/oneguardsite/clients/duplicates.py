@@ -0,0 +1,85 @@
+from django.db.models import Q
+from .models import ClientData, visibility_filter
+from .phones import MIN_PHONE_DIGITS, normalize_phone, phone_prefix
+
+
+# Сколько прежних визитов показывать в форме и отмечать у записи пакета
+LOOKUP_LIMIT = 10
+
+
+def prior_visits(user, phone=None, building_object=None, apartment_number=None, limit=LOOKUP_LIMIT):
+    """Прежние визиты по номеру телефона или по квартире, новые первыми
+
+    Номер ищется по индексу (contact_phone_normalized, building_object).
+    Форма вызывает поиск по мере ввода, поэтому среди видимых пользователю
+    записей подходит и начало номера. Чужие записи находятся только по
+    полному номеру или по той же квартире: иначе перебором начал номеров
+    можно было бы узнать адреса по телефонам. Квартира - по индексу
+    (building_object, apartment_number).
+    """
+    conditions = []
+    prefix = phone_prefix(phone)
+    if len(prefix) >= MIN_PHONE_DIGITS:
+        # Диапазон, а не startswith: LIKE в SQLite индекс не использует
+        conditions.append(Q(
+            contact_phone_normalized__gte=prefix, contact_phone_normalized__lt=prefix + ':',
+            **visibility_filter(user)
+        ))
+        conditions.append(Q(contact_phone_normalized=normalize_phone(phone)))
+    if building_object and apartment_number:
+        conditions.append(Q(building_object_id=building_object, apartment_number=apartment_number))
+    if not conditions:
+        return ClientData.objects.none()
+
+    query = conditions[0]
+    for condition in conditions[1:]:
+        query |= condition
+    return (
+        ClientData.objects
+        .filter(query)
+        .select_related('engineer', 'building_object')
+        .order_by('-created_at', '-id')[:limit]
+    )
+
+
+def find_duplicates(entries, by_place=True, limit=LOOKUP_LIMIT):
+    """Прежние записи для пакета одним запросом
+
+    entries - [(телефон, id объекта, квартира)]; возвращает список id
+    (новые первыми) для каждой записи. С by_place=False совпадение квартиры
+    не считается повтором, а совпадения номера в той же квартире не
+    учитываются - так загрузка из файла отмечает только чужие адреса.
+    """
+    phones = [normalize_phone(phone) for phone, _, _ in entries]
+    numbers = {phone for phone in phones if len(phone) >= MIN_PHONE_DIGITS}
+    query = Q(contact_phone_normalized__in=numbers)
+    if by_place:
+        # Условие на каждый объект со своими квартирами: пара IN по объектам и
+        # квартирам захватила бы все совпавшие номера квартир во всех объектах
+        apartments = {}
+        for _, building_object, apartment_number in entries:
+            apartments.setdefault(building_object, set()).add(apartment_number)
+        for building_object, apartment_numbers in apartments.items():
+            query |= Q(building_object_id=building_object, apartment_number__in=apartment_numbers)
+    elif not numbers:
+        return [[] for _ in entries]
+
+    by_phone, by_apartment = {}, {}
+    for pk, phone, building_object, apartment_number in (
+        ClientData.objects
+        .filter(query)
+        .order_by('-id')
+        .values_list('id', 'contact_phone_normalized', 'building_object_id', 'apartment_number')
+    ):
+        if phone in numbers:
+            by_phone.setdefault(phone, []).append((pk, (building_object, apartment_number)))
+        by_apartment.setdefault((building_object, apartment_number), []).append(pk)
+
+    result = []
+    for phone, (_, building_object, apartment_number) in zip(phones, entries):
+        place = (building_object, apartment_number)
+        found = [pk for pk, where in by_phone.get(phone, []) if by_place or where != place]
+        if by_place:
+            found = sorted(set(found) | set(by_apartment.get(place, [])), reverse=True)
+        result.append(found[:limit])
+    return result
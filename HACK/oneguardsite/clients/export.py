@@ -0,0 +1,134 @@
+import csv
+import tempfile
+from decimal import Decimal
+from functools import reduce
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import serializers
+from .serializers import ClientDataSerializer
+
+
+FORMATS = ('csv', 'xlsx')
+
+# Сколько строк читается из БД за один раз
+CHUNK_SIZE = 2000
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def get_columns():
+    """Колонки выгрузки - те же поля, что отдает ClientDataSerializer"""
+    columns = []
+    for name, field in ClientDataSerializer().fields.items():
+        attrs = field.source_attrs
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            # Для связей берем id из самой записи, без обращения к объекту
+            attrs = [f'{field.source}_id']
+            field = serializers.IntegerField()
+        columns.append((name, field, attrs))
+    return columns
+
+
+def export_queryset(queryset):
+    return (
+        queryset
+        .select_related('engineer', 'building_object__city')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def iter_rows(queryset, columns):
+    for client in export_queryset(queryset):
+        yield [reduce(getattr, attrs, client) for _, _, attrs in columns]
+
+
+def iter_csv(queryset):
+    columns = get_columns()
+    writer = csv.writer(Echo())
+    # BOM, чтобы Excel правильно открыл кириллицу
+    yield '\ufeff'
+    yield writer.writerow([name for name, _, _ in columns])
+    for row in iter_rows(queryset, columns):
+        yield writer.writerow([
+            csv_value(field, value) for (_, field, _), value in zip(columns, row)
+        ])
+
+
+def csv_value(field, value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ', '.join(map(str, value))
+    return field.to_representation(value)
+
+
+def xlsx_value(value):
+    if isinstance(value, list):
+        return ', '.join(map(str, value))
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, 'tzinfo') and value.tzinfo is not None:
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+def write_xlsx(queryset, target):
+    """Пишет XLSX в режиме constant_memory: строки сразу сбрасываются на диск"""
+    try:
+        import xlsxwriter
+    except ImportError:
+        raise ExportUnavailable('Для выгрузки в XLSX нужен пакет xlsxwriter')
+
+    columns = get_columns()
+    workbook = xlsxwriter.Workbook(target, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Клиенты')
+    date_format = workbook.add_format({'num_format': 'dd.mm.yyyy hh:mm'})
+
+    worksheet.write_row(0, 0, [name for name, _, _ in columns])
+    for row_index, row in enumerate(iter_rows(queryset, columns), start=1):
+        for col_index, value in enumerate(row):
+            value = xlsx_value(value)
+            if value is None:
+                continue
+            if hasattr(value, 'year') and hasattr(value, 'hour'):
+                worksheet.write_datetime(row_index, col_index, value, date_format)
+            else:
+                worksheet.write(row_index, col_index, value)
+    workbook.close()
+
+
+def export_response(queryset, file_format):
+    filename = f'clients_export_{timezone.localdate().isoformat()}.{file_format}'
+
+    if file_format == 'xlsx':
+        # Архив XLSX собирается только целиком, поэтому пишем его во временный
+        # файл и отдаем файл потоком - память не зависит от числа строк
+        output = tempfile.TemporaryFile()
+        try:
+            write_xlsx(queryset, output)
+        except Exception:
+            output.close()
+            raise
+        output.seek(0)
+        return FileResponse(
+            output, as_attachment=True, filename=filename,
+            content_type=XLSX_CONTENT_TYPE
+        )
+
+    response = StreamingHttpResponse(
+        iter_csv(queryset), content_type='text/csv; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,112 @@
+import heapq
+import math
+
+from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Cast
+
+
+# Размер ячейки сетки в градусах (~1.1 км по широте)
+GRID_STEP = 0.01
+
+# Ячеек в строке сетки: долгота от -180 до 180 включительно
+LON_CELLS = int(round(360 / GRID_STEP)) + 1
+
+EARTH_RADIUS = 6371000  # м
+
+# Ограничения запроса, чтобы число диапазонов ячеек оставалось небольшим
+MAX_RADIUS = 50000  # м
+MAX_BBOX_SPAN = 1.0  # градусов
+
+
+def cell_expression():
+    """Номер ячейки в БД: строка по широте * LON_CELLS + столбец по долготе
+
+    Координаты сдвинуты в неотрицательный диапазон, поэтому CAST к целому
+    совпадает с округлением вниз - так же, как в cell_of.
+    """
+    row = Cast((F('latitude') + 90.0) / GRID_STEP, models.BigIntegerField())
+    col = Cast((F('longitude') + 180.0) / GRID_STEP, models.BigIntegerField())
+    return row * LON_CELLS + col
+
+
+def _row(latitude):
+    return int((latitude + 90.0) / GRID_STEP)
+
+
+def _col(longitude):
+    return int((longitude + 180.0) / GRID_STEP)
+
+
+def cell_of(latitude, longitude):
+    return _row(latitude) * LON_CELLS + _col(longitude)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Расстояние по дуге большого круга в метрах"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(latitude, longitude, radius):
+    """Прямоугольник (min_lat, min_lon, max_lat, max_lon), содержащий круг"""
+    d_lat = math.degrees(radius / EARTH_RADIUS)
+    cos_lat = math.cos(math.radians(latitude))
+    # У полюса круг накрывает все долготы
+    d_lon = 180.0 if cos_lat < 1e-6 else min(180.0, d_lat / cos_lat)
+    return (
+        max(-90.0, latitude - d_lat), longitude - d_lon,
+        min(90.0, latitude + d_lat), longitude + d_lon,
+    )
+
+
+def _lon_ranges(min_lon, max_lon):
+    # Прямоугольник через 180-й меридиан делится на две части
+    if max_lon - min_lon >= 360:
+        return [(-180.0, 180.0)]
+    if min_lon < -180:
+        return [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return [(min_lon, max_lon)]
+
+
+def bbox_q(min_lat, min_lon, max_lat, max_lon, **scope):
+    """Условие для прямоугольника: диапазоны geo_cell по строкам сетки
+
+    Каждый диапазон читается по индексу на geo_cell, поэтому число
+    просмотренных строк зависит от площади, а не от размера таблицы.
+    Точные границы по latitude/longitude проверяются поверх ячеек.
+    scope (например, engineer_id) повторяется в каждом диапазоне, чтобы БД
+    взяла составной индекс (engineer, geo_cell), а не индекс по инженеру.
+    """
+    condition = Q()
+    for lon_from, lon_to in _lon_ranges(min_lon, max_lon):
+        col_from, col_to = _col(lon_from), _col(lon_to)
+        cells = Q()
+        for row in range(_row(min_lat), _row(max_lat) + 1):
+            cells |= Q(geo_cell__range=(row * LON_CELLS + col_from, row * LON_CELLS + col_to), **scope)
+        condition |= cells & Q(longitude__gte=lon_from, longitude__lte=lon_to)
+    return condition & Q(latitude__gte=min_lat, latitude__lte=max_lat)
+
+
+def nearby(points, latitude, longitude, radius=None, limit=None):
+    """Уточняет кандидатов точным расстоянием и оставляет limit ближних
+
+    points - кортежи (id, latitude, longitude). Возвращает пары
+    (расстояние в метрах, id) от ближних к дальним.
+    """
+    found = []
+    for pk, point_latitude, point_longitude in points:
+        distance = haversine(latitude, longitude, point_latitude, point_longitude)
+        if radius is None or distance <= radius:
+            found.append((distance, pk))
+    if limit is None:
+        return sorted(found)
+    return heapq.nsmallest(limit, found)
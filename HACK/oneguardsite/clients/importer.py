@@ -0,0 +1,220 @@
+import itertools
+
+from django.utils import timezone
+from objects.importer import CityCache, ObjectImporter
+from objects.models import BuildingObject
+from oneguardsite.db import write_transaction
+from oneguardsite.importing import CHUNK_SIZE, MAX_ERRORS, Importer, update_rows
+from users.models import User
+from . import rollups
+from .cache import bump_activity_version, bump_data_version
+from .changes import record_reassignments
+from .duplicates import find_duplicates
+from .models import ClientData, ClientHistory
+from .serializers import ClientDataImportSerializer
+
+
+# Поля, которые перезаписываются у существующей записи клиента
+IMPORT_UPDATE_FIELDS = [
+    'engineer', 'contact_phone', 'used_services', 'interested_services',
+    'provider_rating', 'desired_price', 'notes', 'latitude', 'longitude',
+    'created_at', 'updated_at',
+]
+
+
+class ClientImporter(Importer):
+    """Клиенты в формате выгрузки (clients/export.py)
+
+    Объект - по building_object (id) или по city_name и
+    building_object_address, инженер - по engineer_name (логин), иначе
+    загружающий пользователь. Ключ - (объект, квартира): последняя запись
+    по квартире обновляется, иначе создается новая. Пустые ячейки при
+    обновлении не меняют сохраненные значения. Строки, номер которых уже
+    встречался по другому адресу, попадают в prior_visits отчета.
+    """
+    required_columns = ('apartment_number',)
+
+    def __init__(self, user=None, chunk_size=CHUNK_SIZE):
+        super().__init__(user, chunk_size)
+        self.cities = CityCache()
+        self.engineers = {}
+        self.fields = set(ClientDataImportSerializer().fields)
+        self.report.update(flagged=0, prior_visits=[])
+
+    def check_header(self, header):
+        super().check_header(header)
+        if 'building_object' not in header and not {'city_name', 'building_object_address'} <= set(header):
+            raise ImportFormatError(
+                'В файле нет колонки building_object или пары city_name и building_object_address'
+            )
+
+    def import_chunk(self, chunk):
+        objects = self.resolve_objects(record for _, record in chunk)
+        engineers = self.resolve_engineers(record.get('engineer_name') for _, record in chunk)
+
+        pending = []
+        for number, record in chunk:
+            errors = {}
+            building_object = record.get('building_object')
+            if building_object in ('', None):
+                key = (record.get('city_name'), record.get('building_object_address'))
+                building_object = objects.get(key)
+                if building_object is None:
+                    errors['building_object'] = [f'Объект не найден: {key[0]}, {key[1]}']
+            engineer = engineers.get(record.get('engineer_name')) if record.get('engineer_name') else self.user
+            if engineer is None:
+                errors['engineer_name'] = ['Инженер не найден' if record.get('engineer_name') else 'Укажите инженера']
+            if errors:
+                self.add_error(number, errors)
+                continue
+            item = {name: value for name, value in record.items() if name in self.fields and value != ''}
+            item['building_object'] = building_object
+            pending.append((number, engineer, item))
+        if not pending:
+            return
+
+        serializer = ClientDataImportSerializer(data=[item for _, _, item in pending], many=True)
+        serializer.is_valid(raise_exception=True)
+        rows, numbers = [], []
+        for (number, engineer, _), data, errors in zip(
+            pending, serializer.validated_data, serializer.item_errors
+        ):
+            if errors:
+                self.add_error(number, errors)
+            else:
+                rows.append(dict(data, engineer_id=engineer.pk))
+                numbers.append(number)
+        if not rows:
+            return
+
+        # Совпадение квартиры - это обновление записи, повтором считается только номер
+        found = find_duplicates([
+            (row.get('contact_phone'), row['building_object'].pk, row['apartment_number'])
+            for row in rows
+        ], by_place=False)
+        for number, ids in zip(numbers, found):
+            if ids:
+                self.add_prior_visits(number, ids)
+
+        created, updated = self.save(rows, self.user)
+        self.report['created'] += created
+        self.report['updated'] += updated
+        bump_data_version()
+        # Записи загружаются задним числом, в уже закрытые корзины активности
+        bump_activity_version()
+
+    def add_prior_visits(self, number, ids):
+        self.report['flagged'] += 1
+        if len(self.report['prior_visits']) < MAX_ERRORS:
+            self.report['prior_visits'].append({'row': number, 'ids': ids})
+
+    def resolve_objects(self, records):
+        """(город, адрес) -> id объекта для строк без building_object"""
+        keys = {
+            (record.get('city_name'), record.get('building_object_address'))
+            for record in records if record.get('building_object') in ('', None)
+        }
+        keys = {key for key in keys if all(key)}
+        if not keys:
+            return {}
+        city_ids = self.cities.resolve({city for city, _ in keys})
+        names = {city_id: name for name, city_id in city_ids.items()}
+        objects = {}
+        for city_id, address, pk in (
+            BuildingObject.objects
+            .filter(city_id__in=[city_ids[city] for city, _ in keys if city in city_ids],
+                    address__in={address for _, address in keys})
+            .order_by('-id')
+            .values_list('city_id', 'address', 'id')
+        ):
+            objects[(names[city_id], address)] = pk
+        return objects
+
+    def resolve_engineers(self, names):
+        """Кэш «логин -> пользователь»; ненайденные тоже запоминаются"""
+        missing = {name for name in names if name} - set(self.engineers)
+        if missing:
+            found = {user.username: user for user in User.objects.filter(username__in=missing)}
+            self.engineers.update({name: found.get(name) for name in missing})
+        return self.engineers
+
+    @staticmethod
+    @write_transaction
+    def save(rows, user=None):
+        """Записи, их история и счетчики - одной транзакцией на пачку"""
+        # Сначала только ключи: выборка по двум IN захватывает и чужие квартиры
+        # тех же объектов, а целиком грузятся лишь совпавшие записи
+        keys = {(row['building_object'].pk, row['apartment_number']) for row in rows}
+        matched = {}
+        for pk, building_object_id, apartment_number in (
+            ClientData.objects
+            .filter(building_object_id__in={key[0] for key in keys},
+                    apartment_number__in={key[1] for key in keys})
+            .order_by('id')
+            .values_list('id', 'building_object_id', 'apartment_number')
+        ):
+            if (building_object_id, apartment_number) in keys:
+                matched[(building_object_id, apartment_number)] = pk
+        clients = ClientData.objects.select_related('building_object').in_bulk(matched.values())
+        existing = {key: clients[pk] for key, pk in matched.items()}
+
+        new, changed, removed, dates, owners = {}, {}, [], {}, {}
+        for row in rows:
+            row = dict(row)
+            created_at = row.pop('created_at', None)
+            key = (row['building_object'].pk, row['apartment_number'])
+            client = existing.get(key) or new.get(key)
+            if client is None:
+                client = new[key] = ClientData(**row)
+            else:
+                if client.pk and client.pk not in changed:
+                    removed.append(rollups.snapshot(client))
+                    changed[client.pk] = client
+                    owners[client.pk] = client.engineer_id
+                for name, value in row.items():
+                    setattr(client, name, value)
+            if created_at:
+                dates[key] = created_at
+
+        now = timezone.now()
+        created = ClientData.objects.bulk_create(new.values())
+        for key, client in itertools.chain(new.items(), existing.items()):
+            if key in dates:
+                client.created_at = dates[key]
+        # auto_now_add при вставке ставит текущее время - возвращаем даты визитов
+        update_rows(ClientData, [client for key, client in new.items() if key in dates], ['created_at'])
+        for client in changed.values():
+            client.updated_at = now
+        update_rows(ClientData, changed.values(), IMPORT_UPDATE_FIELDS)
+        # _update_rows обходит сигналы, поэтому отметки о передаче записей
+        # другому инженеру пишутся здесь
+        record_reassignments([
+            (pk, owners[pk]) for pk, client in changed.items() if client.engineer_id != owners[pk]
+        ])
+
+        ClientHistory.objects.bulk_create(
+            [
+                ClientHistory(
+                    client_data=client, user_id=user.pk if user else client.engineer_id,
+                    action=f'Загружена из файла запись для квартиры {client.apartment_number}',
+                    timestamp=client.created_at,
+                )
+                for client in created
+            ]
+            + [
+                ClientHistory(
+                    client_data=client, user_id=user.pk if user else client.engineer_id,
+                    action=f'Обновлена из файла запись для квартиры {client.apartment_number}',
+                    timestamp=now,
+                )
+                for client in changed.values()
+            ]
+        )
+        rollups.apply_changes(
+            added=[rollups.snapshot(client) for client in itertools.chain(created, changed.values())],
+            removed=removed,
+        )
+        return len(created), len(rows) - len(created)
+
+
+IMPORTERS = {'objects': ObjectImporter, 'clients': ClientImporter}
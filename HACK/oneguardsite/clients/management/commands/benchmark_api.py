@@ -0,0 +1,319 @@
+import itertools
+import json
+import platform
+import sqlite3
+import statistics
+import time
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, reverse
+from clients.audit import history_writer
+from clients.models import ClientData
+from clients.seed import generate
+from objects.models import BuildingObject, City
+from oneguardsite import urls
+from oneguardsite.db import temporary_database
+from users.models import User
+from users.serializers import CustomTokenObtainPairSerializer
+
+
+DEFAULT_OUTPUT = Path(settings.BASE_DIR) / 'benchmarks' / 'api_baseline.json'
+
+# Изменение p50, начиная с которого сравнение с прошлым прогоном выделяется
+REGRESSION_THRESHOLD = 0.2
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет все маршруты /api/ через тестовый клиент Django на синтетических '
+        'данных во временной базе и пишет p50/p95/p99, запросы к БД и пропускную '
+        'способность в JSON-файл, чтобы изменения производительности были видны в diff'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=20000, help='Сколько клиентов сгенерировать')
+        parser.add_argument('--engineers', type=int, default=40, help='Сколько инженеров')
+        parser.add_argument('--cities', type=int, default=10, help='Сколько городов')
+        parser.add_argument('--objects-per-city', type=int, default=50, help='Объектов в каждом городе')
+        parser.add_argument('--seed', type=int, default=42, help='Зерно генератора данных')
+        parser.add_argument('--requests', type=int, default=30, help='Замеров на каждый сценарий')
+        parser.add_argument('--warmup', type=int, default=3, help='Прогревочных запросов перед замером')
+        parser.add_argument('--output', default=str(DEFAULT_OUTPUT), help='Куда записать результаты (JSON)')
+        parser.add_argument('--only', help='Только сценарии, в названии которых есть эта строка')
+
+    def handle(self, *args, **options):
+        output = Path(options['output'])
+        previous = json.loads(output.read_text(encoding='utf-8')) if output.exists() else None
+
+        with temporary_database(), override_settings(
+            DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            data = generate(
+                cities=options['cities'], objects_per_city=options['objects_per_city'],
+                engineers=options['engineers'], clients=options['clients'], seed=options['seed'],
+            )
+            self.stdout.write(
+                f'Данные: {data["clients"]} клиентов, {data["history"]} событий истории, '
+                f'{data["objects"]} объектов'
+            )
+            scenarios = self.scenarios()
+            results = {}
+            for scenario in scenarios:
+                if options['only'] and options['only'] not in scenario['name']:
+                    continue
+                results[scenario['name']] = result = self.measure(scenario, options)
+                self.stdout.write(
+                    f'{scenario["name"]}: p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс, '
+                    f'p99 {result["p99_ms"]} мс, запросов к БД {result["queries"]}, '
+                    f'{result["rps"]} запр/с'
+                )
+                if result['errors']:
+                    self.stderr.write(f'  неожиданные ответы: {result["errors"]}')
+            # История пишется в фоне - дописываем ее, пока временная база на месте
+            history_writer.shutdown()
+
+        uncovered = sorted(self.api_routes() - {scenario['route'] for scenario in scenarios})
+        for route in uncovered:
+            self.stderr.write(f'Маршрут без сценария: {route}')
+
+        report = {
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+            },
+            'data': dict(data, seed=options['seed']),
+            'requests_per_scenario': options['requests'],
+            'uncovered_routes': uncovered,
+            'endpoints': results,
+        }
+        if previous:
+            self.compare(previous.get('endpoints', {}), results)
+            if options['only']:
+                # Частичный прогон обновляет только свои сценарии
+                report['endpoints'] = dict(previous.get('endpoints', {}), **results)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(
+            json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + '\n', encoding='utf-8'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {output}'))
+
+    def scenarios(self):
+        """Сценарии: название, метод, маршрут, пользователь и данные запроса"""
+        admin = User.objects.get(username='seed_admin')
+        engineer = (
+            User.objects.filter(role='engineer')
+            .order_by('-client_stats__total_clients', 'id').first()
+        )
+        other = User.objects.filter(role='engineer').exclude(pk=engineer.pk).order_by('id').first()
+        tokens = {user: CustomTokenObtainPairSerializer.get_token(user) for user in (admin, engineer)}
+        client_ids = list(
+            ClientData.objects.filter(engineer=engineer).order_by('id').values_list('id', flat=True)
+        )
+        client_id = client_ids[0]
+        visit = ClientData.objects.values('contact_phone', 'building_object', 'apartment_number').get(pk=client_id)
+        center = (
+            ClientData.objects.filter(engineer=engineer, latitude__isnull=False)
+            .values('latitude', 'longitude').first()
+        )
+        city = City.objects.order_by('id').first()
+        building_object = BuildingObject.objects.filter(city=city).order_by('id').first()
+        counter = itertools.count()
+        deletable = iter(reversed(client_ids))
+
+        def new_client():
+            return {
+                'building_object': building_object.pk,
+                'apartment_number': str(next(counter) % 1000),
+                'contact_phone': '+7 900 000-00-00',
+                'interested_services': ['internet'],
+            }
+
+        def sync_batch():
+            batch = next(counter)
+            return {'data': [
+                dict(new_client(), client_key=f'bench-{batch}-{index}') for index in range(20)
+            ]}
+
+        def new_user():
+            number = next(counter)
+            return {
+                'username': f'bench_user{number}', 'password': 'Bench-pass-2024',
+                'password_confirm': 'Bench-pass-2024', 'role': 'engineer',
+            }
+
+        # Загрузки повторяют один и тот же файл: после прогрева это обновление записей
+        objects_csv = 'city_name,name,address,object_type\n' + ''.join(
+            f'{city.name},Объект {number},"ул. Нагрузочная, {number}",cafe\n' for number in range(200)
+        )
+        clients_csv = 'building_object,apartment_number,contact_phone,interested_services\n' + ''.join(
+            f'{building_object.pk},{5000 + number},+7 900 200-{number // 100:02d}-{number % 100:02d},internet\n'
+            for number in range(200)
+        )
+
+        def csv_file(name, text):
+            return lambda: {'file': SimpleUploadedFile(name, text.encode(), content_type='text/csv')}
+
+        def get(name, route, user, params=None, args=(), **extra):
+            return dict(name=name, method='GET', route=route, user=user, args=args, params=params, **extra)
+
+        def send(name, method, route, user, data, args=(), **extra):
+            return dict(name=name, method=method, route=route, user=user, args=args, data=data, **extra)
+
+        def upload(name, route, user, data, **extra):
+            return send(name, 'POST', route, user, data, multipart=True, **extra)
+
+        return [
+            get('clients (инженер)', 'client-list', engineer),
+            get('clients (админ)', 'client-list', admin),
+            get('clients с фильтром', 'client-list', admin, {'interested': 'security', 'page_size': 100}),
+            get('clients/search', 'client-search', admin, {'q': 'интернет'}),
+            get('clients/nearby', 'client-nearby', engineer,
+                {'lat': center['latitude'], 'lon': center['longitude'], 'radius': 2000}),
+            get('clients/prior-visits', 'client-prior-visits', engineer, visit),
+            get('clients/prior-visits (начало номера)', 'client-prior-visits', engineer,
+                {'phone': ''.join(filter(str.isdigit, visit['contact_phone']))[:8]}),
+            get('clients/export csv', 'client-export', engineer, {'file_format': 'csv'}, requests=3),
+            get('clients/<id>', 'client-detail', engineer, args=(client_id,)),
+            get('clients/<id>/history', 'client-history', engineer, args=(client_id,)),
+            get('reports', 'client-reports', admin),
+            get('dashboard', 'dashboard', admin),
+            get('reports/activity (дни)', 'client-activity', admin),
+            get('reports/activity (недели, по инженерам)', 'client-activity', admin,
+                {'source': 'history', 'bucket': 'week', 'split': 'engineer'}),
+            get('sync/changes', 'sync-changes', engineer),
+            get('metrics', 'metrics', admin),
+            get('metrics/history-writer', 'history-writer-metrics', admin),
+            get('cities', 'city-list', engineer),
+            get('cities (304)', 'city-list', engineer, conditional=True, status=304),
+            get('objects', 'object-list', engineer),
+            get('objects/<id>', 'object-detail', engineer, args=(building_object.pk,)),
+            get('cities/<id>/objects', 'objects-by-city', engineer, args=(city.pk,)),
+            get('users', 'user-list', admin),
+            get('users/me', 'current-user', engineer),
+            get('users/<id>', 'user-detail', admin, args=(other.pk,)),
+            get('users/statistics', 'user-statistics', admin),
+            get('async clients', 'async-client-list', engineer),
+            get('async clients/<id>', 'async-client-detail', engineer, args=(client_id,)),
+            get('async reports', 'async-client-reports', admin),
+            get('async cities', 'async-city-list', engineer),
+            get('async objects', 'async-object-list', engineer),
+            get('async objects/<id>', 'async-object-detail', engineer, args=(building_object.pk,)),
+            get('async cities/<id>/objects', 'async-objects-by-city', engineer, args=(city.pk,)),
+            get('async users/me', 'async-current-user', engineer),
+            # Запись - после чтения, чтобы не менять данные для сценариев выше
+            send('POST clients', 'POST', 'client-list', engineer, new_client, status=201),
+            send('PATCH clients/<id>', 'PATCH', 'client-detail', engineer,
+                 lambda: {'provider_rating': next(counter) % 5 + 1}, args=(client_id,)),
+            send('DELETE clients/<id>', 'DELETE', 'client-detail', engineer, None,
+                 args=lambda: (next(deletable),), status=204),
+            send('POST sync/offline (20 записей)', 'POST', 'sync-offline', engineer, sync_batch),
+            upload('POST clients/import (200 строк)', 'client-import', admin,
+                   csv_file('clients.csv', clients_csv), requests=10),
+            upload('POST objects/import (200 строк)', 'object-import', admin,
+                   csv_file('objects.csv', objects_csv), requests=10),
+            send('PATCH users/<id>', 'PATCH', 'user-detail', admin,
+                 lambda: {'phone': f'+7 900 {next(counter) % 1000:03d}-00-00'}, args=(other.pk,)),
+            # Хеширование пароля намеренно медленное - здесь хватит нескольких замеров
+            # Имя login есть и у страницы /login/ фронтенда, поэтому путь задан явно
+            send('POST auth/login', 'POST', 'login', None,
+                 {'username': engineer.username, 'password': 'password'},
+                 path='/api/auth/login/', requests=5),
+            send('POST auth/refresh', 'POST', 'token_refresh', None,
+                 {'refresh': str(tokens[engineer])}),
+            send('POST auth/register', 'POST', 'register', None, new_user, status=201, requests=5),
+            send('POST users/create', 'POST', 'user-create', admin, new_user, status=201, requests=5),
+        ]
+
+    def measure(self, scenario, options):
+        client = Client()
+        if scenario['user'] is not None:
+            token = CustomTokenObtainPairSerializer.get_token(scenario['user']).access_token
+            client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        expected = scenario.get('status', 200)
+        if scenario.get('conditional'):
+            etag = self.request(client, scenario)['ETag']
+            client.defaults['HTTP_IF_NONE_MATCH'] = etag
+
+        for _ in range(options['warmup']):
+            self.request(client, scenario)
+        latencies, errors = [], {}
+        count = min(options['requests'], scenario.get('requests', options['requests']))
+        for _ in range(count):
+            started = time.perf_counter()
+            response = self.request(client, scenario)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != expected:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+        # Запросы к БД считаются отдельным прогоном, чтобы учет не влиял на время
+        with CaptureQueriesContext(connection) as queries:
+            self.request(client, scenario)
+
+        return {
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p95_ms': round(self.percentile(latencies, 95), 2),
+            'p99_ms': round(self.percentile(latencies, 99), 2),
+            'queries': len(queries),
+            'rps': round(1000 * len(latencies) / sum(latencies), 1),
+            'status': expected,
+            'errors': {str(code): number for code, number in sorted(errors.items())},
+        }
+
+    @staticmethod
+    def request(client, scenario):
+        args = scenario['args']() if callable(scenario['args']) else scenario['args']
+        path = scenario.get('path') or reverse(scenario['route'], args=args)
+        if scenario['method'] == 'GET':
+            response = client.get(path, scenario['params'])
+        elif scenario.get('multipart'):
+            response = client.post(path, scenario['data']())
+        else:
+            data = scenario['data']() if callable(scenario['data']) else scenario['data']
+            response = client.generic(
+                scenario['method'], path,
+                json.dumps(data) if data is not None else '', content_type='application/json'
+            )
+        if response.streaming:
+            # Потоковый ответ учитывается целиком, как его читает клиент
+            b''.join(response.streaming_content)
+        return response
+
+    @staticmethod
+    def percentile(values, percent):
+        if len(values) < 2:
+            return values[0]
+        return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+    @staticmethod
+    def api_routes():
+        """Имена всех маршрутов под /api/"""
+        names = set()
+        for pattern in urls.urlpatterns:
+            if isinstance(pattern, URLResolver) and str(pattern.pattern).startswith('api/'):
+                names.update(item.name for item in pattern.url_patterns if item.name)
+        return names
+
+    def compare(self, previous, results):
+        """Печатает заметные изменения относительно прошлого прогона"""
+        for name, result in results.items():
+            old = previous.get(name)
+            if not old:
+                continue
+            change = (result['p50_ms'] - old['p50_ms']) / old['p50_ms'] if old['p50_ms'] else 0
+            notes = []
+            if abs(change) >= REGRESSION_THRESHOLD:
+                notes.append(f'p50 {old["p50_ms"]} -> {result["p50_ms"]} мс ({change:+.0%})')
+            if result['queries'] != old['queries']:
+                notes.append(f'запросов к БД {old["queries"]} -> {result["queries"]}')
+            if notes:
+                worse = change > 0 or result['queries'] > old['queries']
+                style = self.style.WARNING if worse else self.style.SUCCESS
+                self.stdout.write(style(f'{name}: ' + ', '.join(notes)))
+
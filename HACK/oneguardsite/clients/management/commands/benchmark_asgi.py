@@ -0,0 +1,118 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from oneguardsite.asgi import application as asgi_application
+from oneguardsite.wsgi import application as wsgi_application
+from users.models import User
+from users.serializers import CustomTokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает синхронный (WSGI, пул потоков) и асинхронный (ASGI, asyncio) '
+        'API на чтение: много инженеров одновременно опрашивают свои списки. '
+        'Запросы идут прямо в приложения из wsgi.py и asgi.py, без сети и веб-сервера'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engineers', type=int, default=50, help='Сколько инженеров опрашивают одновременно')
+        parser.add_argument('--requests', type=int, default=20, help='Сколько запросов делает каждый инженер')
+        parser.add_argument('--threads', type=int, default=8, help='Размер пула потоков для WSGI')
+        parser.add_argument('--path', default='clients/?page_size=50', help='Адрес относительно /api/ и /api/async/')
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(is_active=True).order_by('id')[:options['engineers']])
+        if not users:
+            raise CommandError('Нет пользователей для замера; заполните БД')
+        # Инженеров больше, чем пользователей в БД - токены используются по кругу
+        tokens = [
+            str(CustomTokenObtainPairSerializer.get_token(user).access_token) for user in users
+        ]
+        tokens = [tokens[index % len(tokens)] for index in range(options['engineers'])]
+        path, _, query = options['path'].partition('?')
+
+        results = [
+            ('WSGI /api/', self.run_wsgi(f'/api/{path}', query, tokens, options)),
+            ('ASGI /api/async/', asyncio.run(self.run_asgi(f'/api/async/{path}', query, tokens, options))),
+        ]
+        for name, (elapsed, latencies, statuses) in results:
+            bad = sum(1 for status in statuses if status != 200)
+            if bad:
+                self.stderr.write(f'{name}: {bad} ответов не 200 ({sorted(set(statuses))})')
+            self.stdout.write(
+                f'{name}: {len(latencies) / elapsed:.0f} запросов/с, '
+                f'p50 {self.percentile(latencies, 50):.1f} мс, '
+                f'p95 {self.percentile(latencies, 95):.1f} мс, '
+                f'p99 {self.percentile(latencies, 99):.1f} мс'
+            )
+
+    def run_wsgi(self, path, query, tokens, options):
+        def request(token):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_AUTHORIZATION': f'Bearer {token}',
+                'wsgi.input': BytesIO(), 'wsgi.errors': BytesIO(), 'wsgi.url_scheme': 'http',
+                'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+                'wsgi.version': (1, 0),
+            }
+            status = []
+            started = time.perf_counter()
+            body = b''.join(wsgi_application(environ, lambda code, headers: status.append(code)))
+            elapsed = time.perf_counter() - started
+            return int(status[0].split()[0]), elapsed, len(body)
+
+        calls = [token for token in tokens for _ in range(options['requests'])]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            done = list(pool.map(request, calls))
+        return self.summary(started, done)
+
+    async def run_asgi(self, path, query, tokens, options):
+        async def request(token):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+                'query_string': query.encode(), 'root_path': '',
+                'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+                'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+            }
+            messages = []
+            inbox = asyncio.Queue()
+            inbox.put_nowait({'type': 'http.request', 'body': b'', 'more_body': False})
+
+            async def receive():
+                # После тела запроса Django ждет отключения клиента - оно не наступит
+                return await inbox.get()
+
+            async def send(message):
+                messages.append(message)
+
+            started = time.perf_counter()
+            await asgi_application(scope, receive, send)
+            elapsed = time.perf_counter() - started
+            body = b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body')
+            return messages[0]['status'], elapsed, len(body)
+
+        async def engineer(token):
+            # Каждый инженер опрашивает последовательно, инженеры - параллельно
+            return [await request(token) for _ in range(options['requests'])]
+
+        started = time.perf_counter()
+        done = await asyncio.gather(*(engineer(token) for token in tokens))
+        return self.summary(started, [item for items in done for item in items])
+
+    @staticmethod
+    def summary(started, done):
+        elapsed = time.perf_counter() - started
+        return elapsed, [latency * 1000 for _, latency, _ in done], [status for status, _, _ in done]
+
+    @staticmethod
+    def percentile(values, percent):
+        if len(values) < 2:
+            return values[0] if values else 0.0
+        return statistics.quantiles(values, n=100)[percent - 1]
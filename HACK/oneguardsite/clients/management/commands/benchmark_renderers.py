@@ -0,0 +1,70 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from oneguardsite.compression import brotli
+from oneguardsite.renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson
+from objects.models import BuildingObject
+from objects.views import building_object_list_fast
+from clients.models import ClientData
+from clients.views import ClientDataListView
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает рендеры ответа: время и размер JSON/orjson/MessagePack, без сжатия и со сжатием'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Сколько строк брать из таблицы')
+        parser.add_argument('--repeat', type=int, default=5, help='Сколько раз повторять замер')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        renderers = [('json', JSONRenderer())]
+        if orjson is not None:
+            renderers.append(('orjson', ORJSONRenderer()))
+        if msgpack is not None:
+            renderers.append(('msgpack', MessagePackRenderer()))
+        cases = [
+            (
+                'clients',
+                ClientData.objects
+                .select_related('engineer', 'building_object__city')
+                .order_by('-created_at', '-id')[:rows],
+                ClientDataListView.fast_serializer,
+            ),
+            (
+                'objects',
+                BuildingObject.objects.select_related('city').order_by('id')[:rows],
+                building_object_list_fast,
+            ),
+        ]
+
+        for name, queryset, fast in cases:
+            data = fast.represent(list(fast.rows(queryset)))
+            if not data:
+                raise CommandError(f'Нет данных для замера ({name}); заполните БД')
+
+            base = None
+            for label, renderer in renderers:
+                elapsed = self.measure(repeat, lambda: renderer.render(data))
+                content = renderer.render(data)
+                base = base or elapsed
+                sizes = [f'{len(content)} байт', f'gzip {len(gzip.compress(content, 6))}']
+                if brotli is not None:
+                    sizes.append(f'br {len(brotli.compress(content, quality=5))}')
+                self.stdout.write(
+                    f'{name} {label}: {len(data)} строк, {elapsed / len(data) * 1e6:.2f} мкс/строка '
+                    f'(x{base / elapsed:.1f}), ' + ', '.join(sizes)
+                )
+
+    @staticmethod
+    def measure(repeat, func):
+        # Лучшее время из нескольких прогонов (только рендер, данные готовы)
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
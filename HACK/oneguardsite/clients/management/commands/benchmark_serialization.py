@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from objects.models import BuildingObject
+from objects.serializers import BuildingObjectListSerializer
+from objects.views import building_object_list_fast
+from clients.models import ClientData
+from clients.serializers import ClientDataSerializer
+from clients.views import ClientDataListView
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает стоимость сериализации строки: ModelSerializer и быстрый путь через values()'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Сколько строк брать из таблицы')
+        parser.add_argument('--repeat', type=int, default=5, help='Сколько раз повторять замер')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        cases = [
+            (
+                'clients',
+                ClientData.objects
+                .select_related('engineer', 'building_object__city')
+                .order_by('-created_at', '-id')[:rows],
+                ClientDataSerializer,
+                ClientDataListView.fast_serializer,
+            ),
+            (
+                'objects',
+                BuildingObject.objects.select_related('city').order_by('id')[:rows],
+                BuildingObjectListSerializer,
+                building_object_list_fast,
+            ),
+        ]
+
+        for name, queryset, serializer_class, fast in cases:
+            count = queryset.count()
+            if not count:
+                raise CommandError(f'Нет данных для замера ({name}); заполните БД')
+
+            slow = self.measure(repeat, lambda: serializer_class(list(queryset), many=True).data)
+            quick = self.measure(repeat, lambda: fast.represent(list(fast.rows(queryset))))
+            self.stdout.write(
+                f'{name}: {count} строк, ModelSerializer {slow / count * 1e6:.1f} мкс/строка, '
+                f'values() {quick / count * 1e6:.1f} мкс/строка, '
+                f'ускорение x{slow / quick:.1f}'
+            )
+
+    @staticmethod
+    def measure(repeat, func):
+        # Лучшее время из нескольких прогонов (запрос к БД + сериализация)
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
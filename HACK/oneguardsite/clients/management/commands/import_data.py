@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from clients.importer import IMPORTERS
+from oneguardsite.importing import ImportFormatError, ImportUnavailable, file_format_for
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает объекты или клиентов из CSV/XLSX пачками: объекты - по ключу '
+        '(город, адрес), клиенты - по ключу (объект, квартира); существующие '
+        'записи обновляются, ошибки выводятся с номерами строк'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS), help='Что загружаем')
+        parser.add_argument('path', help='Путь к файлу CSV или XLSX')
+        parser.add_argument('--file-format', help='csv или xlsx; по умолчанию по расширению файла')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Кодировка CSV (например, cp1251)')
+        parser.add_argument('--user', help='Логин инженера для строк без engineer_name; он же автор истории')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Строк в одной транзакции')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Пользователь {options["user"]} не найден')
+
+        job = IMPORTERS[options['kind']](user=user, chunk_size=options['chunk_size'])
+        started = time.perf_counter()
+
+        def progress(report):
+            self.stderr.write(
+                f'\r{report["rows"]} строк, {report["rows"] / (time.perf_counter() - started):.0f} строк/с',
+                ending=''
+            )
+
+        try:
+            file_format = file_format_for(options['path'], options['file_format'])
+            with open(options['path'], 'rb') as source:
+                report = job.run(source, file_format, encoding=options['encoding'], progress=progress)
+        except OSError as e:
+            raise CommandError(f'Не удалось открыть файл: {e}')
+        except (ImportFormatError, ImportUnavailable) as e:
+            raise CommandError(f'{e}; до ошибки обработано строк: {job.report["rows"]}')
+        self.stderr.write('')
+
+        for error in report['errors']:
+            self.stdout.write(f'Строка {error["row"]}: {error["errors"]}')
+        if report['invalid'] > len(report['errors']):
+            self.stdout.write(f'... и еще {report["invalid"] - len(report["errors"])} строк с ошибками')
+        for flagged in report.get('prior_visits', []):
+            self.stdout.write(f'Строка {flagged["row"]}: номер уже встречался в записях {flagged["ids"]}')
+        if report.get('flagged', 0) > len(report.get('prior_visits', [])):
+            self.stdout.write(f'... и еще {report["flagged"] - len(report["prior_visits"])} строк с известным номером')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {report["rows"]} строк за {time.perf_counter() - started:.1f} с: '
+            f'создано {report["created"]}, обновлено {report["updated"]}, '
+            f'с ошибками {report["invalid"]}'
+        ))
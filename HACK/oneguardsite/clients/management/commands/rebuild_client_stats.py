@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from clients import rollups
+from clients.cache import bump_data_version
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает таблицы счетчиков клиентов и сверяет их с живым пересчетом'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить счетчики, ничего не изменяя',
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            rollups.rebuild()
+            bump_data_version()
+            self.stdout.write('Счетчики пересобраны')
+
+        mismatches = rollups.find_mismatches()
+        for model_name, key, field, expected, actual in mismatches:
+            self.stderr.write(
+                f'{model_name}[{key}].{field}: ожидалось {expected}, в таблице {actual}'
+            )
+        if mismatches:
+            raise CommandError(f'Найдено расхождений: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS('Счетчики совпадают с данными'))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from clients.seed import generate
+
+
+class Command(BaseCommand):
+    help = 'Заполняет БД синтетическими городами, объектами, инженерами, клиентами и историей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cities', type=int, default=10, help='Сколько городов')
+        parser.add_argument('--objects-per-city', type=int, default=50, help='Объектов в каждом городе')
+        parser.add_argument('--engineers', type=int, default=40, help='Сколько инженеров')
+        parser.add_argument('--clients', type=int, default=20000, help='Сколько записей клиентов')
+        parser.add_argument('--history-per-client', type=float, default=2.0, help='Среднее число событий истории на клиента')
+        parser.add_argument('--days', type=int, default=365, help='За сколько последних дней распределить визиты')
+        parser.add_argument('--seed', type=int, default=42, help='Зерно генератора случайных чисел')
+        parser.add_argument('--prefix', default='seed', help='Префикс логинов созданных пользователей')
+        parser.add_argument('--password', default='password', help='Пароль созданных пользователей')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = generate(
+            cities=options['cities'],
+            objects_per_city=options['objects_per_city'],
+            engineers=options['engineers'],
+            clients=options['clients'],
+            history_per_client=options['history_per_client'],
+            days=options['days'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            password=options['password'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано за {time.perf_counter() - started:.1f} с: городов {counts["cities"]}, '
+            f'объектов {counts["objects"]}, инженеров {counts["engineers"]}, '
+            f'клиентов {counts["clients"]}, событий истории {counts["history"]}'
+        ))
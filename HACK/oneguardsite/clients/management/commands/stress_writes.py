@@ -0,0 +1,193 @@
+import multiprocessing
+import os
+import time
+import traceback
+
+from django.core.management.base import BaseCommand, CommandError
+from oneguardsite.db import temporary_database
+
+
+def run_worker(database, engineer_id, building_object_id, worker, options, results):
+    """Один процесс-воркер: создает, правит и синхронизирует записи через API-представления"""
+    try:
+        report = write_as_engineer(database, engineer_id, building_object_id, worker, options)
+    except Exception:
+        report = {'worker': worker, 'error': traceback.format_exc()}
+    results.put(report)
+
+
+def write_as_engineer(database, engineer_id, building_object_id, worker, options):
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oneguardsite.settings')
+    # Кэш временной базы, как в temporary_database (общий для всех воркеров)
+    os.environ['CACHE_DIR'] = os.path.join(os.path.dirname(database), 'cache')
+    django.setup()
+
+    from django.db import connection
+    connection.settings_dict['NAME'] = database
+
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from clients.audit import history_writer
+    from clients.models import ClientData
+    from clients.views import ClientDataDetailView, ClientDataListView, sync_offline_data
+    from oneguardsite.db import write_stats
+    from users.models import User
+
+    engineer = User.objects.get(pk=engineer_id)
+    factory = APIRequestFactory()
+    create = ClientDataListView.as_view()
+    detail = ClientDataDetailView.as_view()
+
+    def call(view, request, **kwargs):
+        force_authenticate(request, user=engineer)
+        return view(request, **kwargs)
+
+    def item(number, index=0):
+        return {
+            'building_object': building_object_id,
+            'apartment_number': f'{worker}-{number}-{index}',
+            'contact_phone': f'+7 9{worker:02d} {number:03d}-{index:02d}-00',
+            'used_services': ['internet'],
+            'provider_rating': number % 5 + 1,
+        }
+
+    acknowledged, failed, updated = [], 0, 0
+    for number in range(options['operations']):
+        kind = number % 3
+        if kind == 0:
+            response = call(create, factory.post('/api/clients/', item(number), format='json'))
+            if response.status_code == 201:
+                # Сериализатор создания не отдает id - ищем по уникальному номеру квартиры
+                acknowledged.append(response.data['apartment_number'])
+            else:
+                failed += 1
+        elif kind == 1:
+            batch = [
+                dict(item(number, index), client_key=f'stress-{worker}-{number}-{index}')
+                for index in range(options['batch_size'])
+            ]
+            response = call(
+                sync_offline_data, factory.post('/api/sync/offline/', {'data': batch}, format='json')
+            )
+            if response.status_code == 200:
+                acknowledged.extend(entry['apartment_number'] for entry in batch)
+            else:
+                failed += 1
+        else:
+            client = (
+                ClientData.objects.filter(engineer=engineer)
+                .order_by('-id').values_list('id', flat=True).first()
+            )
+            if client is None:
+                continue
+            response = call(
+                detail, factory.patch(f'/api/clients/{client}/', {'provider_rating': 5}, format='json'),
+                pk=client
+            )
+            if response.status_code == 200:
+                updated += 1
+            else:
+                failed += 1
+
+    # Дописываем историю из фоновой очереди до выхода процесса
+    history_writer.shutdown()
+    return {
+        'worker': worker,
+        'acknowledged': acknowledged,
+        'failed': failed,
+        'updated': updated,
+        'retries': write_stats['retries'],
+        'gave_up': write_stats['gave_up'],
+        'history_failed': history_writer.metrics()['failed'],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочная проверка записи в SQLite из нескольких процессов: воркеры '
+        'одновременно создают, правят и синхронизируют клиентов во временной '
+        'базе, затем проверяется, что ни одна подтвержденная запись не потеряна'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='Сколько процессов пишут одновременно')
+        parser.add_argument('--operations', type=int, default=60, help='Сколько запросов делает каждый процесс')
+        parser.add_argument('--batch-size', type=int, default=20, help='Записей в одном пакете синхронизации')
+        parser.add_argument('--keep', action='store_true', help='Не удалять временную базу после проверки')
+
+    def handle(self, *args, **options):
+        with temporary_database(keep=options['keep']) as database:
+            self.run(database, options)
+            if options['keep']:
+                self.stdout.write(f'База оставлена: {database}')
+
+    def run(self, database, options):
+        from django.db import connection
+        from clients import rollups
+        from clients.models import ClientData, ClientHistory
+        from objects.models import BuildingObject, City
+        from users.models import User
+
+        city = City.objects.create(name='Нагрузочный город')
+        building_object = BuildingObject.objects.create(
+            name='Нагрузочный объект', address='ул. Тестовая, 1', object_type='mcd', city=city
+        )
+        engineers = [
+            User.objects.create_user(f'stress{worker}', password=None, role='engineer')
+            for worker in range(options['processes'])
+        ]
+        connection.close()
+
+        # spawn: каждый воркер - чистый процесс со своими соединениями, как у gunicorn
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        workers = [
+            context.Process(
+                target=run_worker,
+                args=(database, engineer.pk, building_object.pk, worker, options, results),
+            )
+            for worker, engineer in enumerate(engineers)
+        ]
+        started = time.perf_counter()
+        for process in workers:
+            process.start()
+        reports = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        errors = [report['error'] for report in reports if 'error' in report]
+        if errors:
+            raise CommandError('Воркер завершился с ошибкой:\n' + errors[0])
+
+        acknowledged = [number for report in reports for number in report['acknowledged']]
+        stored = set(ClientData.objects.values_list('apartment_number', flat=True))
+        lost = [number for number in acknowledged if number not in stored]
+        extra = stored - set(acknowledged)
+        failed = sum(report['failed'] for report in reports)
+        history = ClientHistory.objects.count()
+        expected_history = len(acknowledged) + sum(report['updated'] for report in reports)
+        mismatches = rollups.find_mismatches()
+
+        self.stdout.write(
+            f'{len(workers)} процессов за {elapsed:.1f} с: подтверждено {len(acknowledged)} записей, '
+            f'изменений {sum(report["updated"] for report in reports)}, '
+            f'в базе {len(stored)}; истории {history} из {expected_history}; '
+            f'повторов при блокировке {sum(report["retries"] for report in reports)}, '
+            f'отказов {failed + sum(report["gave_up"] for report in reports)}'
+        )
+
+        problems = []
+        if lost:
+            problems.append(f'потеряно {len(lost)} подтвержденных записей')
+        if extra:
+            problems.append(f'{len(extra)} записей без подтверждения')
+        if failed:
+            problems.append(f'{failed} запросов завершились ошибкой')
+        if history != expected_history or any(report['history_failed'] for report in reports):
+            problems.append(f'истории {history} вместо {expected_history}')
+        if mismatches:
+            problems.append(f'{len(mismatches)} расхождений в счетчиках')
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Потерянных записей нет'))
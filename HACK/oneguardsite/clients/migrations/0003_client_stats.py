@@ -0,0 +1,135 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Состав услуг и счетчиков на момент миграции: clients.rollups может
+# меняться вместе с моделью, а миграция должна считать по этой схеме
+SERVICE_CODES = ['internet', 'tv', 'phone', 'security', 'smart_home']
+
+TARGETS = [
+    ('CityClientStats', 'building_object__city_id'),
+    ('BuildingObjectClientStats', 'building_object_id'),
+    ('EngineerClientStats', 'engineer_id'),
+]
+
+
+def build_client_stats(apps, schema_editor):
+    ClientData = apps.get_model('clients', 'ClientData')
+    groups = {model_name: {} for model_name, _ in TARGETS}
+    rows = ClientData.objects.values(
+        'used_services', 'interested_services', 'provider_rating', 'desired_price',
+        *(key_field for _, key_field in TARGETS)
+    )
+    for row in rows.iterator(chunk_size=2000):
+        values = {'total_clients': 1}
+        for prefix in ('used', 'interested'):
+            for code in set(row[f'{prefix}_services'] or []) & set(SERVICE_CODES):
+                values[f'{prefix}_{code}'] = 1
+        if row['provider_rating'] is not None:
+            values['rating_sum'] = row['provider_rating']
+            values['rating_count'] = 1
+        if row['desired_price'] is not None:
+            values['price_sum'] = row['desired_price']
+            values['price_count'] = 1
+        for model_name, key_field in TARGETS:
+            group = groups[model_name].setdefault(row[key_field], {})
+            for field, value in values.items():
+                group[field] = group.get(field, 0) + value
+
+    for model_name, _ in TARGETS:
+        model = apps.get_model('clients', model_name)
+        model.objects.bulk_create(
+            (model(pk=key, **values) for key, values in groups[model_name].items()),
+            batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0002_initial'),
+        ('objects', '0001_initial'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuildingObjectClientStats',
+            fields=[
+                ('total_clients', models.IntegerField(default=0)),
+                ('used_internet', models.IntegerField(default=0)),
+                ('used_tv', models.IntegerField(default=0)),
+                ('used_phone', models.IntegerField(default=0)),
+                ('used_security', models.IntegerField(default=0)),
+                ('used_smart_home', models.IntegerField(default=0)),
+                ('interested_internet', models.IntegerField(default=0)),
+                ('interested_tv', models.IntegerField(default=0)),
+                ('interested_phone', models.IntegerField(default=0)),
+                ('interested_security', models.IntegerField(default=0)),
+                ('interested_smart_home', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('price_count', models.IntegerField(default=0)),
+                ('building_object', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='client_stats', serialize=False, to='objects.buildingobject')),
+            ],
+            options={
+                'verbose_name': 'Статистика клиентов по объекту',
+                'verbose_name_plural': 'Статистика клиентов по объектам',
+            },
+        ),
+        migrations.CreateModel(
+            name='CityClientStats',
+            fields=[
+                ('total_clients', models.IntegerField(default=0)),
+                ('used_internet', models.IntegerField(default=0)),
+                ('used_tv', models.IntegerField(default=0)),
+                ('used_phone', models.IntegerField(default=0)),
+                ('used_security', models.IntegerField(default=0)),
+                ('used_smart_home', models.IntegerField(default=0)),
+                ('interested_internet', models.IntegerField(default=0)),
+                ('interested_tv', models.IntegerField(default=0)),
+                ('interested_phone', models.IntegerField(default=0)),
+                ('interested_security', models.IntegerField(default=0)),
+                ('interested_smart_home', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('price_count', models.IntegerField(default=0)),
+                ('city', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='client_stats', serialize=False, to='objects.city')),
+            ],
+            options={
+                'verbose_name': 'Статистика клиентов по городу',
+                'verbose_name_plural': 'Статистика клиентов по городам',
+            },
+        ),
+        migrations.CreateModel(
+            name='EngineerClientStats',
+            fields=[
+                ('total_clients', models.IntegerField(default=0)),
+                ('used_internet', models.IntegerField(default=0)),
+                ('used_tv', models.IntegerField(default=0)),
+                ('used_phone', models.IntegerField(default=0)),
+                ('used_security', models.IntegerField(default=0)),
+                ('used_smart_home', models.IntegerField(default=0)),
+                ('interested_internet', models.IntegerField(default=0)),
+                ('interested_tv', models.IntegerField(default=0)),
+                ('interested_phone', models.IntegerField(default=0)),
+                ('interested_security', models.IntegerField(default=0)),
+                ('interested_smart_home', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('price_count', models.IntegerField(default=0)),
+                ('engineer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='client_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Статистика клиентов по инженеру',
+                'verbose_name_plural': 'Статистика клиентов по инженерам',
+            },
+        ),
+        migrations.RunPython(build_client_stats, migrations.RunPython.noop),
+    ]
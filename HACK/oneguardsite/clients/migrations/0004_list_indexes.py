@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_client_stats'),
+        ('objects', '0002_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clientdata',
+            index=models.Index(fields=['engineer', '-created_at', '-id'], name='clientdata_engineer_created'),
+        ),
+        migrations.AddIndex(
+            model_name='clientdata',
+            index=models.Index(fields=['-created_at', '-id'], name='clientdata_created'),
+        ),
+        migrations.AddIndex(
+            model_name='clienthistory',
+            index=models.Index(fields=['client_data', '-timestamp', '-id'], name='clienthistory_client_time'),
+        ),
+    ]
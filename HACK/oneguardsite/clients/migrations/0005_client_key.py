@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0004_list_indexes'),
+        ('objects', '0002_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientdata',
+            name='client_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='clientdata',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_key__isnull', False)), fields=('engineer', 'client_key'), name='clientdata_engineer_client_key'),
+        ),
+    ]
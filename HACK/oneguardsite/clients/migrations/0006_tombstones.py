@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0005_client_key'),
+        ('objects', '0003_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('client', 'Данные клиента'), ('city', 'Город'), ('object', 'Объект')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('owner_id', models.BigIntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Удаленная запись',
+                'verbose_name_plural': 'Удаленные записи',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='clientdata',
+            index=models.Index(fields=['engineer', 'updated_at', 'id'], name='clientdata_engineer_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='clientdata',
+            index=models.Index(fields=['updated_at', 'id'], name='clientdata_updated'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:32
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0006_tombstones'),
+        ('objects', '0003_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientdata',
+            name='geo_cell',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('latitude'), '+', models.Value(90.0)), '/', models.Value(0.01)), models.BigIntegerField()), '*', models.Value(36001)), '+', django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('longitude'), '+', models.Value(180.0)), '/', models.Value(0.01)), models.BigIntegerField())), output_field=models.BigIntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='clientdata',
+            index=models.Index(fields=['engineer', 'geo_cell'], name='clientdata_engineer_geo'),
+        ),
+        migrations.AddIndex(
+            model_name='clientdata',
+            index=models.Index(fields=['geo_cell'], name='clientdata_geo'),
+        ),
+    ]
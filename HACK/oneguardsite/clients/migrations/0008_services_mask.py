@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:36
+
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0007_geo_cell'),
+        ('objects', '0003_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientdata',
+            name='interested_services_mask',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.Case(models.When(models.Q(('interested_services__icontains', '"internet"')), then=models.Value(1)), default=models.Value(0), output_field=models.IntegerField()), '+', models.Case(models.When(models.Q(('interested_services__icontains', '"tv"')), then=models.Value(2)), default=models.Value(0), output_field=models.IntegerField())), '+', models.Case(models.When(models.Q(('interested_services__icontains', '"phone"')), then=models.Value(4)), default=models.Value(0), output_field=models.IntegerField())), '+', models.Case(models.When(models.Q(('interested_services__icontains', '"security"')), then=models.Value(8)), default=models.Value(0), output_field=models.IntegerField())), '+', models.Case(models.When(models.Q(('interested_services__icontains', '"smart_home"')), then=models.Value(16)), default=models.Value(0), output_field=models.IntegerField())), output_field=models.IntegerField()),
+        ),
+        migrations.AddField(
+            model_name='clientdata',
+            name='used_services_mask',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.Case(models.When(models.Q(('used_services__icontains', '"internet"')), then=models.Value(1)), default=models.Value(0), output_field=models.IntegerField()), '+', models.Case(models.When(models.Q(('used_services__icontains', '"tv"')), then=models.Value(2)), default=models.Value(0), output_field=models.IntegerField())), '+', models.Case(models.When(models.Q(('used_services__icontains', '"phone"')), then=models.Value(4)), default=models.Value(0), output_field=models.IntegerField())), '+', models.Case(models.When(models.Q(('used_services__icontains', '"security"')), then=models.Value(8)), default=models.Value(0), output_field=models.IntegerField())), '+', models.Case(models.When(models.Q(('used_services__icontains', '"smart_home"')), then=models.Value(16)), default=models.Value(0), output_field=models.IntegerField())), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='clientdata',
+            index=models.Index(fields=['interested_services_mask'], name='clientdata_interested'),
+        ),
+        migrations.AddIndex(
+            model_name='clientdata',
+            index=models.Index(fields=['used_services_mask'], name='clientdata_used'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0008_services_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientSearchIndex',
+            fields=[
+                ('client', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='clients.clientdata')),
+            ],
+            options={
+                'db_table': 'clients_clientdata_fts',
+                'managed': False,
+            },
+        ),
+    ]
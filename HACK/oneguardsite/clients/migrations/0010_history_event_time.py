@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='clienthistory',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0010_history_event_time'),
+        ('objects', '0004_import_lookup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clientdata',
+            index=models.Index(fields=['building_object', 'apartment_number'], name='clientdata_object_apartment'),
+        ),
+    ]
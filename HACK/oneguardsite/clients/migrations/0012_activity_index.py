@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0011_import_lookup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clienthistory',
+            index=models.Index(fields=['timestamp'], name='clienthistory_time'),
+        ),
+    ]
@@ -1,6 +1,44 @@
 from django.db import models
+from django.utils import timezone
 from users.models import User
-from objects.models import BuildingObject
+from objects.models import City, BuildingObject
+from .geo import cell_expression
+from .phones import normalized_phone_expression
+from .services import services_mask_expression, services_q
+
+
+def visibility_filter(user):
+    # Инженер видит только своих клиентов
+    # Администратор видит всех
+    if user.role == 'admin':
+        return {}
+    return {'engineer_id': user.pk}
+
+
+class ClientDataQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        return self.filter(**visibility_filter(user))
+
+    def filter_by(self, city=None, engineer=None, object_type=None, date_from=None, date_to=None,
+                  interested=None, used=None):
+        # Общие фильтры списка, выгрузки и сводки
+        queryset = self
+        if city:
+            queryset = queryset.filter(building_object__city_id=city)
+        if engineer:
+            queryset = queryset.filter(engineer_id=engineer)
+        if object_type:
+            queryset = queryset.filter(building_object__object_type=object_type)
+        if date_from:
+            queryset = queryset.filter(created_at__date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(created_at__date__lte=date_to)
+        # Услуги - по индексированным маскам, а не по JSON
+        if interested:
+            queryset = queryset.filter(ClientData.services_q('interested_services', interested))
+        if used:
+            queryset = queryset.filter(ClientData.services_q('used_services', used))
+        return queryset
 
 
 class ClientData(models.Model):
@@ -16,6 +54,13 @@ class ClientData(models.Model):
     building_object = models.ForeignKey(BuildingObject, on_delete=models.CASCADE)
     apartment_number = models.CharField(max_length=10)
     contact_phone = models.CharField(max_length=20)
+    # Номер цифрами (79121234567) для поиска прежних визитов; вычисляется
+    # самой БД, поэтому верен и после bulk_create пакетной синхронизации и загрузки
+    contact_phone_normalized = models.GeneratedField(
+        expression=normalized_phone_expression('contact_phone'),
+        output_field=models.CharField(max_length=20),
+        db_persist=True,
+    )
 
     # Используемые услуги (может быть несколько)
     used_services = models.JSONField(default=list)
@@ -23,6 +68,19 @@ class ClientData(models.Model):
     # Интерес к услугам (может быть несколько)
     interested_services = models.JSONField(default=list)
 
+    # Битовые маски услуг (бит на каждую из SERVICE_CHOICES) для индексного
+    # поиска; вычисляются самой БД из JSON-списков и не расходятся с ними
+    used_services_mask = models.GeneratedField(
+        expression=services_mask_expression('used_services', SERVICE_CHOICES),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+    interested_services_mask = models.GeneratedField(
+        expression=services_mask_expression('interested_services', SERVICE_CHOICES),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+
     provider_rating = models.IntegerField(
         choices=[(i, i) for i in range(1, 6)],  # 1-5 звезд
         null=True, blank=True
@@ -39,28 +97,207 @@ class ClientData(models.Model):
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
 
+    # Ячейка сетки для поиска клиентов рядом; вычисляется самой БД,
+    # поэтому не расходится с координатами и при bulk_create/update()
+    geo_cell = models.GeneratedField(
+        expression=cell_expression(),
+        output_field=models.BigIntegerField(),
+        db_persist=True,
+    )
+
+    # Ключ идемпотентности, который генерирует устройство для офлайн-записи
+    client_key = models.CharField(max_length=64, null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ClientDataQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Данные клиента'
         verbose_name_plural = 'Данные клиентов'
         ordering = ['-created_at']
+        indexes = [
+            # Списки клиентов листаются по (created_at, id) от новых к старым
+            models.Index(
+                fields=['engineer', '-created_at', '-id'],
+                name='clientdata_engineer_created'
+            ),
+            models.Index(fields=['-created_at', '-id'], name='clientdata_created'),
+            # Выборка изменений для офлайн-синхронизации
+            models.Index(
+                fields=['engineer', 'updated_at', 'id'],
+                name='clientdata_engineer_updated'
+            ),
+            models.Index(fields=['updated_at', 'id'], name='clientdata_updated'),
+            # Поиск клиентов рядом
+            models.Index(fields=['engineer', 'geo_cell'], name='clientdata_engineer_geo'),
+            models.Index(fields=['geo_cell'], name='clientdata_geo'),
+            # Фильтры и подсчеты по услугам
+            models.Index(fields=['interested_services_mask'], name='clientdata_interested'),
+            models.Index(fields=['used_services_mask'], name='clientdata_used'),
+            # Прежние визиты по номеру телефона
+            models.Index(
+                fields=['contact_phone_normalized', 'building_object'],
+                name='clientdata_phone_object'
+            ),
+            # Поиск записи по квартире при загрузке из файла и прежних визитов
+            models.Index(
+                fields=['building_object', 'apartment_number'],
+                name='clientdata_object_apartment'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['engineer', 'client_key'],
+                condition=models.Q(client_key__isnull=False),
+                name='clientdata_engineer_client_key'
+            ),
+        ]
+
+    @classmethod
+    def services_q(cls, field, codes):
+        """Условие: в field (used_services/interested_services) есть все услуги codes"""
+        return services_q(field, cls.SERVICE_CHOICES, codes)
 
     def __str__(self):
         return f"Клиент в {self.building_object.name} - кв. {self.apartment_number}"
 
 
+class ClientSearchIndex(models.Model):
+    """Полнотекстовый индекс клиентов (виртуальная таблица FTS5, см. search.py)
+
+    rowid таблицы совпадает с id клиента; модель нужна только для JOIN.
+    """
+    client = models.OneToOneField(
+        ClientData,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name='search_index',
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'clients_clientdata_fts'
+
+
 class ClientHistory(models.Model):
     client_data = models.ForeignKey(ClientData, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     action = models.CharField(max_length=200)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Время события, а не записи в БД: история пишется пакетами с задержкой
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         verbose_name = 'История изменений'
         verbose_name_plural = 'История изменений'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(
+                fields=['client_data', '-timestamp', '-id'],
+                name='clienthistory_client_time'
+            ),
+            # Ряды активности по времени событий
+            models.Index(fields=['timestamp'], name='clienthistory_time'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.action}"
\ No newline at end of file
+        return f"{self.user.username} - {self.action}"
+
+
+class Tombstone(models.Model):
+    """Отметка об удалении записи, чтобы устройства могли удалить ее у себя
+
+    Для клиента отметка пишется и при передаче записи другому инженеру:
+    у прежнего она пропадает из выборки.
+    """
+    MODEL_CHOICES = [
+        ('client', 'Данные клиента'),
+        ('city', 'Город'),
+        ('object', 'Объект'),
+    ]
+
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    # Инженер, которому принадлежала удаленная или переданная запись клиента
+    owner_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Удаленная запись'
+        verbose_name_plural = 'Удаленные записи'
+
+    def __str__(self):
+        return f"{self.get_model_display()} #{self.object_id}"
+
+
+class ClientStats(models.Model):
+    """Денормализованные счетчики по клиентам группы (города, объекта, инженера)"""
+    total_clients = models.IntegerField(default=0)
+
+    used_internet = models.IntegerField(default=0)
+    used_tv = models.IntegerField(default=0)
+    used_phone = models.IntegerField(default=0)
+    used_security = models.IntegerField(default=0)
+    used_smart_home = models.IntegerField(default=0)
+
+    interested_internet = models.IntegerField(default=0)
+    interested_tv = models.IntegerField(default=0)
+    interested_phone = models.IntegerField(default=0)
+    interested_security = models.IntegerField(default=0)
+    interested_smart_home = models.IntegerField(default=0)
+
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    price_sum = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    price_count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
+    @property
+    def average_price(self):
+        if not self.price_count:
+            return None
+        return self.price_sum / self.price_count
+
+
+class CityClientStats(ClientStats):
+    city = models.OneToOneField(
+        City, on_delete=models.CASCADE,
+        primary_key=True, related_name='client_stats'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика клиентов по городу'
+        verbose_name_plural = 'Статистика клиентов по городам'
+
+
+class BuildingObjectClientStats(ClientStats):
+    building_object = models.OneToOneField(
+        BuildingObject, on_delete=models.CASCADE,
+        primary_key=True, related_name='client_stats'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика клиентов по объекту'
+        verbose_name_plural = 'Статистика клиентов по объектам'
+
+
+class EngineerClientStats(ClientStats):
+    engineer = models.OneToOneField(
+        User, on_delete=models.CASCADE,
+        primary_key=True, related_name='client_stats'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика клиентов по инженеру'
+        verbose_name_plural = 'Статистика клиентов по инженерам'
@@ -0,0 +1,58 @@
+from django.db.models import F, Value, When, Case
+from django.db.models.functions import Concat, Length, Replace, Substr
+from django.db.models.lookups import Exact
+
+
+# Символы, которые убираются из номера: пробелы, дефисы, скобки, плюс, точки
+PHONE_SEPARATORS = ' -()+.'
+
+# С какого числа цифр имеет смысл искать прежние визиты по номеру
+MIN_PHONE_DIGITS = 7
+
+
+def normalize_phone(value):
+    """Номер в виде цифр E.164 без плюса: 8 (912) 123-45-67 -> 79121234567
+
+    Правила те же, что у normalized_phone_expression: 8XXXXXXXXXX и
+    десятизначный 9XXXXXXXXX считаются российскими мобильными номерами.
+    """
+    value = value or ''
+    for char in PHONE_SEPARATORS:
+        value = value.replace(char, '')
+    if len(value) == 11 and value.startswith('8'):
+        return '7' + value[1:]
+    if len(value) == 10 and value.startswith('9'):
+        return '7' + value
+    return value
+
+
+def phone_prefix(value):
+    """Начало номера, набранное в форме, в том же виде, что normalize_phone
+
+    Пока номер не дописан, длина еще не известна: ведущие 8 и 9 считаются
+    началом российского номера (8912... и 912... -> 7912...), если номер
+    набран не с плюсом.
+    """
+    value = (value or '').strip()
+    international = value.startswith('+')
+    for char in PHONE_SEPARATORS:
+        value = value.replace(char, '')
+    if not international and len(value) <= 11 and value.startswith('8'):
+        return '7' + value[1:]
+    if not international and len(value) <= 10 and value.startswith('9'):
+        return '7' + value
+    return value
+
+
+def normalized_phone_expression(field):
+    """normalize_phone для колонки field, вычисляемое самой БД"""
+    digits = F(field)
+    for char in PHONE_SEPARATORS:
+        digits = Replace(digits, Value(char), Value(''))
+    return Case(
+        When(Exact(Length(digits), 11) & Exact(Substr(digits, 1, 1), '8'),
+             then=Concat(Value('7'), Substr(digits, 2))),
+        When(Exact(Length(digits), 10) & Exact(Substr(digits, 1, 1), '9'),
+             then=Concat(Value('7'), digits)),
+        default=digits,
+    )
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from oneguardsite import metrics
+from .cache import aversioned_key, versioned_key
+from .models import ClientData, CityClientStats
+
+
+SERVICE_CODES = [code for code, _ in ClientData.SERVICE_CHOICES]
+
+REPORT_CACHE_TIMEOUT = 60 * 60
+
+
+def service_q(field, code):
+    """Условие "услуга code есть в JSON-списке field" для текущей БД"""
+    if connection.features.supports_json_field_contains:
+        return Q(**{f'{field}__contains': [code]})
+    # SQLite не поддерживает __contains для JSONField: ищем код
+    # в кавычках внутри сериализованного списка
+    return Q(**{f'{field}__icontains': f'"{code}"'})
+
+
+def city_report_rows():
+    return (
+        CityClientStats.objects
+        .filter(total_clients__gt=0)
+        .select_related('city')
+        .order_by('city_id')
+    )
+
+
+def city_report_row(row):
+    stats = {
+        'city': row.city.name,
+        'total_clients': row.total_clients,
+        'average_rating': round(row.average_rating or 0, 2),
+    }
+    for code in SERVICE_CODES:
+        stats[f'{code}_interest'] = getattr(row, f'interested_{code}')
+    return stats
+
+
+def build_city_report():
+    """Статистика по городам из таблицы счетчиков (одна строка на город)"""
+    return [city_report_row(row) for row in city_report_rows()]
+
+
+def get_city_report():
+    """Закэшированный отчет по городам (сбрасывается при изменении данных)"""
+    key = versioned_key('reports', 'cities')
+    report = cache.get(key)
+    metrics.record_cache('reports', report)
+    if report is None:
+        report = build_city_report()
+        cache.set(key, report, REPORT_CACHE_TIMEOUT)
+    return report
+
+
+async def aget_city_report():
+    """get_city_report для асинхронных представлений"""
+    key = await aversioned_key('reports', 'cities')
+    report = await cache.aget(key)
+    metrics.record_cache('reports', report)
+    if report is None:
+        report = [city_report_row(row) async for row in city_report_rows()]
+        await cache.aset(key, report, REPORT_CACHE_TIMEOUT)
+    return report
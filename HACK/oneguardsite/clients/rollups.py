@@ -0,0 +1,233 @@
+from decimal import Decimal
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, F, Sum
+from objects.models import BuildingObject
+from .reports import SERVICE_CODES, service_q
+
+
+# Модель счетчиков -> поле снимка клиента, по которому она группируется
+TARGETS = [
+    ('CityClientStats', 'city_id'),
+    ('BuildingObjectClientStats', 'building_object_id'),
+    ('EngineerClientStats', 'engineer_id'),
+]
+
+# С какого числа групп в одном пакете счетчики обновляются пачкой, а не запросом на группу
+BULK_GROUPS = 20
+
+SNAPSHOT_FIELDS = [
+    'engineer_id', 'building_object_id', 'used_services',
+    'interested_services', 'provider_rating', 'desired_price',
+]
+
+COUNTER_FIELDS = (
+    ['total_clients']
+    + [f'used_{code}' for code in SERVICE_CODES]
+    + [f'interested_{code}' for code in SERVICE_CODES]
+    + ['rating_sum', 'rating_count', 'price_sum', 'price_count']
+)
+
+
+def snapshot(client):
+    """Значения ClientData, влияющие на счетчики"""
+    data = {field: getattr(client, field) for field in SNAPSHOT_FIELDS}
+    if type(client).building_object.is_cached(client):
+        data['city_id'] = client.building_object.city_id
+    else:
+        data['city_id'] = (
+            BuildingObject.objects
+            .filter(pk=client.building_object_id)
+            .values_list('city_id', flat=True)
+            .first()
+        )
+    return data
+
+
+def stored_snapshot(client_model, pk):
+    """Снимок записи в том виде, в каком она сейчас лежит в БД"""
+    return (
+        client_model.objects
+        .filter(pk=pk)
+        .values(*SNAPSHOT_FIELDS, city_id=F('building_object__city_id'))
+        .first()
+    )
+
+
+def contribution(data):
+    """Вклад одной записи клиента в счетчики группы"""
+    values = {'total_clients': 1}
+    for prefix in ('used', 'interested'):
+        services = data.get(f'{prefix}_services') or []
+        for code in set(services) & set(SERVICE_CODES):
+            values[f'{prefix}_{code}'] = 1
+    if data.get('provider_rating') is not None:
+        values['rating_sum'] = data['provider_rating']
+        values['rating_count'] = 1
+    if data.get('desired_price') is not None:
+        values['price_sum'] = Decimal(str(data['desired_price']))
+        values['price_count'] = 1
+    return values
+
+
+def apply_changes(added=(), removed=(), get_model=global_apps.get_model):
+    """Инкрементально обновляет счетчики по снимкам добавленных и удаленных записей
+
+    Изменение записи передается как удаление старого снимка и добавление нового.
+    Дельты сначала суммируются по группам, поэтому пакет из тысяч записей
+    обходится одним UPDATE на затронутую группу.
+    """
+    deltas = {}
+    for sign, snapshots in ((1, added), (-1, removed)):
+        for data in snapshots:
+            values = contribution(data)
+            for model_name, key_field in TARGETS:
+                key = data.get(key_field)
+                if key is None:
+                    continue
+                group = deltas.setdefault((model_name, key), {})
+                for field, value in values.items():
+                    group[field] = group.get(field, 0) + sign * value
+
+    grouped = {}
+    for (model_name, key), values in deltas.items():
+        values = {field: value for field, value in values.items() if value}
+        if values:
+            grouped.setdefault(model_name, {})[key] = values
+    for model_name, groups in grouped.items():
+        model = get_model('clients', model_name)
+        if len(groups) > BULK_GROUPS:
+            _apply_bulk(model, groups)
+        else:
+            for key, values in groups.items():
+                _apply_delta(model, key, values)
+
+
+def _apply_delta(model, key, values):
+    expressions = {field: F(field) + value for field, value in values.items()}
+    if model.objects.filter(pk=key).update(**expressions):
+        return
+    if values.get('total_clients', 0) <= 0:
+        # Строки нет (например, группа удаляется каскадно) - вычитать не из чего
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(pk=key, **values)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        model.objects.filter(pk=key).update(**expressions)
+
+
+def _apply_bulk(model, groups):
+    """Дельты многих групп сразу (загрузка, большой пакет синхронизации):
+    недостающие строки создаются одним INSERT, приращения - одним executemany"""
+    # Строки групп, которых еще нет: как и в _apply_delta, только если есть что прибавить
+    keys = [key for key, values in groups.items() if values.get('total_clients', 0) > 0]
+    existing = set(model.objects.filter(pk__in=keys).values_list('pk', flat=True))
+    model.objects.bulk_create(
+        [model(pk=key) for key in keys if key not in existing], ignore_conflicts=True
+    )
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in COUNTER_FIELDS]
+    assignments = ', '.join(f'{quote(field.column)} = {quote(field.column)} + %s' for field in fields)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {quote(model._meta.db_table)} SET {assignments} '
+            f'WHERE {quote(model._meta.pk.column)} = %s',
+            [
+                [field.get_db_prep_value(values.get(field.name, 0), connection) for field in fields]
+                + [key]
+                for key, values in groups.items()
+            ]
+        )
+
+
+def move_building_object(building_object_id, old_city_id, new_city_id,
+                         get_model=global_apps.get_model):
+    """Переносит счетчики объекта в другой город при смене города у объекта"""
+    city_stats = get_model('clients', 'CityClientStats')
+    stats = (
+        get_model('clients', 'BuildingObjectClientStats').objects
+        .filter(pk=building_object_id)
+        .values(*COUNTER_FIELDS)
+        .first()
+    )
+    if not stats or not stats['total_clients']:
+        return
+
+    if old_city_id is not None:
+        _apply_delta(
+            city_stats, old_city_id,
+            {field: -value for field, value in stats.items() if value}
+        )
+    _apply_delta(
+        city_stats, new_city_id,
+        {field: value for field, value in stats.items() if value}
+    )
+
+
+def live_stats(model_name, get_model=global_apps.get_model):
+    """Счетчики, пересчитанные по таблице клиентов: {ключ группы: {поле: значение}}"""
+    client_model = get_model('clients', 'ClientData')
+    key_field = dict(TARGETS)[model_name]
+    group_by = 'building_object__city_id' if key_field == 'city_id' else key_field
+
+    aggregates = {
+        'total_clients': Count('id'),
+        'rating_sum': Sum('provider_rating'),
+        'rating_count': Count('provider_rating'),
+        'price_sum': Sum('desired_price'),
+        'price_count': Count('desired_price'),
+    }
+    for prefix in ('used', 'interested'):
+        for code in SERVICE_CODES:
+            aggregates[f'{prefix}_{code}'] = Count(
+                'id', filter=service_q(f'{prefix}_services', code)
+            )
+
+    rows = client_model.objects.values(group_by).annotate(**aggregates).order_by()
+    result = {}
+    for row in rows:
+        key = row.pop(group_by)
+        result[key] = {field: row[field] or 0 for field in COUNTER_FIELDS}
+    return result
+
+
+def stored_stats(model_name, get_model=global_apps.get_model):
+    """Текущее содержимое таблицы счетчиков: {ключ группы: {поле: значение}}"""
+    model = get_model('clients', model_name)
+    result = {}
+    for row in model.objects.values('pk', *COUNTER_FIELDS):
+        result[row.pop('pk')] = row
+    return result
+
+
+def rebuild(get_model=global_apps.get_model):
+    """Пересобирает все таблицы счетчиков с нуля"""
+    with transaction.atomic():
+        for model_name, _ in TARGETS:
+            model = get_model('clients', model_name)
+            model.objects.all().delete()
+            model.objects.bulk_create(
+                model(pk=key, **values)
+                for key, values in live_stats(model_name, get_model).items()
+            )
+
+
+def find_mismatches(get_model=global_apps.get_model):
+    """Расхождения между таблицами счетчиков и живым пересчетом"""
+    mismatches = []
+    for model_name, _ in TARGETS:
+        live = live_stats(model_name, get_model)
+        stored = stored_stats(model_name, get_model)
+        for key in sorted(set(live) | set(stored)):
+            expected = live.get(key, {})
+            actual = stored.get(key, {})
+            for field in COUNTER_FIELDS:
+                if expected.get(field, 0) != actual.get(field, 0):
+                    mismatches.append(
+                        (model_name, key, field, expected.get(field, 0), actual.get(field, 0))
+                    )
+    return mismatches
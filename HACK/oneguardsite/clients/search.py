@@ -0,0 +1,180 @@
+import re
+
+from django.db import connection as default_connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from objects.models import BuildingObject
+from .models import ClientData, ClientSearchIndex
+
+
+# Сколько слов запроса учитывается
+MAX_TERMS = 10
+
+WORD_RE = re.compile(r'\w+')
+
+
+def search_terms(query):
+    return WORD_RE.findall(query or '')[:MAX_TERMS]
+
+
+class SearchBackend:
+    """Интерфейс поиска по клиентам
+
+    search() сужает queryset до записей, подходящих под запрос, и добавляет
+    аннотацию rank (меньше - релевантнее). install()/rebuild() готовят индекс,
+    если он нужен бэкенду.
+    """
+
+    def install(self, connection):
+        pass
+
+    def rebuild(self, connection):
+        pass
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+
+class LikeSearchBackend(SearchBackend):
+    """Запасной вариант без индекса: каждое слово ищется через icontains"""
+    fields = (
+        'notes', 'apartment_number', 'contact_phone',
+        'building_object__name', 'building_object__address',
+    )
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            condition = Q()
+            for field in self.fields:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Поиск через виртуальную таблицу SQLite FTS5
+
+    Таблица и триггеры создаются после migrate (install): триггеры на
+    clients_clientdata и objects_buildingobject держат индекс в актуальном
+    состоянии при любой записи, включая bulk_create и update().
+    """
+    table = ClientSearchIndex._meta.db_table
+    columns = (
+        'notes', 'apartment_number', 'contact_phone', 'phone_digits',
+        'building_name', 'building_address',
+    )
+    # Веса колонок для bm25 в порядке columns
+    weights = (1.0, 10.0, 5.0, 5.0, 2.0, 2.0)
+
+    def _phone_digits(self, column):
+        # Телефон без разделителей, чтобы искать по цифрам подряд
+        for char in ' -()+':
+            column = f"replace({column}, '{char}', '')"
+        return column
+
+    def _select(self, client, building):
+        return (
+            f'{client}.id, {client}.notes, {client}.apartment_number, '
+            f'{client}.contact_phone, {self._phone_digits(f"{client}.contact_phone")}, '
+            f'{building}.name, {building}.address'
+        )
+
+    def statements(self):
+        clients = ClientData._meta.db_table
+        buildings = BuildingObject._meta.db_table
+        insert = (
+            f'INSERT INTO {self.table}(rowid, {", ".join(self.columns)}) '
+            f'SELECT {self._select("new", "b")} FROM {buildings} b '
+            f'WHERE b.id = new.building_object_id;'
+        )
+        delete = f'DELETE FROM {self.table} WHERE rowid = old.id;'
+        return {
+            f'{self.table}_insert': (
+                f'CREATE TRIGGER IF NOT EXISTS {self.table}_insert AFTER INSERT ON {clients} '
+                f'BEGIN {insert} END'
+            ),
+            f'{self.table}_update': (
+                f'CREATE TRIGGER IF NOT EXISTS {self.table}_update '
+                f'AFTER UPDATE OF notes, apartment_number, contact_phone, building_object_id '
+                f'ON {clients} BEGIN {delete} {insert} END'
+            ),
+            f'{self.table}_delete': (
+                f'CREATE TRIGGER IF NOT EXISTS {self.table}_delete AFTER DELETE ON {clients} '
+                f'BEGIN {delete} END'
+            ),
+            f'{self.table}_building': (
+                f'CREATE TRIGGER IF NOT EXISTS {self.table}_building '
+                f'AFTER UPDATE OF name, address ON {buildings} '
+                f'BEGIN UPDATE {self.table} SET building_name = new.name, '
+                f'building_address = new.address '
+                f'WHERE rowid IN (SELECT id FROM {clients} WHERE building_object_id = new.id); END'
+            ),
+        }
+
+    def install(self, connection):
+        """Создает индекс и триггеры, если их нет
+
+        SQLite удаляет триггеры вместе с таблицей, а миграции Django
+        пересоздают таблицу при многих изменениях схемы. Поэтому после
+        каждого migrate недостающие триггеры создаются заново, а индекс
+        перестраивается: записи за время без триггеров в него не попали.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') "
+                "AND name LIKE %s", [f'{self.table}%']
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            created = self.table not in existing
+            if created:
+                cursor.execute(
+                    f'CREATE VIRTUAL TABLE {self.table} USING fts5('
+                    f'{", ".join(self.columns)}, '
+                    f"tokenize = 'unicode61 remove_diacritics 2')"
+                )
+            missing = [sql for name, sql in self.statements().items() if name not in existing]
+            for sql in missing:
+                cursor.execute(sql)
+        if created or missing:
+            self.rebuild(connection)
+
+    def rebuild(self, connection):
+        clients = ClientData._meta.db_table
+        buildings = BuildingObject._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table}(rowid, {", ".join(self.columns)}) '
+                f'SELECT {self._select("c", "b")} FROM {clients} c '
+                f'JOIN {buildings} b ON b.id = c.building_object_id'
+            )
+
+    def match_expression(self, query):
+        # Каждое слово - префиксный поиск; кавычки экранируют спецсимволы FTS5
+        return ' '.join(f'"{term}"*' for term in search_terms(query))
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        weights = ', '.join(map(str, self.weights))
+        return (
+            queryset
+            .filter(search_index__isnull=False)
+            .filter(RawSQL(f'{self.table} MATCH %s', [match], output_field=BooleanField()))
+            .annotate(rank=RawSQL(f'bm25({self.table}, {weights})', [], output_field=FloatField()))
+        )
+
+
+def get_backend(connection=default_connection):
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    return LikeSearchBackend()
+
+
+def search_clients(queryset, query):
+    """Клиенты из queryset, подходящие под запрос, от самых релевантных"""
+    return get_backend().search(queryset, query).order_by('rank', '-created_at', '-id')
@@ -0,0 +1,249 @@
+import datetime
+import math
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from objects.cache import bump_reference_version
+from objects.models import BuildingObject, City
+from users.models import User
+from . import rollups
+from .cache import bump_activity_version, bump_data_version
+from .models import ClientData, ClientHistory
+
+
+# Города с координатами центра: клиенты и объекты располагаются вокруг них
+CITIES = [
+    ('Москва', 55.7558, 37.6173),
+    ('Санкт-Петербург', 59.9343, 30.3351),
+    ('Новосибирск', 55.0084, 82.9357),
+    ('Екатеринбург', 56.8389, 60.6057),
+    ('Казань', 55.7961, 49.1064),
+    ('Нижний Новгород', 56.2965, 43.9361),
+    ('Самара', 53.1959, 50.1002),
+    ('Уфа', 54.7388, 55.9721),
+    ('Краснодар', 45.0355, 38.9753),
+    ('Пермь', 58.0105, 56.2502),
+]
+
+STREETS = [
+    'ул. Ленина', 'ул. Мира', 'ул. Гагарина', 'ул. Советская', 'ул. Садовая',
+    'пр. Победы', 'ул. Молодежная', 'ул. Школьная', 'ул. Лесная', 'ул. Новая',
+]
+
+# Доли типов объектов: в основном многоквартирные дома
+OBJECT_TYPE_WEIGHTS = {'mcd': 70, 'hotel': 10, 'cafe': 12, 'restaurant': 8}
+
+# Вероятность, что услуга уже подключена / интересна клиенту
+USED_SERVICE_RATES = {'internet': 0.75, 'tv': 0.45, 'phone': 0.25, 'security': 0.1, 'smart_home': 0.05}
+INTERESTED_SERVICE_RATES = {'internet': 0.3, 'tv': 0.2, 'phone': 0.1, 'security': 0.3, 'smart_home': 0.25}
+
+RATING_WEIGHTS = {None: 30, 1: 5, 2: 8, 3: 20, 4: 22, 5: 15}
+
+# Визиты по дням недели (пн..вс): в выходные инженеры работают меньше
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.0, 1.0, 0.9, 0.35, 0.15]
+
+NOTES = [
+    '', '', '', 'Нужен быстрый интернет', 'Недоволен текущим провайдером',
+    'Просит перезвонить вечером', 'Интересует пакет с ТВ', 'Собирается переезжать',
+    'Жалобы на скорость по вечерам', 'Есть дети, интересует родительский контроль',
+]
+
+UPDATE_ACTIONS = [
+    'Обновлены данные клиента', 'Изменен рейтинг провайдера',
+    'Уточнены интересующие услуги', 'Добавлен комментарий',
+]
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _services(rng, rates):
+    return [code for code, rate in rates.items() if rng.random() < rate]
+
+
+def _visit_time(rng, now, days):
+    """Время визита: рост активности к текущему дню, рабочие часы, меньше в выходные"""
+    while True:
+        # Квадратный корень смещает даты к концу периода (база клиентов растет)
+        moment = now - datetime.timedelta(days=days * (1 - math.sqrt(rng.random())))
+        if rng.random() < WEEKDAY_WEIGHTS[moment.weekday()]:
+            break
+    hour = min(max(int(rng.gauss(14, 3)), 9), 20)
+    moment = moment.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60))
+    if moment > now:
+        moment -= datetime.timedelta(days=1)
+    return moment
+
+
+def generate(cities=10, objects_per_city=50, engineers=40, clients=20000,
+             history_per_client=2.0, days=365, seed=42, prefix='seed',
+             password='password', batch_size=2000):
+    """Заполняет БД синтетическими данными с правдоподобными распределениями
+
+    Инженеры работают с разной интенсивностью (закон Ципфа) и в основном в
+    своем городе, крупные объекты собирают больше клиентов, визиты идут в
+    рабочие часы, а частота растет к текущей дате. Записи вставляются пакетами
+    через bulk_create, после чего пересобираются счетчики и сбрасываются кэши.
+    На пустой базе одинаковый seed дает одинаковые данные (даты - относительно
+    текущего момента); повторный запуск добавляет еще столько же объектов и клиентов.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    password_hash = make_password(password)
+
+    with transaction.atomic():
+        city_list = []
+        for index in range(cities):
+            name, lat, lon = CITIES[index % len(CITIES)]
+            if index >= len(CITIES):
+                name = f'{name} {index // len(CITIES) + 1}'
+            city, _ = City.objects.get_or_create(name=name)
+            city_list.append((city, lat, lon))
+
+        type_names = dict(BuildingObject.OBJECT_TYPES)
+        object_list = []
+        for city, lat, lon in city_list:
+            for index in range(objects_per_city):
+                object_type = _weighted(rng, OBJECT_TYPE_WEIGHTS)
+                object_list.append(BuildingObject(
+                    name=f'{type_names[object_type]} {city.name}-{index + 1}',
+                    address=f'{rng.choice(STREETS)}, {rng.randint(1, 150)}',
+                    object_type=object_type,
+                    city=city,
+                ))
+        object_list = BuildingObject.objects.bulk_create(object_list, batch_size=batch_size)
+        # Размер объекта: многоквартирные дома крупнее, распределение с длинным хвостом
+        centers = {city.pk: (lat, lon) for city, lat, lon in city_list}
+        object_points = {}
+        object_sizes = []
+        for building_object in object_list:
+            lat, lon = centers[building_object.city_id]
+            object_points[building_object.pk] = (lat + rng.gauss(0, 0.05), lon + rng.gauss(0, 0.08))
+            object_sizes.append(rng.lognormvariate(0, 1) * (5 if building_object.object_type == 'mcd' else 1))
+
+        User.objects.get_or_create(
+            username=f'{prefix}_admin',
+            defaults={'role': 'admin', 'password': password_hash, 'is_staff': True},
+        )
+        existing = set(
+            User.objects
+            .filter(username__startswith=f'{prefix}_engineer')
+            .values_list('username', flat=True)
+        )
+        User.objects.bulk_create([
+            User(
+                username=f'{prefix}_engineer{index}', password=password_hash, role='engineer',
+                first_name=f'Инженер {index}', city=city_list[index % len(city_list)][0].name,
+                phone=f'+7 900 {index:03d}-{rng.randrange(100):02d}-{rng.randrange(100):02d}',
+            )
+            for index in range(engineers)
+            if f'{prefix}_engineer{index}' not in existing
+        ], batch_size=batch_size)
+        engineer_list = list(
+            User.objects.filter(username__startswith=f'{prefix}_engineer').order_by('id')[:engineers]
+        )
+
+        objects_by_city = {}
+        for building_object, size in zip(object_list, object_sizes):
+            objects_by_city.setdefault(building_object.city_id, ([], []))
+            objects_by_city[building_object.city_id][0].append(building_object)
+            objects_by_city[building_object.city_id][1].append(size)
+        city_by_name = {city.name: city.pk for city, _, _ in city_list}
+        activity = [1 / (rank + 1) ** 0.8 for rank in range(len(engineer_list))]
+
+        created = 0
+        history = 0
+        while created < clients:
+            batch = []
+            visits = []
+            for number in range(created, min(created + batch_size, clients)):
+                engineer = rng.choices(engineer_list, weights=activity)[0]
+                # 90% визитов - в городе инженера
+                city_id = city_by_name.get(engineer.city)
+                if city_id not in objects_by_city or rng.random() > 0.9:
+                    city_id = rng.choice(list(objects_by_city))
+                candidates, sizes = objects_by_city[city_id]
+                building_object = rng.choices(candidates, weights=sizes)[0]
+                lat, lon = object_points[building_object.pk]
+                has_point = rng.random() < 0.8
+                price = None
+                if rng.random() < 0.6:
+                    price = Decimal(round(rng.lognormvariate(math.log(700), 0.35), -1))
+                visits.append(_visit_time(rng, now, days))
+                batch.append(ClientData(
+                    engineer=engineer,
+                    building_object=building_object,
+                    apartment_number=str(rng.randint(1, 300)),
+                    contact_phone=f'+7 9{rng.randrange(10, 100)} {rng.randrange(1000):03d}-'
+                                  f'{rng.randrange(100):02d}-{rng.randrange(100):02d}',
+                    used_services=_services(rng, USED_SERVICE_RATES),
+                    interested_services=_services(rng, INTERESTED_SERVICE_RATES),
+                    provider_rating=_weighted(rng, RATING_WEIGHTS),
+                    desired_price=price,
+                    notes=rng.choice(NOTES),
+                    latitude=lat + rng.gauss(0, 0.0005) if has_point else None,
+                    longitude=lon + rng.gauss(0, 0.0005) if has_point else None,
+                    # Часть записей пришла офлайн-синхронизацией с ключом устройства
+                    client_key=f'{prefix}-{seed}-{number}' if rng.random() < 0.3 else None,
+                ))
+            batch = ClientData.objects.bulk_create(batch)
+            # auto_now_add/auto_now при вставке ставят текущее время - возвращаем даты визитов
+            for client, visit in zip(batch, visits):
+                client.created_at = client.updated_at = visit
+            history += _create_history(rng, batch, history_per_client, now)
+            _store_dates(batch)
+            created += len(batch)
+
+        rollups.rebuild()
+
+    bump_data_version()
+    bump_activity_version()
+    bump_reference_version()
+    return {
+        'cities': len(city_list),
+        'objects': len(object_list),
+        'engineers': len(engineer_list),
+        'clients': created,
+        'history': history,
+    }
+
+
+def _store_dates(clients):
+    # Один подготовленный UPDATE на все строки: bulk_update строит CASE на
+    # каждую запись и на больших пакетах заметно медленнее
+    adapt = connection.ops.adapt_datetimefield_value
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {ClientData._meta.db_table} SET created_at = %s, updated_at = %s WHERE id = %s',
+            [(adapt(client.created_at), adapt(client.updated_at), client.pk) for client in clients]
+        )
+
+
+def _create_history(rng, clients, history_per_client, now):
+    """Запись о создании и несколько последующих изменений (в среднем history_per_client на клиента)"""
+    events = []
+    for client in clients:
+        events.append(ClientHistory(
+            client_data=client, user=client.engineer,
+            action=f'Создана новая запись для квартиры {client.apartment_number}',
+            timestamp=client.created_at,
+        ))
+        # Пуассоновское число изменений после создания
+        count, threshold, product = 0, math.exp(-max(history_per_client - 1, 0)), rng.random()
+        while product > threshold:
+            count += 1
+            product *= rng.random()
+        moment = client.created_at
+        for _ in range(count):
+            moment = min(moment + datetime.timedelta(days=rng.expovariate(1 / 20)), now)
+            events.append(ClientHistory(
+                client_data=client, user=client.engineer,
+                action=rng.choice(UPDATE_ACTIONS), timestamp=moment,
+            ))
+        client.updated_at = moment
+    ClientHistory.objects.bulk_create(events)
+    return len(events)
@@ -1,4 +1,7 @@
 from rest_framework import serializers
+from objects.models import BuildingObject
+from . import activity, geo
+from .phones import MIN_PHONE_DIGITS, normalize_phone, phone_prefix
 from .models import ClientData, ClientHistory
 
 
@@ -7,16 +10,17 @@ class ClientDataSerializer(serializers.ModelSerializer):
     building_object_name = serializers.CharField(source='building_object.name', read_only=True)
     building_object_address = serializers.CharField(source='building_object.address', read_only=True)
     city_name = serializers.CharField(source='building_object.city.name', read_only=True)
+    object_type = serializers.CharField(source='building_object.object_type', read_only=True)
 
     class Meta:
         model = ClientData
         fields = [
             'id', 'engineer', 'engineer_name', 'building_object', 'building_object_name',
-            'building_object_address', 'city_name', 'apartment_number', 'contact_phone',
+            'building_object_address', 'city_name', 'object_type', 'apartment_number', 'contact_phone',
             'used_services', 'interested_services', 'provider_rating', 'desired_price',
-            'notes', 'latitude', 'longitude', 'created_at', 'updated_at'
+            'notes', 'latitude', 'longitude', 'client_key', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['engineer', 'created_at', 'updated_at']
+        read_only_fields = ['engineer', 'client_key', 'created_at', 'updated_at']
 
 
 class ClientDataCreateSerializer(serializers.ModelSerializer):
@@ -32,10 +36,71 @@ class ClientDataCreateSerializer(serializers.ModelSerializer):
         # Автоматически устанавливаем текущего пользователя как инженера
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
-            validated_data['engineer'] = request.user
+            validated_data['engineer_id'] = request.user.pk
         return super().create(validated_data)
 
 
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PK-поле, которое при пакетной проверке берет объекты из заранее загруженного словаря"""
+    prefetched = None
+
+    def to_internal_value(self, data):
+        if self.prefetched is None:
+            return super().to_internal_value(data)
+        try:
+            return self.prefetched[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class ClientDataSyncListSerializer(serializers.ListSerializer):
+    """Пакетная проверка офлайн-записей
+
+    Ошибки собираются по каждой записи (item_errors) и не валят весь пакет,
+    а объекты зданий загружаются одним запросом на пакет.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({
+                'non_field_errors': ['Ожидался список записей']
+            })
+
+        field = self.child.fields['building_object']
+        ids = set()
+        for item in data:
+            if isinstance(item, dict):
+                try:
+                    ids.add(int(item.get('building_object')))
+                except (TypeError, ValueError):
+                    pass
+        field.prefetched = BuildingObject.objects.in_bulk(ids)
+
+        validated, self.item_errors = [], []
+        try:
+            for item in data:
+                try:
+                    validated.append(self.child.run_validation(item))
+                    self.item_errors.append(None)
+                except serializers.ValidationError as exc:
+                    validated.append(None)
+                    self.item_errors.append(exc.detail)
+        finally:
+            field.prefetched = None
+        return validated
+
+
+class ClientDataSyncSerializer(ClientDataCreateSerializer):
+    building_object = PrefetchedPrimaryKeyRelatedField(queryset=BuildingObject.objects.all())
+    client_key = serializers.CharField(max_length=64, required=False, allow_null=True)
+
+    class Meta(ClientDataCreateSerializer.Meta):
+        fields = ClientDataCreateSerializer.Meta.fields + ['client_key']
+        list_serializer_class = ClientDataSyncListSerializer
+
+
 class ClientHistorySerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
 
@@ -51,4 +116,148 @@ class ClientReportSerializer(serializers.Serializer):
     total_clients = serializers.IntegerField()
     internet_interest = serializers.IntegerField()
     tv_interest = serializers.IntegerField()
-    average_rating = serializers.FloatField()
\ No newline at end of file
+    phone_interest = serializers.IntegerField()
+    security_interest = serializers.IntegerField()
+    smart_home_interest = serializers.IntegerField()
+    average_rating = serializers.FloatField()
+
+
+class ServiceListField(serializers.CharField):
+    """Список кодов услуг через запятую: internet,tv"""
+
+    def to_internal_value(self, data):
+        codes = [code.strip() for code in super().to_internal_value(data).split(',') if code.strip()]
+        known = dict(ClientData.SERVICE_CHOICES)
+        unknown = [code for code in codes if code not in known]
+        if unknown:
+            raise serializers.ValidationError(f"Неизвестные услуги: {', '.join(unknown)}")
+        return codes
+
+
+class ClientDataFilterSerializer(serializers.Serializer):
+    # Параметры фильтрации списка клиентов, выгрузки и сводки
+    city = serializers.IntegerField(required=False, min_value=1)
+    engineer = serializers.IntegerField(required=False, min_value=1)
+    object_type = serializers.ChoiceField(choices=BuildingObject.OBJECT_TYPES, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    interested = ServiceListField(required=False)
+    used = ServiceListField(required=False)
+
+    def validate(self, attrs):
+        date_from, date_to = attrs.get('date_from'), attrs.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError({'date_to': 'Дата окончания раньше даты начала'})
+        return attrs
+
+
+class DashboardFilterSerializer(ClientDataFilterSerializer):
+    # Сводка считается по тем же клиентам, что и таблица, включая поиск
+    q = serializers.CharField(required=False, allow_blank=True)
+
+
+class ActivityQuerySerializer(serializers.Serializer):
+    # Ряд активности: что считаем, размер корзины, разбивка и диапазон дат
+    source = serializers.ChoiceField(choices=list(activity.SOURCES), required=False, default='clients')
+    bucket = serializers.ChoiceField(choices=activity.BUCKETS, required=False, default='day')
+    split = serializers.ChoiceField(choices=activity.SPLITS, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        date_from, date_to = attrs.get('date_from'), attrs.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError({'date_to': 'Дата окончания раньше даты начала'})
+        return attrs
+
+
+class PriorVisitQuerySerializer(serializers.Serializer):
+    # Номер (можно начало) и/или квартира из формы нового визита
+    phone = serializers.CharField(required=False, max_length=20)
+    building_object = serializers.IntegerField(required=False, min_value=1)
+    apartment_number = serializers.CharField(required=False, max_length=10)
+
+
+class PriorVisitSerializer(serializers.ModelSerializer):
+    """Прежний визит: без контактов и заметок, если запись чужая"""
+    engineer_name = serializers.CharField(source='engineer.username', read_only=True)
+    building_object_name = serializers.CharField(source='building_object.name', read_only=True)
+    matched_by = serializers.SerializerMethodField()
+    own = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ClientData
+        fields = [
+            'id', 'engineer', 'engineer_name', 'building_object', 'building_object_name',
+            'apartment_number', 'provider_rating', 'created_at', 'matched_by', 'own'
+        ]
+
+    def get_matched_by(self, obj):
+        query = self.context['query']
+        matched = []
+        prefix = phone_prefix(query.get('phone'))
+        if len(prefix) >= MIN_PHONE_DIGITS and (
+            obj.contact_phone_normalized == normalize_phone(query.get('phone'))
+            # Совпадение по началу номера - только у видимых записей, иначе
+            # квартира чужого клиента выдала бы начало его номера
+            or self.visible(obj) and obj.contact_phone_normalized.startswith(prefix)
+        ):
+            matched.append('phone')
+        if (obj.building_object_id, obj.apartment_number) == (
+            query.get('building_object'), query.get('apartment_number')
+        ):
+            matched.append('apartment')
+        return matched
+
+    def get_own(self, obj):
+        return obj.engineer_id == self.context['request'].user.pk
+
+    def visible(self, obj):
+        return self.context['request'].user.role == 'admin' or self.get_own(obj)
+
+
+class NearbyQuerySerializer(serializers.Serializer):
+    # Поиск клиентов рядом: центр и радиус (м) или прямоугольник
+    # bbox=min_lat,min_lon,max_lat,max_lon
+    lat = serializers.FloatField(required=False, min_value=-90, max_value=90)
+    lon = serializers.FloatField(required=False, min_value=-180, max_value=180)
+    radius = serializers.FloatField(required=False, default=1000, min_value=1, max_value=geo.MAX_RADIUS)
+    bbox = serializers.CharField(required=False)
+    limit = serializers.IntegerField(required=False, default=50, min_value=1, max_value=500)
+
+    def validate_bbox(self, value):
+        try:
+            min_lat, min_lon, max_lat, max_lon = map(float, value.split(','))
+        except ValueError:
+            raise serializers.ValidationError('Ожидается min_lat,min_lon,max_lat,max_lon')
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+            raise serializers.ValidationError('Неверные границы прямоугольника')
+        if max_lat - min_lat > geo.MAX_BBOX_SPAN or max_lon - min_lon > geo.MAX_BBOX_SPAN:
+            raise serializers.ValidationError(
+                f'Прямоугольник больше {geo.MAX_BBOX_SPAN}° по широте или долготе'
+            )
+        return min_lat, min_lon, max_lat, max_lon
+
+    def validate(self, attrs):
+        has_center = 'lat' in attrs and 'lon' in attrs
+        if not has_center and 'bbox' not in attrs:
+            raise serializers.ValidationError('Укажите lat и lon или bbox')
+        return attrs
+
+
+class ClientDataImportSerializer(ClientDataCreateSerializer):
+    """Строка файла загрузки клиентов
+
+    Услуги - коды через запятую, как в выгрузке; дата визита необязательна
+    и принимается в ISO-формате или как 31.12.2024 14:30.
+    """
+    building_object = PrefetchedPrimaryKeyRelatedField(queryset=BuildingObject.objects.all())
+    used_services = ServiceListField(required=False)
+    interested_services = ServiceListField(required=False)
+    created_at = serializers.DateTimeField(
+        required=False, input_formats=['iso-8601', '%d.%m.%Y %H:%M', '%d.%m.%Y']
+    )
+
+    class Meta(ClientDataCreateSerializer.Meta):
+        fields = ClientDataCreateSerializer.Meta.fields + ['created_at']
+        list_serializer_class = ClientDataSyncListSerializer
@@ -0,0 +1,39 @@
+from functools import reduce
+from operator import or_
+
+from django.db import models
+from django.db.models import Case, Q, Value, When
+
+
+def service_bits(choices):
+    """Бит каждой услуги: порядок SERVICE_CHOICES, новые услуги - только в конец"""
+    return {code: 1 << index for index, (code, _) in enumerate(choices)}
+
+
+def services_mask_expression(field, choices):
+    """Битовая маска услуг из JSON-списка field, вычисляемая самой БД"""
+    return reduce(lambda left, right: left + right, [
+        Case(
+            When(Q(**{f'{field}__icontains': f'"{code}"'}), then=Value(bit)),
+            default=Value(0),
+            output_field=models.IntegerField(),
+        )
+        for code, bit in service_bits(choices).items()
+    ])
+
+
+def services_mask(choices, codes):
+    bits = service_bits(choices)
+    return reduce(or_, (bits[code] for code in codes), 0)
+
+
+def services_q(field, choices, codes):
+    """Условие "в field есть все услуги codes" по индексу на маске
+
+    Масок всего 2^len(choices), поэтому условие раскрывается в IN по
+    всем маскам, содержащим нужные биты, - это поиск по индексу, а не
+    проверка выражения на каждой строке.
+    """
+    required = services_mask(choices, codes)
+    masks = [mask for mask in range(1 << len(choices)) if mask & required == required]
+    return Q(**{f'{field}_mask__in': masks})
@@ -0,0 +1,124 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from django.dispatch import receiver
+from objects.models import City, BuildingObject
+from objects.signals import objects_imported
+from . import rollups, search
+from .cache import bump_activity_version, bump_data_version
+from .changes import record_reassignments
+from .models import ClientData, Tombstone
+
+
+@receiver(post_save, sender=ClientData)
+@receiver(post_delete, sender=ClientData)
+@receiver(post_save, sender=BuildingObject)
+@receiver(post_delete, sender=BuildingObject)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def invalidate_client_reports(sender, **kwargs):
+    # Отчеты группируют клиентов по объектам и городам,
+    # поэтому их изменения тоже сбрасывают кэш
+    bump_data_version()
+
+
+@receiver(objects_imported)
+def invalidate_imported_objects(sender, **kwargs):
+    # Загрузка объектов обходит post_save; тип объекта мог измениться -
+    # это и разбивка прошлых корзин активности
+    bump_data_version()
+    bump_activity_version()
+
+
+@receiver(pre_save, sender=ClientData)
+def remember_client_stats(sender, instance, raw=False, **kwargs):
+    # Запоминаем старое состояние записи, чтобы при сохранении
+    # вычесть его вклад из счетчиков
+    instance._stats_snapshot = None
+    if instance.pk and not raw:
+        instance._stats_snapshot = rollups.stored_snapshot(sender, instance.pk)
+
+
+@receiver(post_save, sender=ClientData)
+def invalidate_moved_activity(sender, instance, raw=False, **kwargs):
+    # Перенос записи к другому инженеру или объекту меняет разбивку прошлых
+    # корзин активности; должно выполняться до update_client_stats
+    old = getattr(instance, '_stats_snapshot', None)
+    if old and (old['engineer_id'], old['building_object_id']) != (instance.engineer_id, instance.building_object_id):
+        bump_activity_version()
+
+
+@receiver(post_save, sender=ClientData)
+def record_client_reassignment(sender, instance, raw=False, **kwargs):
+    # Запись передана другому инженеру - прежний должен удалить ее у себя;
+    # должно выполняться до update_client_stats
+    old = getattr(instance, '_stats_snapshot', None)
+    if old and old['engineer_id'] != instance.engineer_id:
+        record_reassignments([(instance.pk, old['engineer_id'])])
+
+
+@receiver(post_save, sender=ClientData)
+def update_client_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_stats_snapshot', None)
+    rollups.apply_changes(
+        added=[rollups.snapshot(instance)],
+        removed=[old] if old else [],
+    )
+    instance._stats_snapshot = None
+
+
+@receiver(post_delete, sender=ClientData)
+def discard_client_stats(sender, instance, **kwargs):
+    rollups.apply_changes(removed=[rollups.snapshot(instance)])
+    bump_activity_version()
+
+
+@receiver(pre_save, sender=BuildingObject)
+def remember_object_city(sender, instance, raw=False, **kwargs):
+    instance._old_city_id = None
+    if instance.pk and not raw:
+        instance._old_city_id = (
+            sender.objects
+            .filter(pk=instance.pk)
+            .values_list('city_id', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=BuildingObject)
+def move_object_stats(sender, instance, created, raw=False, **kwargs):
+    old_city_id = getattr(instance, '_old_city_id', None)
+    if not created and not raw and old_city_id != instance.city_id:
+        rollups.move_building_object(instance.pk, old_city_id, instance.city_id)
+    if not created:
+        # Разбивка активности по городу и типу объекта
+        bump_activity_version()
+
+
+@receiver(post_delete, sender=ClientData)
+def record_client_deletion(sender, instance, **kwargs):
+    Tombstone.objects.create(
+        model='client', object_id=instance.pk, owner_id=instance.engineer_id
+    )
+
+
+@receiver(post_delete, sender=City)
+def record_city_deletion(sender, instance, **kwargs):
+    Tombstone.objects.create(model='city', object_id=instance.pk)
+
+
+@receiver(post_delete, sender=BuildingObject)
+def record_object_deletion(sender, instance, **kwargs):
+    Tombstone.objects.create(model='object', object_id=instance.pk)
+    bump_activity_version()
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    # Индекс поиска и триггеры создаются (или восстанавливаются) после миграций
+    if sender.name != 'clients':
+        return
+    connection = connections[using]
+    if ClientData._meta.db_table in connection.introspection.table_names():
+        search.get_backend(connection).install(connection)
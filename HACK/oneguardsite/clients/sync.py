@@ -0,0 +1,119 @@
+from django.db import IntegrityError
+from rest_framework.exceptions import ValidationError
+from oneguardsite.db import write_transaction
+from . import rollups
+from .cache import bump_data_version
+from .duplicates import find_duplicates
+from .models import ClientData, ClientHistory
+from .serializers import ClientDataSyncSerializer
+
+
+def sync_clients(request, items, retry=True):
+    """Пакетно сохраняет офлайн-записи инженера
+
+    Записи с уже известным client_key считаются повтором и пропускаются без
+    проверки. Остальные проверяются одним списочным сериализатором и
+    вставляются через bulk_create вместе с историей в одной транзакции.
+    Возвращает статус по каждой записи в порядке пакета; у новых записей
+    prior_visits - id прежних визитов по тому же номеру или квартире.
+    """
+    user = request.user
+    results = [{'index': index} for index in range(len(items))]
+
+    key_field = ClientDataSyncSerializer().fields['client_key']
+    keys = [_client_key(item, key_field) for item in items]
+    known = dict(
+        ClientData.objects
+        .filter(engineer_id=user.pk, client_key__in={key for key in keys if key})
+        .values_list('client_key', 'id')
+    )
+
+    pending = []
+    for result, item, key in zip(results, items, keys):
+        if key:
+            result['client_key'] = key
+        if key in known:
+            result.update(status='duplicate', id=known[key])
+        else:
+            pending.append((result, item))
+
+    serializer = ClientDataSyncSerializer(
+        data=[item for _, item in pending], many=True, context={'request': request}
+    )
+    serializer.is_valid(raise_exception=True)
+
+    new_clients = []
+    batch_keys = {}
+    for (result, _), data, errors in zip(
+        pending, serializer.validated_data, serializer.item_errors
+    ):
+        if errors:
+            result.update(status='invalid', errors=errors)
+            continue
+        key = data.get('client_key')
+        if key and key in batch_keys:
+            # Одна и та же запись дважды в пакете
+            result.update(status='duplicate', duplicate_of=batch_keys[key])
+            continue
+        if key:
+            batch_keys[key] = result['index']
+        result['status'] = 'created'
+        new_clients.append((result, ClientData(engineer_id=user.pk, **data)))
+
+    if new_clients:
+        # Прежние визиты - одним запросом на пакет, по тем же индексам, что и форма
+        found = find_duplicates([
+            (client.contact_phone, client.building_object_id, client.apartment_number)
+            for _, client in new_clients
+        ])
+        for (result, _), ids in zip(new_clients, found):
+            if ids:
+                result['prior_visits'] = ids
+        try:
+            save_clients(user, [client for _, client in new_clients])
+        except IntegrityError:
+            # Параллельный запрос успел сохранить те же ключи - повторяем,
+            # теперь они найдутся среди уже известных
+            if not retry:
+                raise
+            return sync_clients(request, items, retry=False)
+        bump_data_version()
+
+    ids_by_index = {result['index']: client.id for result, client in new_clients}
+    for result in results:
+        if result['index'] in ids_by_index:
+            result['id'] = ids_by_index[result['index']]
+        elif 'duplicate_of' in result:
+            result['id'] = ids_by_index[result.pop('duplicate_of')]
+    return results
+
+
+@write_transaction
+def save_clients(user, clients):
+    """Записи, их история и счетчики - одной транзакцией"""
+    created = ClientData.objects.bulk_create(clients)
+    ClientHistory.objects.bulk_create([
+        ClientHistory(
+            client_data=client,
+            user_id=user.pk,
+            action=f"Синхронизирована офлайн-запись для квартиры {client.apartment_number}"
+        )
+        for client in created
+    ])
+    rollups.apply_changes(added=[rollups.snapshot(client) for client in created])
+    return created
+
+
+def _client_key(item, field):
+    """client_key в том виде, в каком его сохранит сериализатор
+
+    Поле само приводит значение (число -> строка, пробелы по краям
+    убираются), поэтому поиск известных ключей совпадает с сохраненными.
+    """
+    key = item.get('client_key') if isinstance(item, dict) else None
+    if key is None:
+        return None
+    try:
+        return field.run_validation(key) or None
+    except ValidationError:
+        return None
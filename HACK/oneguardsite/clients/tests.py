@@ -1,3 +1,1127 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+from importlib.util import find_spec
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count
+from django.http import FileResponse, HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from objects.models import City, BuildingObject
+from oneguardsite import metrics
+from oneguardsite.asgi import AsyncAPIHandler
+from oneguardsite.compression import CompressionMiddleware, brotli
+from oneguardsite.renderers import ORJSONRenderer, msgpack, orjson
+from oneguardsite.db import write_transaction
+from users.authentication import clear_user_cache
+from users.models import User
+from users.serializers import CustomTokenObtainPairSerializer
+from . import activity, changes, geo, rollups
+from .phones import normalize_phone, phone_prefix
+from .audit import HistoryWriter
+from .export import XLSX_CONTENT_TYPE
+from .models import ClientData, ClientHistory
+from .seed import generate
+from .services import services_mask
+from .serializers import ClientDataSerializer
+
+
+SERVICES = [code for code, _ in ClientData.SERVICE_CHOICES]
+
+
+def seed_clients(cities=3, objects_per_city=4, engineers=3, clients=150):
+    """Заполняет БД данными, похожими на реальные: города, объекты, инженеры, визиты"""
+    rng = random.Random(42)
+    admin = User.objects.create_user('admin', password='pass', role='admin')
+    engineer_list = [
+        User.objects.create_user(f'engineer{i}', password='pass', role='engineer', city=f'Город {i}')
+        for i in range(engineers)
+    ]
+    object_list = []
+    for i in range(cities):
+        city = City.objects.create(name=f'Город {i}')
+        for j in range(objects_per_city):
+            object_list.append(BuildingObject.objects.create(
+                name=f'Объект {i}-{j}',
+                address=f'ул. Ленина, {j + 1}',
+                object_type=rng.choice(BuildingObject.OBJECT_TYPES)[0],
+                city=city,
+            ))
+    for i in range(clients):
+        engineer = rng.choice(engineer_list)
+        client = ClientData.objects.create(
+            engineer=engineer,
+            building_object=rng.choice(object_list),
+            apartment_number=str(i + 1),
+            contact_phone=f'+7 912 {i:03d}-00-00',
+            used_services=rng.sample(SERVICES, rng.randint(0, 2)),
+            interested_services=rng.sample(SERVICES, rng.randint(0, 3)),
+            provider_rating=rng.choice([None, 1, 2, 3, 4, 5]),
+            desired_price=rng.choice([None, 500, 990]),
+            notes='Нужен быстрый интернет',
+        )
+        ClientHistory.objects.create(client_data=client, user=engineer, action='Создана запись')
+    return admin, engineer_list, object_list
+
+
+# История пишется синхронно, чтобы тесты видели ее сразу
+@override_settings(CLIENT_HISTORY_ASYNC=False)
+class SeededTestCase(APITestCase):
+    """Тесты API на данных seed_clients; запросы - от имени администратора"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin, cls.engineers, cls.building_objects = seed_clients()
+        cls.client_data = ClientData.objects.filter(engineer=cls.engineers[0]).first()
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        clear_user_cache()
+        self.authenticate(self.admin)
+
+    def authenticate(self, user):
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get_ok(self, url, **params):
+        """GET с проверкой ответа 200; потоковый ответ читается целиком"""
+        response = self.client.get(url, params)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, getattr(response, 'data', None))
+        return response
+
+
+class QueryCountTestCase(SeededTestCase):
+    """Число запросов к БД не должно зависеть от размера выборки"""
+
+    def assertQueries(self, num, url, **params):
+        with self.assertNumQueries(num):
+            return self.get_ok(url, **params)
+
+
+class ClientQueryCountTests(QueryCountTestCase):
+    def test_client_list(self):
+        # одна страница клиентов с инженером, объектом и городом;
+        # пользователь берется из токена без запроса
+        response = self.assertQueries(1, reverse('client-list'), page_size=500)
+        self.assertEqual(len(response.data['results']), 150)
+
+    def test_client_list_engineer(self):
+        self.authenticate(self.engineers[0])
+        self.assertQueries(1, reverse('client-list'), page_size=500)
+
+    def test_client_list_object_type(self):
+        response = self.assertQueries(1, reverse('client-list'), page_size=500, object_type='hotel')
+        self.assertTrue(response.data['results'])
+        self.assertEqual({row['object_type'] for row in response.data['results']}, {'hotel'})
+
+    def test_client_list_next_page(self):
+        first = self.assertQueries(1, reverse('client-list'), page_size=20)
+        with self.assertNumQueries(1):
+            self.client.get(first.data['next'])
+
+    def test_client_detail(self):
+        self.assertQueries(1, reverse('client-detail', args=[self.client_data.pk]))
+
+    def test_client_history(self):
+        self.assertQueries(1, reverse('client-history', args=[self.client_data.pk]))
+
+    def test_prior_visits(self):
+        self.authenticate(self.engineers[0])
+        phone = self.client_data.contact_phone_normalized[:8]
+        self.assertQueries(1, reverse('client-prior-visits'), phone=phone)
+        self.assertQueries(
+            1, reverse('client-prior-visits'), phone=phone,
+            building_object=self.client_data.building_object_id,
+            apartment_number=self.client_data.apartment_number
+        )
+        # Слишком короткое начало номера - без запроса к БД
+        self.assertQueries(0, reverse('client-prior-visits'), phone='8912')
+
+    def test_client_export(self):
+        self.assertQueries(1, reverse('client-export'))
+
+    def test_reports(self):
+        self.assertQueries(1, reverse('client-reports'))
+        # повторный запрос берется из кэша
+        self.assertQueries(0, reverse('client-reports'))
+
+    def test_dashboard(self):
+        self.assertQueries(3, reverse('dashboard'))
+        self.assertQueries(0, reverse('dashboard'))
+
+    def test_sync_changes(self):
+        # клиенты, города, объекты, последняя отметка удаления, удаления
+        self.assertQueries(5, reverse('sync-changes'))
+
+    def test_sync_offline_batch(self):
+        self.authenticate(self.engineers[0])
+        items = [
+            {
+                'client_key': f'device-{i}',
+                'building_object': self.building_objects[i % len(self.building_objects)].pk,
+                'apartment_number': str(i),
+                'contact_phone': '+7 900 000-00-00',
+                'interested_services': ['internet'],
+            }
+            for i in range(100)
+        ]
+        # известные ключи, объекты, прежние визиты, транзакция, вставки клиентов
+        # и истории, по одному UPDATE счетчиков на затронутую группу (12 + 3 + 1)
+        with self.assertNumQueries(24):
+            response = self.client.post(reverse('sync-offline'), {'data': items}, format='json')
+        self.assertEqual(len(response.data['synced_ids']), 100)
+
+        # повтор того же пакета: только поиск известных ключей
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('sync-offline'), {'data': items}, format='json')
+        self.assertEqual(
+            {result['status'] for result in response.data['results']}, {'duplicate'}
+        )
+
+    def test_sync_numeric_client_key(self):
+        # Ключ числом сохраняется строкой; повтор пакета находит его, а не падает на уникальности
+        self.authenticate(self.engineers[0])
+        items = [{
+            'client_key': 12345, 'building_object': self.building_objects[0].pk,
+            'apartment_number': '800', 'contact_phone': '+7 900 000-00-08',
+        }]
+        first = self.client.post(reverse('sync-offline'), {'data': items}, format='json')
+        self.assertEqual(first.data['results'][0]['status'], 'created')
+        for item in [items[0], dict(items[0], client_key=' 12345 ')]:
+            response = self.client.post(reverse('sync-offline'), {'data': [item]}, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                (response.data['results'][0]['status'], response.data['results'][0]['id']),
+                ('duplicate', first.data['results'][0]['id'])
+            )
+
+
+class ClientAccessTests(SeededTestCase):
+    """Права по роли из User.role (раньше представления обращались к
+    несуществующему user.profile и падали с 500)"""
+
+    def test_engineer_sees_only_own_clients(self):
+        engineer = self.engineers[0]
+        own = set(ClientData.objects.filter(engineer=engineer).values_list('pk', flat=True))
+        other = ClientData.objects.exclude(engineer=engineer).first()
+        self.authenticate(engineer)
+
+        response = self.get_ok(reverse('client-list'), page_size=500)
+        self.assertEqual({row['id'] for row in response.data['results']}, own)
+        self.get_ok(reverse('client-detail', args=[self.client_data.pk]))
+        self.get_ok(reverse('client-history', args=[self.client_data.pk]))
+        self.assertEqual(self.client.get(reverse('client-detail', args=[other.pk])).status_code, 404)
+
+    def test_admin_sees_all_clients(self):
+        response = self.get_ok(reverse('client-list'), page_size=500)
+        self.assertEqual(len(response.data['results']), ClientData.objects.count())
+        other = ClientData.objects.exclude(engineer=self.engineers[0]).first()
+        self.get_ok(reverse('client-detail', args=[other.pk]))
+
+    def test_reports_by_role(self):
+        # Отчет по городам раньше падал на неимпортированной модели City
+        response = self.get_ok(reverse('client-reports'))
+        expected = dict(
+            ClientData.objects.values_list('building_object__city__name')
+            .annotate(count=Count('id')).order_by()
+        )
+        self.assertEqual({row['city']: row['total_clients'] for row in response.data}, expected)
+
+        self.authenticate(self.engineers[0])
+        self.assertEqual(self.client.get(reverse('client-reports')).status_code, 403)
+
+
+# Без окна безопасности изменения видны сразу
+@mock.patch.object(changes, 'SAFETY_WINDOW', datetime.timedelta(0))
+class SyncChangesTests(SeededTestCase):
+    def pull(self, user, since=None):
+        self.authenticate(user)
+        return self.get_ok(reverse('sync-changes'), **({'since': since} if since else {})).data
+
+    def test_reassigned_client(self):
+        client = self.client_data
+        old, new = self.engineers[0], self.engineers[1]
+        marks = {user.pk: self.pull(user)['watermark'] for user in (old, new, self.admin)}
+
+        client.engineer = new
+        client.save()
+        # Прежний инженер удаляет запись у себя, новому и администратору она остается
+        self.assertEqual(self.pull(old, marks[old.pk])['clients']['deleted'], [client.pk])
+        received = self.pull(new, marks[new.pk])['clients']
+        self.assertEqual([row['id'] for row in received['updated']], [client.pk])
+        self.assertEqual(received['deleted'], [])
+        self.assertEqual(self.pull(self.admin, marks[self.admin.pk])['clients']['deleted'], [])
+
+        # Запись вернулась прежнему инженеру - отметка ее больше не удаляет
+        client.engineer = old
+        client.save()
+        received = self.pull(old, marks[old.pk])['clients']
+        self.assertEqual(([row['id'] for row in received['updated']], received['deleted']), ([client.pk], []))
+
+    def test_fresh_device(self):
+        engineer = self.engineers[0]
+        removed = ClientData.objects.filter(engineer=engineer).exclude(pk=self.client_data.pk).first()
+        removed_pk = removed.pk
+        removed.delete()
+        # Первая синхронизация не тащит накопленные отметки
+        first = self.pull(engineer)
+        self.assertEqual(first['clients']['deleted'], [])
+        self.assertNotIn(removed_pk, [row['id'] for row in first['clients']['updated']])
+
+        pk = self.client_data.pk
+        self.client_data.delete()
+        self.assertEqual(self.pull(engineer, first['watermark'])['clients']['deleted'], [pk])
+
+    def test_reassigned_by_import(self):
+        client = self.client_data
+        watermark = self.pull(self.engineers[0])['watermark']
+        self.authenticate(self.admin)
+        text = (
+            'building_object,apartment_number,contact_phone,engineer_name\n'
+            f'{client.building_object_id},{client.apartment_number},{client.contact_phone},engineer2\n'
+        )
+        upload = SimpleUploadedFile('clients.csv', text.encode('utf-8'), content_type='text/csv')
+        response = self.client.post(reverse('client-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.data['updated'], 1, response.data)
+        self.assertEqual(self.pull(self.engineers[0], watermark)['clients']['deleted'], [client.pk])
+
+
+class FastListSerializationTests(SeededTestCase):
+    def test_client_list_matches_model_serializer(self):
+        response = self.client.get(reverse('client-list'), {'page_size': 500})
+        expected = ClientDataSerializer(
+            ClientData.objects.order_by('-created_at', '-id'), many=True
+        ).data
+        self.assertEqual(
+            JSONRenderer().render(response.data['results']),
+            JSONRenderer().render(expected)
+        )
+
+
+class NearbyClientsTests(QueryCountTestCase):
+    CENTER = (55.7558, 37.6173)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Клиенты на разном расстоянии к северу от центра
+        cls.offsets = {}
+        for index, client in enumerate(ClientData.objects.order_by('id')[:40]):
+            client.latitude = cls.CENTER[0] + index * 0.002
+            client.longitude = cls.CENTER[1]
+            client.save()
+            cls.offsets[client.pk] = geo.haversine(*cls.CENTER, client.latitude, client.longitude)
+
+    def test_radius(self):
+        lat, lon = self.CENTER
+        # координаты кандидатов, затем полные строки только ближних
+        response = self.assertQueries(2, reverse('client-nearby'), lat=lat, lon=lon, radius=2000)
+        expected = sorted(pk for pk, distance in self.offsets.items() if distance <= 2000)
+        self.assertEqual(sorted(row['id'] for row in response.data), expected)
+        distances = [row['distance'] for row in response.data]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_engineer_sees_only_own(self):
+        engineer = self.engineers[0]
+        self.authenticate(engineer)
+        lat, lon = self.CENTER
+        response = self.assertQueries(2, reverse('client-nearby'), lat=lat, lon=lon, radius=50000)
+        self.assertTrue(response.data)
+        self.assertEqual({row['engineer'] for row in response.data}, {engineer.pk})
+
+    def test_bbox(self):
+        lat, lon = self.CENTER
+        bbox = f'{lat - 0.001},{lon - 0.001},{lat + 0.011},{lon + 0.001}'
+        response = self.assertQueries(1, reverse('client-nearby'), bbox=bbox, limit=500)
+        self.assertEqual(len(response.data), 6)
+
+        # limit - самые новые из прямоугольника
+        newest = self.assertQueries(1, reverse('client-nearby'), bbox=bbox, limit=2)
+        self.assertEqual([row['id'] for row in newest.data], [row['id'] for row in response.data[:2]])
+
+    def test_radius_limit(self):
+        lat, lon = self.CENTER
+        response = self.assertQueries(2, reverse('client-nearby'), lat=lat, lon=lon, radius=50000, limit=3)
+        self.assertEqual(
+            [row['id'] for row in response.data],
+            sorted(self.offsets, key=self.offsets.get)[:3]
+        )
+
+    def test_geo_cell_matches_python(self):
+        for client in ClientData.objects.filter(latitude__isnull=False):
+            self.assertEqual(client.geo_cell, geo.cell_of(client.latitude, client.longitude))
+
+    def test_requires_center_or_bbox(self):
+        self.assertEqual(self.client.get(reverse('client-nearby')).status_code, 400)
+
+
+class ServiceFilterTests(QueryCountTestCase):
+    def test_masks_match_json(self):
+        ClientData.objects.filter(pk=self.client_data.pk).update(used_services=['tv', 'smart_home'])
+        for client in ClientData.objects.all():
+            self.assertEqual(
+                client.used_services_mask,
+                services_mask(ClientData.SERVICE_CHOICES, client.used_services)
+            )
+            self.assertEqual(
+                client.interested_services_mask,
+                services_mask(ClientData.SERVICE_CHOICES, client.interested_services)
+            )
+
+    def test_list_filters(self):
+        response = self.assertQueries(
+            1, reverse('client-list'), interested='internet,tv', used='phone', page_size=500
+        )
+        expected = sorted(
+            client.pk for client in ClientData.objects.all()
+            if {'internet', 'tv'} <= set(client.interested_services)
+            and 'phone' in client.used_services
+        )
+        self.assertTrue(expected)
+        self.assertEqual(sorted(row['id'] for row in response.data['results']), expected)
+
+    def test_unknown_service(self):
+        response = self.client.get(reverse('client-list'), {'interested': 'internet,fax'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ClientSearchTests(QueryCountTestCase):
+    def search(self, q, **params):
+        response = self.client.get(reverse('client-search'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['id'] for row in response.data['results']]
+
+    def test_ranked_and_paginated(self):
+        ClientData.objects.filter(pk=self.client_data.pk).update(notes='Оптоволокно, оптоволокно!')
+        other = ClientData.objects.exclude(pk=self.client_data.pk).first()
+        other.notes = 'Спрашивал про оптоволокно'
+        other.save()
+        # количество + страница
+        response = self.assertQueries(2, reverse('client-search'), q='оптовол')
+        self.assertEqual([row['id'] for row in response.data['results']], [self.client_data.pk, other.pk])
+        self.assertEqual(self.search('оптовол', page_size=1), [self.client_data.pk])
+
+    def test_index_follows_writes(self):
+        building = self.client_data.building_object
+        building.name = 'ЖК Солнечный'
+        building.save()
+        expected = ClientData.objects.filter(building_object=building).count()
+        self.assertEqual(len(self.search('солнечн', page_size=100)), expected)
+
+        self.client_data.delete()
+        self.assertEqual(len(self.search('солнечн', page_size=100)), expected - 1)
+
+    def test_engineer_sees_only_own(self):
+        engineer = self.engineers[0]
+        self.authenticate(engineer)
+        found = self.search('быстрый интернет', page_size=100)
+        self.assertEqual(
+            sorted(found),
+            sorted(ClientData.objects.filter(engineer=engineer).values_list('id', flat=True))
+        )
+
+    def test_dashboard_follows_search(self):
+        building = self.client_data.building_object
+        building.name = 'ЖК Солнечный'
+        building.save()
+        params = {'q': 'солнечн', 'interested': 'internet'}
+        found = self.search(page_size=100, **params)
+        self.assertTrue(found)
+        response = self.client.get(reverse('dashboard'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['total_clients'], len(found))
+        self.assertNotIn('priorities', response.data)
+
+    def test_admin_search(self):
+        self.client.force_login(User.objects.create_superuser('root', password='pass'))
+        ClientData.objects.filter(pk=self.client_data.pk).update(
+            notes='Домофон не работает, код домофона 4321', created_at=timezone.now() - datetime.timedelta(days=30)
+        )
+        other = ClientData.objects.exclude(pk=self.client_data.pk).first()
+        ClientData.objects.filter(pk=other.pk).update(notes='Спрашивал про домофон', created_at=timezone.now())
+        url = reverse('admin:clients_clientdata_changelist')
+        # Сначала более релевантная запись, хотя она старше
+        response = self.client.get(url, {'q': 'домофон'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.client_data, other])
+        # Сортировка по колонке, выбранная явно, важнее релевантности
+        response = self.client.get(url, {'q': 'домофон', 'o': '-5'})
+        self.assertEqual(list(response.context['cl'].result_list), [other, self.client_data])
+
+
+class HistoryWriterTests(TransactionTestCase):
+    def setUp(self):
+        self.admin, self.engineers, _ = seed_clients(clients=5)
+        self.clients = list(ClientData.objects.all())
+
+    def test_background_flush_and_drain(self):
+        writer = HistoryWriter(batch_size=3, flush_interval=0.05)
+        before = ClientHistory.objects.count()
+        for client in self.clients * 2:
+            writer.record(client.pk, self.admin.pk, 'Проверка')
+        writer.shutdown()
+
+        self.assertEqual(ClientHistory.objects.count(), before + 10)
+        metrics = writer.metrics()
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertEqual(metrics['written'], 10)
+        self.assertGreaterEqual(metrics['flushes'], 4)
+
+    def test_deleted_client_drops_only_its_events(self):
+        writer = HistoryWriter()
+        batch = [
+            ClientHistory(client_data_id=client.pk, user_id=self.admin.pk, action='Пакет')
+            for client in self.clients
+        ]
+        # Клиента удалили до того, как пакет дошел до БД
+        ClientData.objects.filter(pk=self.clients[0].pk).delete()
+        with self.assertLogs('clients.audit', 'ERROR'):
+            writer.flush(batch)
+
+        self.assertEqual(
+            set(ClientHistory.objects.filter(action='Пакет').values_list('client_data_id', flat=True)),
+            {client.pk for client in self.clients[1:]}
+        )
+        self.assertEqual((writer.metrics()['written'], writer.metrics()['failed']), (4, 1))
+
+    @override_settings(CLIENT_HISTORY_ASYNC=False)
+    def test_sync_mode(self):
+        writer = HistoryWriter()
+        writer.record(self.clients[0].pk, self.admin.pk, 'Сразу')
+        self.assertTrue(ClientHistory.objects.filter(action='Сразу').exists())
+        self.assertIsNone(writer.thread)
+
+
+class AsyncReadTests(QueryCountTestCase):
+    def assertSameResponse(self, name, async_name, *args, **params):
+        expected = self.client.get(reverse(name, args=args), params)
+        response = self.client.get(reverse(async_name, args=args), params)
+        self.assertEqual(response.status_code, expected.status_code)
+        # Ссылки пагинации ведут на тот же адрес, по которому пришел запрос
+        self.assertEqual(
+            response.content.replace(b'/api/async/', b'/api/'), expected.content
+        )
+        return response
+
+    def test_client_list(self):
+        self.assertSameResponse('client-list', 'async-client-list', page_size=30, interested='tv')
+        with self.assertNumQueries(1):
+            self.client.get(reverse('async-client-list'), {'page_size': 30})
+
+    def test_client_list_next_page(self):
+        first = self.client.get(reverse('async-client-list'), {'page_size': 20}).json()
+        cursor = first['next'].split('cursor=')[1].split('&')[0]
+        self.assertSameResponse('client-list', 'async-client-list', page_size=20, cursor=cursor)
+
+    def test_client_detail(self):
+        self.assertSameResponse('client-detail', 'async-client-detail', self.client_data.pk)
+        missing = self.client.get(reverse('async-client-detail', args=[10 ** 6]))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_engineer_visibility(self):
+        self.authenticate(self.engineers[1])
+        response = self.client.get(reverse('async-client-detail', args=[self.client_data.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_reports(self):
+        self.assertSameResponse('client-reports', 'async-client-reports')
+        self.authenticate(self.engineers[0])
+        self.assertSameResponse('client-reports', 'async-client-reports')
+
+    def test_requires_token(self):
+        self.client.credentials()
+        response = self.client.get(reverse('async-client-list'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+
+    def test_read_only(self):
+        response = self.client.post(reverse('async-client-list'), {})
+        self.assertEqual(response.status_code, 405)
+
+    def test_asgi_handler_middleware(self):
+        middleware = list(settings.MIDDLEWARE)
+        handler = AsyncAPIHandler()
+        # Короткая цепочка собрана без подмены общего списка middleware
+        self.assertEqual(settings.MIDDLEWARE, middleware)
+
+        token = CustomTokenObtainPairSerializer.get_token(self.engineers[0]).access_token
+        request = AsyncRequestFactory().get(
+            reverse('async-current-user'), headers={'Authorization': f'Bearer {token}'}
+        )
+        response = async_to_sync(handler.get_response_async)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('total;dur=', response['Server-Timing'])
+        # Сессии и CSRF в цепочку не входят
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+        self.assertFalse(response.has_header('X-Frame-Options'))
+
+
+@override_settings(DATABASE_WRITE_RETRY_DELAY=0)
+class WriteTransactionTests(TransactionTestCase):
+    def locked(self, calls, succeed_after=None):
+        @write_transaction
+        def write():
+            calls.append(City.objects.create(name=f'Город {len(calls)}'))
+            if succeed_after is None or len(calls) < succeed_after:
+                raise OperationalError('database is locked')
+            return calls[-1]
+        return write
+
+    def test_retries_whole_transaction(self):
+        calls = []
+        city = self.locked(calls, succeed_after=3)()
+        self.assertEqual(len(calls), 3)
+        # Неудачные попытки откатываются целиком
+        self.assertEqual(list(City.objects.values_list('pk', flat=True)), [city.pk])
+
+    @override_settings(DATABASE_WRITE_RETRIES=1)
+    def test_gives_up(self):
+        calls = []
+        with self.assertRaises(OperationalError):
+            self.locked(calls)()
+        self.assertEqual(len(calls), 2)
+        self.assertFalse(City.objects.exists())
+
+    def test_other_errors_not_retried(self):
+        calls = []
+
+        @write_transaction
+        def broken():
+            calls.append(1)
+            raise OperationalError('no such table: missing')
+
+        with self.assertRaises(OperationalError):
+            broken()
+        self.assertEqual(len(calls), 1)
+
+    def test_nested_call_not_retried(self):
+        calls = []
+        with self.assertRaises(OperationalError), transaction.atomic():
+            self.locked(calls, succeed_after=2)()
+        self.assertEqual(len(calls), 1)
+
+    def test_connection_settings(self):
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 10000)
+
+
+class SeedDataTests(TestCase):
+    def test_generate(self):
+        counts = generate(cities=3, objects_per_city=4, engineers=5, clients=300, days=30, batch_size=100)
+
+        self.assertEqual(counts['clients'], 300)
+        self.assertEqual(ClientData.objects.count(), 300)
+        self.assertEqual(ClientHistory.objects.count(), counts['history'])
+        self.assertGreater(counts['history'], 300)
+        # Счетчики пересобраны после вставки пакетами
+        self.assertEqual(rollups.find_mismatches(), [])
+
+        now = timezone.now()
+        for created_at, updated_at in ClientData.objects.values_list('created_at', 'updated_at'):
+            self.assertLessEqual(now - datetime.timedelta(days=31), created_at)
+            self.assertLessEqual(created_at, updated_at)
+            self.assertLessEqual(updated_at, now)
+
+        # Инженеры работают с разной интенсивностью
+        per_engineer = sorted(
+            ClientData.objects.values('engineer').annotate(total=Count('id')).values_list('total', flat=True)
+        )
+        self.assertGreater(per_engineer[-1], 2 * per_engineer[0])
+
+
+class ClientStatsSignalTests(SeededTestCase):
+    """Счетчики, которые ведут сигналы, совпадают с пересчетом по таблице клиентов"""
+
+    def test_update(self):
+        client = self.client_data
+        other = next(
+            building_object for building_object in self.building_objects
+            if building_object.city_id != client.building_object.city_id
+        )
+        client.engineer = self.engineers[1]
+        client.building_object = other
+        client.used_services = ['tv', 'security']
+        client.interested_services = ['internet']
+        client.provider_rating = 4
+        client.desired_price = 1250
+        client.save()
+        self.assertEqual(rollups.find_mismatches(), [])
+
+    def test_update_via_api(self):
+        response = self.client.patch(
+            reverse('client-detail', args=[self.client_data.pk]),
+            {'used_services': ['phone'], 'provider_rating': None, 'desired_price': '700.00'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(rollups.find_mismatches(), [])
+
+    def test_delete(self):
+        self.client_data.delete()
+        ClientData.objects.filter(engineer=self.engineers[2]).first().delete()
+        self.assertEqual(rollups.find_mismatches(), [])
+
+    def test_building_object_moves_to_another_city(self):
+        building_object = self.client_data.building_object
+        self.assertTrue(ClientData.objects.filter(building_object=building_object).exists())
+        building_object.city = City.objects.exclude(pk=building_object.city_id).first()
+        building_object.save()
+        self.assertEqual(rollups.find_mismatches(), [])
+
+        # В новый город, которого еще нет в счетчиках
+        building_object.city = City.objects.create(name='Новый город')
+        building_object.save()
+        self.assertEqual(rollups.find_mismatches(), [])
+
+
+class ImportTests(SeededTestCase):
+    def upload(self, url, text, name='data.csv'):
+        upload = SimpleUploadedFile(name, text.encode('utf-8'), content_type='text/csv')
+        return self.client.post(url, {'file': upload}, format='multipart')
+
+    def test_import_clients(self):
+        existing = ClientData.objects.filter(building_object=self.building_objects[0]).first()
+        building_object = existing.building_object
+        text = (
+            'city_name,building_object_address,engineer_name,apartment_number,contact_phone,'
+            'used_services,provider_rating,created_at\n'
+            f'{building_object.city.name},"{building_object.address}",engineer1,{existing.apartment_number},'
+            '+7 900 000-00-01,"internet, tv",5,\n'
+            f'{building_object.city.name},"{building_object.address}",,999,+7 900 000-00-02,,,01.02.2024 10:30\n'
+            f'{building_object.city.name},ул. Несуществующая,,1000,+7 900 000-00-03,,,\n'
+            f'{building_object.city.name},"{building_object.address}",engineer1,1001,+7 900 000-00-04,zoo,,\n'
+        )
+        total = ClientData.objects.count()
+        # Счетчики обновляются пачкой, как при большой загрузке
+        with mock.patch.object(rollups, 'BULK_GROUPS', 0):
+            response = self.upload(reverse('client-import'), text)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            (response.data['created'], response.data['updated'], response.data['invalid']), (1, 1, 2),
+            response.data['errors']
+        )
+        self.assertEqual([error['row'] for error in response.data['errors']], [4, 5])
+        self.assertEqual(ClientData.objects.count(), total + 1)
+
+        # Запись по квартире обновлена, пустые ячейки не затерли данные
+        existing_notes = existing.notes
+        existing.refresh_from_db()
+        self.assertEqual(existing.engineer, self.engineers[1])
+        self.assertEqual((existing.used_services, existing.provider_rating), (['internet', 'tv'], 5))
+        self.assertEqual(existing.notes, existing_notes)
+
+        # Без engineer_name инженер - загружающий пользователь, дата визита из файла
+        created = ClientData.objects.get(building_object=building_object, apartment_number='999')
+        self.assertEqual(created.engineer, self.admin)
+        self.assertEqual(timezone.localtime(created.created_at).date(), datetime.date(2024, 2, 1))
+        self.assertEqual(ClientHistory.objects.filter(client_data__in=[existing, created]).count(), 3)
+        self.assertEqual(rollups.find_mismatches(), [])
+
+    def test_import_format_errors(self):
+        response = self.upload(reverse('client-import'), 'name,address\nДом,ул. Мира\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('apartment_number', response.data['error'])
+
+        with mock.patch.dict(sys.modules, {'openpyxl': None}):
+            response = self.upload(reverse('client-import'), '', name='clients.xlsx')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('openpyxl', response.data['error'])
+
+    def test_import_limits(self):
+        text = 'building_object,apartment_number,contact_phone\n' + ''.join(
+            f'{self.building_objects[0].pk},{700 + number},+7 900 100-00-{number:02d}\n' for number in range(3)
+        )
+        total = ClientData.objects.count()
+        # Файл длиннее лимита отклоняется до записи первой пачки
+        with override_settings(IMPORT_MAX_ROWS=2):
+            response = self.upload(reverse('client-import'), text)
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('import_data', response.data['error'])
+        self.assertEqual(ClientData.objects.count(), total)
+
+        with override_settings(IMPORT_MAX_UPLOAD_SIZE=len(text) - 1):
+            response = self.upload(reverse('client-import'), text)
+        self.assertEqual(response.status_code, 413)
+
+        with override_settings(IMPORT_MAX_ROWS=3):
+            response = self.upload(reverse('client-import'), text)
+        self.assertEqual((response.status_code, response.data['created']), (200, 3))
+
+    @unittest.skipUnless(find_spec('openpyxl') and find_spec('xlsxwriter'), 'нужны openpyxl и xlsxwriter')
+    def test_xlsx_round_trip(self):
+        # Выгрузка XLSX загружается обратно без ошибок и без новых записей
+        exported = self.client.get(reverse('client-export'), {'file_format': 'xlsx'})
+        upload = SimpleUploadedFile('clients.xlsx', b''.join(exported.streaming_content))
+        total = ClientData.objects.count()
+        response = self.client.post(reverse('client-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            (response.data['rows'], response.data['created'], response.data['updated'], response.data['invalid']),
+            (total, 0, total, 0), response.data['errors'][:3]
+        )
+        self.assertEqual(ClientData.objects.count(), total)
+
+
+class ServerTimingTests(SeededTestCase):
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('client-list'))
+        metrics = dict(
+            part.strip().split(';', 1) for part in response['Server-Timing'].split(',')
+        )
+        self.assertEqual(set(metrics), {'db', 'auth', 'serialize', 'app', 'total'})
+        self.assertIn(f'desc="{len(queries)} SQL"', metrics['db'])
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_request_log(self):
+        with self.assertLogs('oneguardsite.timing', 'WARNING') as logs:
+            self.client.get(reverse('client-reports'))
+            self.client.get(reverse('client-list'), {'engineer': self.engineers[0].pk})
+        reports, clients = [json.loads(line.split(': ', 1)[1]) for line in logs.output]
+
+        self.assertEqual((reports['view'], reports['status'], reports['user']), ('client_reports', 200, self.admin.pk))
+        self.assertEqual(clients['view'], 'ClientDataListView')
+        self.assertEqual(clients['queries'], sum(entry['count'] for entry in clients['top_sql']))
+        self.assertIn('clients_clientdata', clients['top_sql'][0]['sql'])
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=None)
+    def test_slow_request_log_disabled(self):
+        with self.assertNoLogs('oneguardsite.timing'):
+            self.client.get(reverse('client-reports'))
+
+
+class MetricsTests(SeededTestCase):
+    @staticmethod
+    def value(metric, **labels):
+        return metrics.REGISTRY.collect().get((metric.name, metric.label_values(labels)), 0)
+
+    def test_request_and_cache_metrics(self):
+        requests = self.value(metrics.HTTP_REQUESTS, view='client-reports', method='GET', status=200)
+        durations = self.value(metrics.HTTP_REQUEST_SECONDS, view='client-reports') or [0] * 13
+        hits = self.value(metrics.CACHE_REQUESTS, cache='reports', result='hit')
+        misses = self.value(metrics.CACHE_REQUESTS, cache='reports', result='miss')
+
+        self.client.get(reverse('client-reports'))
+        self.client.get(reverse('client-reports'))
+
+        self.assertEqual(self.value(metrics.HTTP_REQUESTS, view='client-reports', method='GET', status=200), requests + 2)
+        self.assertEqual(sum(self.value(metrics.HTTP_REQUEST_SECONDS, view='client-reports')[:-1]), sum(durations[:-1]) + 2)
+        self.assertEqual(self.value(metrics.CACHE_REQUESTS, cache='reports', result='hit'), hits + 1)
+        self.assertEqual(self.value(metrics.CACHE_REQUESTS, cache='reports', result='miss'), misses + 1)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        text = response.content.decode()
+        self.assertIn('# TYPE oneguard_http_request_duration_seconds histogram', text)
+        self.assertIn(f'oneguard_http_requests_total{{view="client-reports",method="GET",status="200"}} {requests + 2}', text)
+        self.assertIn('oneguard_http_request_db_queries_bucket{view="client-reports",le="+Inf"}', text)
+
+        self.authenticate(self.engineers[0])
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_sync_batch_metrics(self):
+        self.authenticate(self.engineers[0])
+        batches = self.value(metrics.SYNC_BATCH_SIZE) or [0] * 11
+        created = self.value(metrics.SYNC_RECORDS, status='created')
+        items = [
+            {
+                'client_key': f'metrics-{i}', 'building_object': self.building_objects[0].pk,
+                'apartment_number': str(i), 'contact_phone': '+7 900 000-00-00',
+            }
+            for i in range(3)
+        ]
+        self.client.post(reverse('sync-offline'), {'data': items}, format='json')
+
+        after = self.value(metrics.SYNC_BATCH_SIZE)
+        self.assertEqual(sum(after[:-1]), sum(batches[:-1]) + 1)
+        self.assertEqual(after[-1], batches[-1] + 3)
+        self.assertEqual(self.value(metrics.SYNC_RECORDS, status='created'), created + 3)
+
+    def test_multiprocess_aggregation(self):
+        registry = metrics.Registry()
+        counter = metrics.Counter('test_total', 'Тест', ('kind',), registry=registry)
+        histogram = metrics.Histogram('test_seconds', 'Тест', buckets=(0.1, 1.0), registry=registry)
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            # Файл другого воркера
+            with open(f'{directory}/1-1.json', 'w') as output:
+                json.dump([['test_total', ['a'], 5], ['test_seconds', [], [1, 0, 0, 0.05]]], output)
+            counter.inc(2, kind='a')
+            histogram.observe(0.5)
+            self.assertEqual(registry.collect(), {
+                ('test_total', ('a',)): 7, ('test_seconds', ()): [1, 1, 0, 0.55],
+            })
+
+            # Потомок после fork начинает с нуля, файл прежнего процесса остается
+            registry.reset()
+            counter.inc(kind='a')
+            text = registry.render()
+        self.assertIn('test_total{kind="a"} 8', text)
+        self.assertIn('test_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('test_seconds_count 2', text)
+
+    @unittest.skipUnless(metrics.fcntl, 'нет fcntl')
+    def test_finished_workers_folded(self):
+        registry = metrics.Registry()
+        counter = metrics.Counter('test_total', 'Тест', registry=registry)
+        # Второй воркер - отдельный реестр со своим файлом и замком
+        worker = metrics.Registry()
+        worker_counter = metrics.Counter('test_total', 'Тест', registry=worker)
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            # Файл воркера, завершившегося без замка
+            with open(f'{directory}/1-1.json', 'w') as output:
+                json.dump([['test_total', [], 5]], output)
+            counter.inc(2)
+            worker_counter.inc(3)
+            worker.flush(directory)
+            self.assertEqual(registry.collect(), {('test_total', ()): 10})
+            # Мертвый файл слит, живой воркер пишет в свой
+            self.assertNotIn('1-1.json', os.listdir(directory))
+            self.assertTrue(os.path.exists(worker.path))
+
+            worker_path = worker.path
+            worker.shutdown()
+            self.assertFalse(os.path.exists(worker_path))
+            self.assertEqual(registry.collect(), {('test_total', ()): 10})
+            self.assertEqual(
+                sorted(name for name in os.listdir(directory) if name.endswith('.json')),
+                sorted(['aggregate.json', os.path.basename(registry.path)])
+            )
+
+
+class ActivityTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        # Часть клиентов и их истории - в прошлых днях
+        now = timezone.now()
+        for days, client in enumerate(ClientData.objects.order_by('id')[:60]):
+            moment = now - datetime.timedelta(days=days % 6 + 1)
+            ClientData.objects.filter(pk=client.pk).update(created_at=moment)
+            ClientHistory.objects.filter(client_data=client).update(timestamp=moment)
+
+    def expected(self, queryset, field, date_from):
+        counts = {}
+        for moment in queryset.filter(**{f'{field}__date__gte': date_from}).values_list(field, flat=True):
+            day = timezone.localtime(moment).date()
+            counts[day] = counts.get(day, 0) + 1
+        return counts
+
+    def test_closed_buckets_cached(self):
+        today = timezone.localdate()
+        date_from = today - datetime.timedelta(days=9)
+        response = self.assertQueries(1, reverse('client-activity'), date_from=date_from)
+        self.assertEqual(len(response.data), 10)
+        counts = self.expected(ClientData.objects.all(), 'created_at', date_from)
+        self.assertEqual({entry['period']: entry['count'] for entry in response.data if entry['count']}, counts)
+
+        # Новая запись попадает в открытую корзину; закрытые берутся из кэша
+        self.client.post(reverse('client-list'), {
+            'building_object': self.building_objects[0].pk, 'apartment_number': '900',
+            'contact_phone': '+7 900 000-00-00',
+        }, format='json')
+        response = self.assertQueries(1, reverse('client-activity'), date_from=date_from)
+        self.assertEqual(response.data[-1]['count'], counts.get(today, 0) + 1)
+
+        # Прошлый диапазон целиком закрыт и уже посчитан - без запросов к БД
+        past = {'date_from': date_from, 'date_to': today - datetime.timedelta(days=2)}
+        self.assertQueries(0, reverse('client-activity'), **past)
+
+        # Удаление меняет прошлое и сбрасывает закрытые корзины
+        ClientData.objects.filter(created_at__date=today - datetime.timedelta(days=3)).first().delete()
+        response = self.assertQueries(1, reverse('client-activity'), **past)
+        self.assertEqual(
+            {entry['period']: entry['count'] for entry in response.data if entry['count']},
+            self.expected(ClientData.objects.filter(created_at__date__lte=past['date_to']), 'created_at', date_from)
+        )
+
+    def test_split_and_visibility(self):
+        engineer = self.engineers[0]
+        self.authenticate(engineer)
+        date_from = timezone.localdate() - datetime.timedelta(days=7)
+        response = self.assertQueries(
+            1, reverse('client-activity'), source='history', bucket='week', split='city', date_from=date_from
+        )
+        history = ClientHistory.objects.filter(client_data__engineer=engineer)
+        self.assertEqual(
+            sum(entry['count'] for entry in response.data),
+            history.filter(timestamp__gte=activity.bucket_range('week', date_from)[0]).count()
+        )
+        for entry in response.data:
+            self.assertEqual(sum(entry['groups'].values()), entry['count'])
+
+        response = self.client.get(reverse('client-activity'), {
+            'bucket': 'hour', 'date_from': timezone.localdate() - datetime.timedelta(days=100)
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class PriorVisitTests(SeededTestCase):
+    def test_normalized_phone(self):
+        phones = ['8 (912) 555-12-34', '+7 912 555 12 34', '912.555.12.34', '+996 555 123 456', '']
+        clients = ClientData.objects.filter(engineer=self.engineers[0])[:len(phones)]
+        for client, phone in zip(clients, phones):
+            ClientData.objects.filter(pk=client.pk).update(contact_phone=phone)
+        # Колонку считает БД - по тем же правилам, что normalize_phone
+        self.assertEqual(
+            [client.contact_phone_normalized for client in ClientData.objects.filter(pk__in=[c.pk for c in clients]).order_by('-created_at')],
+            [normalize_phone(phone) for phone in phones]
+        )
+        self.assertEqual(normalize_phone(phones[0]), '79125551234')
+        self.assertEqual(normalize_phone(phones[2]), '79125551234')
+        self.assertEqual(phone_prefix('8 912 55'), '791255')
+        self.assertEqual(phone_prefix('+996 55'), '99655')
+
+    def test_prior_visits(self):
+        visited = ClientData.objects.filter(engineer=self.engineers[0]).first()
+        # Начало номера, набранное с 8, - среди своих записей
+        phone = '8' + visited.contact_phone_normalized[1:8]
+        self.authenticate(self.engineers[0])
+        response = self.get_ok(reverse('client-prior-visits'), phone=phone)
+        self.assertEqual([visit['id'] for visit in response.data], [visited.pk])
+        self.assertEqual((response.data[0]['matched_by'], response.data[0]['own']), (['phone'], True))
+
+        # Чужая запись - только по полному номеру, без контактов
+        self.authenticate(self.engineers[1])
+        self.assertEqual(self.get_ok(reverse('client-prior-visits'), phone=phone).data, [])
+        response = self.get_ok(reverse('client-prior-visits'), phone=visited.contact_phone)
+        self.assertEqual([visit['id'] for visit in response.data], [visited.pk])
+        self.assertEqual((response.data[0]['matched_by'], response.data[0]['own']), (['phone'], False))
+        self.assertNotIn('contact_phone', response.data[0])
+
+        response = self.get_ok(
+            reverse('client-prior-visits'), phone=phone,
+            building_object=visited.building_object_id, apartment_number=visited.apartment_number
+        )
+        found = next(visit for visit in response.data if visit['id'] == visited.pk)
+        # Квартира не выдает, что номер чужого клиента начинается так же
+        self.assertEqual(found['matched_by'], ['apartment'])
+        self.assertEqual(self.get_ok(reverse('client-prior-visits'), phone='8912').data, [])
+
+    def test_batch_flags(self):
+        visited = ClientData.objects.filter(engineer=self.engineers[0]).first()
+        # Загрузка из файла: та же квартира - обновление, повтор - только номер по другому адресу
+        building_object = self.building_objects[-1]
+        text = (
+            'building_object,apartment_number,contact_phone\n'
+            f'{building_object.pk},600,"{visited.contact_phone}"\n'
+            f'{visited.building_object_id},{visited.apartment_number},"{visited.contact_phone}"\n'
+        )
+        upload = SimpleUploadedFile('clients.csv', text.encode('utf-8'), content_type='text/csv')
+        report = self.client.post(reverse('client-import'), {'file': upload}, format='multipart').data
+        self.assertEqual(report['flagged'], 1)
+        self.assertEqual(report['prior_visits'][0]['row'], 2)
+        self.assertIn(visited.pk, report['prior_visits'][0]['ids'])
+
+        self.authenticate(self.engineers[1])
+        items = [
+            {'client_key': 'prior-1', 'building_object': self.building_objects[-1].pk,
+             'apartment_number': '500', 'contact_phone': visited.contact_phone},
+            {'client_key': 'prior-2', 'building_object': visited.building_object_id,
+             'apartment_number': visited.apartment_number, 'contact_phone': '+7 999 000-00-00'},
+            {'client_key': 'prior-3', 'building_object': self.building_objects[-1].pk,
+             'apartment_number': '501', 'contact_phone': '+7 999 000-00-01'},
+        ]
+        results = self.client.post(reverse('sync-offline'), {'data': items}, format='json').data['results']
+        self.assertIn(visited.pk, results[0]['prior_visits'])
+        self.assertIn(visited.pk, results[1]['prior_visits'])
+        self.assertNotIn('prior_visits', results[2])
+
+
+class RendererTests(SeededTestCase):
+    @unittest.skipUnless(orjson, 'orjson не установлен')
+    def test_orjson_same_as_json(self):
+        data = [
+            self.client.get(reverse('client-list')).data,
+            self.client.get(reverse('client-activity'), bucket='hour', split='city').data,
+            {'note': 'строка\u2028абзац\u2029', 1: datetime.date(2024, 1, 2), 'time': timezone.now()},
+        ]
+        for item in data:
+            self.assertEqual(ORJSONRenderer().render(item), JSONRenderer().render(item))
+
+    def test_compressed_above_threshold(self):
+        plain = self.client.get(reverse('client-list'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        response = self.client.get(reverse('client-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        with override_settings(COMPRESSION_MIN_SIZE=len(plain.content) + 1):
+            response = self.client.get(reverse('client-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_compressed_formats_passed_through(self):
+        middleware = CompressionMiddleware(lambda request: response)
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        body = b'PK' + b'0' * 4096
+        for response in (
+            HttpResponse(body, content_type='application/zip'),
+            HttpResponse(body, content_type='image/png'),
+            FileResponse(io.BytesIO(body), content_type=XLSX_CONTENT_TYPE),
+        ):
+            result = middleware(request)
+            self.assertFalse(result.has_header('Content-Encoding'), response['Content-Type'])
+            content = b''.join(result.streaming_content) if result.streaming else result.content
+            self.assertEqual(content, body)
+
+        response = HttpResponse(b'<svg/>' * 1000, content_type='image/svg+xml')
+        self.assertTrue(middleware(request).has_header('Content-Encoding'))
+
+    @unittest.skipUnless(brotli, 'brotli не установлен')
+    def test_brotli(self):
+        plain = self.client.get(reverse('client-list'))
+        response = self.client.get(reverse('client-list'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    @unittest.skipUnless(msgpack, 'msgpack не установлен')
+    def test_msgpack(self):
+        expected = self.client.get(reverse('client-list')).content
+        response = self.client.get(reverse('client-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(JSONRenderer().render(msgpack.unpackb(response.content)), expected)
+
+        self.authenticate(self.engineers[0])
+        items = [{'client_key': 'packed-1', 'building_object': self.building_objects[0].pk,
+                  'apartment_number': '700', 'contact_phone': '+7 999 100-00-00'}]
+        response = self.client.post(
+            reverse('sync-offline'), msgpack.packb({'data': items}),
+            content_type='application/msgpack', HTTP_ACCEPT='application/msgpack'
+        )
+        self.assertEqual(msgpack.unpackb(response.content)['results'][0]['status'], 'created')
+
+    @unittest.skipUnless(msgpack, 'msgpack не установлен')
+    def test_msgpack_parse_errors(self):
+        self.authenticate(self.engineers[0])
+        for body in (
+            msgpack.packb({'data': []})[:-1],  # обрезано
+            msgpack.packb({'data': []}) + b'\x01',  # лишние байты
+            b'\x91' * 2000 + b'\x90',  # слишком глубокая вложенность
+            b'\x81\x91\x01\x01',  # ключ словаря - массив
+            b'\xc1',  # зарезервированный байт
+        ):
+            response = self.client.post(reverse('sync-offline'), body, content_type='application/msgpack')
+            self.assertEqual(response.status_code, 400, body[:8])
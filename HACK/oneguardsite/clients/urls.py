@@ -3,8 +3,18 @@ from . import views
 
 urlpatterns = [
     path('clients/', views.ClientDataListView.as_view(), name='client-list'),
+    path('clients/search/', views.ClientSearchView.as_view(), name='client-search'),
+    path('clients/prior-visits/', views.prior_visits, name='client-prior-visits'),
+    path('clients/nearby/', views.nearby_clients, name='client-nearby'),
+    path('clients/export/', views.ClientDataExportView.as_view(), name='client-export'),
+    path('clients/import/', views.ClientImportView.as_view(), name='client-import'),
     path('clients/<int:pk>/', views.ClientDataDetailView.as_view(), name='client-detail'),
     path('clients/<int:client_id>/history/', views.ClientHistoryView.as_view(), name='client-history'),
     path('reports/', views.client_reports, name='client-reports'),
+    path('reports/activity/', views.client_activity, name='client-activity'),
+    path('dashboard/', views.dashboard, name='dashboard'),
     path('sync/offline/', views.sync_offline_data, name='sync-offline'),
+    path('sync/changes/', views.sync_changes, name='sync-changes'),
+    path('metrics/', views.prometheus_metrics, name='metrics'),
+    path('metrics/history-writer/', views.history_writer_metrics, name='history-writer-metrics'),
 ]
\ No newline at end of file
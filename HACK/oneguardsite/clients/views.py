@@ -1,72 +1,133 @@
+from django.http import HttpResponse
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
-from django.db.models import Count, Avg
-from .models import ClientData, ClientHistory
+from oneguardsite import metrics
+from oneguardsite.db import WriteTransactionMixin
+from oneguardsite.fastpath import FastListMixin, ValuesSerializer
+from oneguardsite.importing import ImportView
+from oneguardsite.pagination import KeysetPagination, SearchPagination
+from . import activity, duplicates, export, geo, importer
+from .audit import history_writer, record_history
+from .changes import InvalidWatermark, collect_changes
+from .models import ClientData, ClientHistory, visibility_filter
+from .dashboard import get_dashboard
+from .reports import get_city_report
+from .search import search_clients
+from .sync import sync_clients
 from .serializers import (
     ClientDataSerializer, ClientDataCreateSerializer,
-    ClientHistorySerializer, ClientReportSerializer
+    ClientHistorySerializer, ClientReportSerializer,
+    ClientDataFilterSerializer, DashboardFilterSerializer, NearbyQuerySerializer, ActivityQuerySerializer,
+    PriorVisitQuerySerializer, PriorVisitSerializer
 )
 
 
-class ClientDataListView(generics.ListCreateAPIView):
+class ClientDataQueryMixin:
+    """Клиенты, видимые пользователю, с фильтрами из параметров запроса"""
+
+    def get_queryset(self):
+        # Инженер видит только своих клиентов
+        # Администратор видит всех
+        queryset = ClientData.objects.visible_to(self.request.user)
+        if self.request.method == 'GET':
+            filters = ClientDataFilterSerializer(data=self.request.query_params)
+            filters.is_valid(raise_exception=True)
+            queryset = (
+                queryset
+                .filter_by(**filters.validated_data)
+                .select_related('engineer', 'building_object__city')
+            )
+        return queryset
+
+
+# Быстрый вывод ClientDataSerializer для списков
+client_list_fast = ValuesSerializer(ClientDataSerializer)
+
+
+class ClientDataListView(WriteTransactionMixin, FastListMixin, ClientDataQueryMixin,
+                         generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
+    fast_serializer = client_list_fast
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return ClientDataCreateSerializer
         return ClientDataSerializer
 
-    def get_queryset(self):
-        # Инженер видит только своих клиентов
-        # Администратор видит всех
-        user = self.request.user
-        if user.profile.role == 'admin':
-            return ClientData.objects.all()
-        else:
-            return ClientData.objects.filter(engineer=user)
-
     def perform_create(self, serializer):
         # Автоматически записываем историю
         client_data = serializer.save()
 
-        # Создаем запись в истории
-        ClientHistory.objects.create(
-            client_data=client_data,
-            user=self.request.user,
-            action=f"Создана новая запись для квартиры {client_data.apartment_number}"
+        # Создаем запись в истории (пишется пакетом в фоне)
+        record_history(
+            client_data, self.request.user,
+            f"Создана новая запись для квартиры {client_data.apartment_number}"
         )
 
 
-class ClientDataDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ClientSearchView(FastListMixin, ClientDataQueryMixin, generics.ListAPIView):
+    """Полнотекстовый поиск по клиентам (?q=), от самых релевантных"""
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SearchPagination
+    fast_serializer = client_list_fast
+
+    def get_queryset(self):
+        return search_clients(super().get_queryset(), self.request.query_params.get('q', ''))
+
+
+class ClientDataDetailView(WriteTransactionMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ClientDataSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        if user.profile.role == 'admin':
-            return ClientData.objects.all()
-        else:
-            return ClientData.objects.filter(engineer=user)
+        return (
+            ClientData.objects
+            .visible_to(self.request.user)
+            .select_related('engineer', 'building_object__city')
+        )
 
     def perform_update(self, serializer):
         client_data = serializer.save()
 
         # Записываем в историю
-        ClientHistory.objects.create(
-            client_data=client_data,
-            user=self.request.user,
-            action="Обновлены данные клиента"
-        )
+        record_history(client_data, self.request.user, "Обновлены данные клиента")
 
 
 class ClientHistoryView(generics.ListAPIView):
     serializer_class = ClientHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-timestamp', '-id')
 
     def get_queryset(self):
         client_id = self.kwargs['client_id']
-        return ClientHistory.objects.filter(client_data_id=client_id)
+        return ClientHistory.objects.filter(client_data_id=client_id).select_related('user')
+
+
+class ClientDataExportView(ClientDataQueryMixin, generics.GenericAPIView):
+    """Потоковая выгрузка клиентов в CSV или XLSX с фильтрами списка"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in export.FORMATS:
+            return Response(
+                {'error': f'Неизвестный формат выгрузки: {file_format}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = self.get_queryset().order_by('-created_at', '-id')
+        try:
+            return export.export_response(queryset, file_format)
+        except export.ExportUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ClientImportView(ImportView):
+    importer_class = importer.ClientImporter
 
 
 @api_view(['GET'])
@@ -75,62 +136,147 @@ def client_reports(request):
     """Генерация отчетов по клиентам"""
     user = request.user
 
-    if user.profile.role != 'admin':
+    if user.role != 'admin':
         return Response(
             {'error': 'Только администраторы могут просматривать отчеты'},
             status=status.HTTP_403_FORBIDDEN
         )
 
-    # Статистика по городам
-    cities_stats = []
-    cities = City.objects.all()
+    # Статистика по городам (один запрос, результат кэшируется)
+    serializer = ClientReportSerializer(get_city_report(), many=True)
+    return Response(serializer.data)
 
-    for city in cities:
-        clients_in_city = ClientData.objects.filter(building_object__city=city)
-        total_clients = clients_in_city.count()
 
-        if total_clients > 0:
-            internet_interest = clients_in_city.filter(
-                interested_services__contains=['internet']
-            ).count()
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def dashboard(request):
+    """Сводка для графиков админ-панели (инженер видит только своих клиентов)"""
+    filters = DashboardFilterSerializer(data=request.query_params)
+    filters.is_valid(raise_exception=True)
+    return Response(get_dashboard(request.user, **filters.validated_data))
 
-            tv_interest = clients_in_city.filter(
-                interested_services__contains=['tv']
-            ).count()
 
-            avg_rating = clients_in_city.aggregate(
-                Avg('provider_rating')
-            )['provider_rating__avg'] or 0
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def client_activity(request):
+    """Число клиентов или событий истории по часам, дням, неделям или месяцам"""
+    params = ActivityQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    try:
+        return Response(activity.activity_series(request.user, **params.validated_data))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            cities_stats.append({
-                'city': city.name,
-                'total_clients': total_clients,
-                'internet_interest': internet_interest,
-                'tv_interest': tv_interest,
-                'average_rating': round(avg_rating, 2)
-            })
 
-    return Response(cities_stats)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def sync_changes(request):
+    """Изменения клиентов и справочников после отметки since"""
+    try:
+        return Response(collect_changes(request.user, request.query_params.get('since')))
+    except InvalidWatermark as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def sync_offline_data(request):
-    """Синхронизация офлайн-данных"""
+    """Синхронизация офлайн-данных одним пакетом"""
     offline_data = request.data.get('data', [])
-    synced_ids = []
-
-    for item in offline_data:
-        serializer = ClientDataCreateSerializer(
-            data=item,
-            context={'request': request}
+    if not isinstance(offline_data, list):
+        return Response(
+            {'error': 'Поле data должно быть списком записей'},
+            status=status.HTTP_400_BAD_REQUEST
         )
+    results = sync_clients(request, offline_data)
+    metrics.SYNC_BATCH_SIZE.observe(len(offline_data))
+    for result in results:
+        metrics.SYNC_RECORDS.inc(status=result['status'])
 
-        if serializer.is_valid():
-            client_data = serializer.save()
-            synced_ids.append(client_data.id)
+    created = [result['id'] for result in results if result['status'] == 'created']
+    synced_ids = [result['id'] for result in results if 'id' in result]
 
     return Response({
-        'message': f'Успешно синхронизировано {len(synced_ids)} записей',
-        'synced_ids': synced_ids
-    })
\ No newline at end of file
+        'message': f'Успешно синхронизировано {len(created)} записей',
+        'synced_ids': synced_ids,
+        'results': results
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def prior_visits(request):
+    """Прежние визиты по номеру телефона или квартире (для формы по мере ввода)
+
+    Повторный обход ищется среди всех инженеров: чужие записи находятся только
+    по полному номеру или квартире и отдаются без контактов и заметок.
+    """
+    params = PriorVisitQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    visits = duplicates.prior_visits(request.user, **params.validated_data)
+    serializer = PriorVisitSerializer(
+        visits, many=True, context={'request': request, 'query': params.validated_data}
+    )
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def nearby_clients(request):
+    """Клиенты в радиусе от точки или в прямоугольнике (инженер видит только своих)"""
+    params = NearbyQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    lat, lon = params.validated_data.get('lat'), params.validated_data.get('lon')
+    radius, limit = params.validated_data['radius'], params.validated_data['limit']
+    bbox = params.validated_data.get('bbox')
+
+    # Отбор по ячейкам сетки (индекс), затем точная проверка расстояния
+    if bbox is None:
+        bbox = geo.radius_bbox(lat, lon, radius)
+    else:
+        radius = None
+    # Правило видимости повторяется в каждом диапазоне ячеек (см. bbox_q)
+    queryset = ClientData.objects.filter(geo.bbox_q(*bbox, **visibility_filter(request.user)))
+
+    if lat is None or lon is None:
+        # Новые первыми с LIMIT в SQL: полные строки только для limit записей
+        rows = client_list_fast.rows(queryset.order_by('-created_at', '-id')[:limit])
+        return Response(client_list_fast.represent(rows))
+
+    # Расстояние считается по одним координатам кандидатов, полные строки с
+    # соединениями загружаются только для limit ближних. Без сортировки в
+    # первом запросе, иначе БД предпочтет индекс по created_at
+    points = queryset.order_by().values_list('id', 'latitude', 'longitude')
+    found = geo.nearby(points, lat, lon, radius=radius, limit=limit)
+    rows = {
+        row['id']: row
+        for row in client_list_fast.rows(ClientData.objects.filter(pk__in=[pk for _, pk in found]).order_by())
+    }
+    results = client_list_fast.represent([rows[pk] for _, pk in found])
+    for result, (distance, _) in zip(results, found):
+        result['distance'] = round(distance, 1)
+    return Response(results)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def history_writer_metrics(request):
+    """Состояние фоновой записи истории: глубина очереди, время сброса пакетов"""
+    if request.user.role != 'admin':
+        return Response(
+            {'error': 'Только администраторы могут просматривать метрики'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return Response(history_writer.metrics())
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def prometheus_metrics(request):
+    """Метрики всех воркеров в текстовом формате Prometheus"""
+    if request.user.role != 'admin':
+        return Response(
+            {'error': 'Только администраторы могут просматривать метрики'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return HttpResponse(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
@@ -1,7 +1,8 @@
 class AdminInterface {
     constructor() {
+        // Текущая страница таблицы: фильтры и курсор обрабатывает сервер
         this.clientsData = [];
-        this.filteredData = [];
+        this.page = null;
         this.engineersList = [];
         this.currentPage = 1;
         this.rowsPerPage = 10;
@@ -9,17 +10,17 @@ class AdminInterface {
         this.sortDirection = 'desc';
         this.currentFilters = {};
         this.charts = {};
+        this.dashboard = null;
 
         this.init();
     }
 
     async init() {
         await this.loadEngineers();
-        await this.loadClientsData();
         this.initEventListeners();
         this.initCharts();
-        this.updateStats();
-        this.renderTable();
+        // Таблица и сводка загружаются один раз, с начальными фильтрами
+        await this.applyFilters();
     }
 
     async loadEngineers() {
@@ -45,7 +46,7 @@ class AdminInterface {
             filterEngineer.innerHTML = `
                 <option value="">Все инженеры</option>
                 ${this.engineersList.map(engineer => `
-                    <option value="${engineer.username}">${engineer.username}</option>
+                    <option value="${engineer.id}">${engineer.username}</option>
                 `).join('')}
             `;
 
@@ -56,22 +57,52 @@ class AdminInterface {
         }
     }
 
+    // Первая страница таблицы с текущими фильтрами
     async loadClientsData() {
+        this.readFilters();
+        await this.loadPage(this.firstPageUrl(), 1);
+    }
+
+    firstPageUrl() {
+        const params = this.filterParams();
+        params.set('page_size', this.rowsPerPage);
+        // Поиск - отдельный эндпоинт с теми же фильтрами, страницы по релевантности
+        if (this.currentFilters.search) {
+            params.set('q', this.currentFilters.search);
+            return `/clients/search/?${params}`;
+        }
+        return `/clients/?${params}`;
+    }
+
+    // Фильтры в параметрах API (список клиентов, поиск, выгрузка)
+    filterParams() {
+        const params = new URLSearchParams();
+        if (this.currentFilters.dateFrom) params.set('date_from', this.currentFilters.dateFrom);
+        if (this.currentFilters.dateTo) params.set('date_to', this.currentFilters.dateTo);
+        if (this.currentFilters.engineer) params.set('engineer', this.currentFilters.engineer);
+        if (this.currentFilters.type) params.set('object_type', this.currentFilters.type);
+        if (this.currentFilters.service) params.set('interested', this.currentFilters.service);
+        return params;
+    }
+
+    async loadPage(url, pageNumber) {
         try {
-            const response = await auth.apiRequest('/clients/');
-            if (response.ok) {
-                this.clientsData = await response.json();
-                this.applyFilters();
-                auth.showMessage('Данные загружены', 'success');
-            } else {
-                throw new Error('Failed to load clients');
+            const response = await auth.apiRequest(url);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
             }
+            this.page = await response.json();
+            this.clientsData = this.page.results;
+            this.currentPage = pageNumber;
         } catch (error) {
             console.error('Error loading clients:', error);
             auth.showMessage('Ошибка загрузки данных клиентов', 'error');
             // Временно используем локальные данные
+            this.page = null;
             this.loadLocalData();
         }
+        this.sortData();
+        this.renderTable();
     }
 
     loadLocalData() {
@@ -108,8 +139,11 @@ class AdminInterface {
         document.getElementById('apply-filters')?.addEventListener('click', () => this.applyFilters());
         document.getElementById('reset-filters')?.addEventListener('click', () => this.resetFilters());
 
-        // Поиск
-        document.getElementById('search-clients')?.addEventListener('input', () => this.applyFilters());
+        // Поиск: запрос к серверу, когда пользователь перестал печатать
+        document.getElementById('search-clients')?.addEventListener('input', () => {
+            clearTimeout(this.searchTimer);
+            this.searchTimer = setTimeout(() => this.applyFilters(), 300);
+        });
 
         // Экспорт
         document.getElementById('export-btn')?.addEventListener('click', () => this.exportData());
@@ -119,8 +153,7 @@ class AdminInterface {
         document.getElementById('next-page')?.addEventListener('click', () => this.nextPage());
         document.getElementById('rows-per-page')?.addEventListener('change', (e) => {
             this.rowsPerPage = parseInt(e.target.value);
-            this.currentPage = 1;
-            this.renderTable();
+            this.loadClientsData();
         });
 
         // Сортировка таблицы
@@ -132,75 +165,23 @@ class AdminInterface {
         document.getElementById('refresh-data')?.addEventListener('click', () => this.refreshData());
     }
 
-    applyFilters() {
+    readFilters() {
         this.currentFilters = {
             dateFrom: document.getElementById('filter-date-from')?.value || '',
             dateTo: document.getElementById('filter-date-to')?.value || '',
             type: document.getElementById('filter-type')?.value || '',
             service: document.getElementById('filter-service')?.value || '',
-            priority: document.getElementById('filter-priority')?.value || '',
             engineer: document.getElementById('filter-engineer')?.value || '',
-            search: document.getElementById('search-clients')?.value.toLowerCase() || ''
+            search: document.getElementById('search-clients')?.value.trim() || ''
         };
+    }
 
-        this.filteredData = this.clientsData.filter(client => {
-            // Фильтр по дате
-            if (this.currentFilters.dateFrom) {
-                const clientDate = new Date(client.created_at || client.timestamp).toISOString().split('T')[0];
-                if (clientDate < this.currentFilters.dateFrom) return false;
-            }
-
-            if (this.currentFilters.dateTo) {
-                const clientDate = new Date(client.created_at || client.timestamp).toISOString().split('T')[0];
-                if (clientDate > this.currentFilters.dateTo) return false;
-            }
-
-            // Фильтр по типу объекта
-            if (this.currentFilters.type && client.building_object?.object_type !== this.currentFilters.type) {
-                return false;
-            }
-
-            // Фильтр по услуге
-            if (this.currentFilters.service && !client.interested_services?.includes(this.currentFilters.service)) {
-                return false;
-            }
-
-            // Фильтр по приоритету (если есть в API)
-            if (this.currentFilters.priority) {
-                // Временная логика, адаптируйте под вашу модель данных
-                return true;
-            }
-
-            // Фильтр по инженеру
-            if (this.currentFilters.engineer && client.engineer_name !== this.currentFilters.engineer) {
-                return false;
-            }
-
-            // Поиск
-            if (this.currentFilters.search) {
-                const searchTerm = this.currentFilters.search;
-                const searchable = [
-                    client.name || '',
-                    client.contact_phone || '',
-                    client.building_object_address || '',
-                    client.notes || ''
-                ].join(' ').toLowerCase();
-
-                if (!searchable.includes(searchTerm)) {
-                    return false;
-                }
-            }
-
-            return true;
-        });
-
-        // Сортируем данные
-        this.sortData();
-
-        this.currentPage = 1;
-        this.renderTable();
-        this.updateCharts();
-        this.updateStats();
+    async applyFilters() {
+        this.readFilters();
+        await Promise.all([
+            this.loadPage(this.firstPageUrl(), 1),
+            this.updateCharts()
+        ]);
     }
 
     resetFilters() {
@@ -208,7 +189,6 @@ class AdminInterface {
         document.getElementById('filter-date-to').value = '';
         document.getElementById('filter-type').value = '';
         document.getElementById('filter-service').value = '';
-        document.getElementById('filter-priority').value = '';
         document.getElementById('filter-engineer').value = '';
         document.getElementById('search-clients').value = '';
 
@@ -228,8 +208,10 @@ class AdminInterface {
         this.updateSortIndicators();
     }
 
+    // Сервер отдает страницы от новых записей к старым; сортировка по
+    // колонкам упорядочивает только показанную страницу
     sortData() {
-        this.filteredData.sort((a, b) => {
+        this.clientsData.sort((a, b) => {
             let aValue = a[this.sortField];
             let bValue = b[this.sortField];
 
@@ -250,8 +232,8 @@ class AdminInterface {
             }
 
             if (this.sortField === 'type') {
-                aValue = a.building_object?.object_type || '';
-                bValue = b.building_object?.object_type || '';
+                aValue = a.object_type || '';
+                bValue = b.object_type || '';
             }
 
             if (aValue < bValue) return this.sortDirection === 'asc' ? -1 : 1;
@@ -273,9 +255,7 @@ class AdminInterface {
         const tbody = document.getElementById('clients-table-body');
         if (!tbody) return;
 
-        const startIndex = (this.currentPage - 1) * this.rowsPerPage;
-        const endIndex = startIndex + this.rowsPerPage;
-        const pageData = this.filteredData.slice(startIndex, endIndex);
+        const pageData = this.clientsData;
 
         if (pageData.length === 0) {
             tbody.innerHTML = `
@@ -287,7 +267,7 @@ class AdminInterface {
             tbody.innerHTML = pageData.map(client => `
                 <tr>
                     <td>${this.escapeHtml(client.name || 'Не указано')}</td>
-                    <td>${this.getTypeLabel(client.building_object?.object_type)}</td>
+                    <td>${this.getTypeLabel(client.object_type)}</td>
                     <td>${this.escapeHtml(client.contact_phone || 'Не указан')}</td>
                     <td>${this.escapeHtml(client.building_object_address || client.building_object?.address || 'Не указан')}</td>
                     <td>
@@ -323,36 +303,40 @@ class AdminInterface {
     }
 
     updatePagination() {
-        const totalPages = Math.ceil(this.filteredData.length / this.rowsPerPage);
         const prevBtn = document.getElementById('prev-page');
         const nextBtn = document.getElementById('next-page');
         const pageInfo = document.getElementById('page-info');
 
-        if (prevBtn) prevBtn.disabled = this.currentPage === 1;
-        if (nextBtn) nextBtn.disabled = this.currentPage === totalPages || totalPages === 0;
-        if (pageInfo) pageInfo.textContent = `Страница ${this.currentPage} из ${totalPages}`;
+        if (prevBtn) prevBtn.disabled = !this.page?.previous;
+        if (nextBtn) nextBtn.disabled = !this.page?.next;
+        if (pageInfo) {
+            // Число страниц известно только у поиска; курсорный список его не считает
+            const totalPages = this.page?.count !== undefined ? Math.ceil(this.page.count / this.rowsPerPage) : null;
+            pageInfo.textContent = totalPages
+                ? `Страница ${this.currentPage} из ${totalPages}`
+                : `Страница ${this.currentPage}`;
+        }
     }
 
     updateTableInfo() {
         const shownCount = document.getElementById('shown-count');
         const totalCount = document.getElementById('total-count');
 
-        if (shownCount) shownCount.textContent = Math.min(this.filteredData.length, this.currentPage * this.rowsPerPage);
-        if (totalCount) totalCount.textContent = this.filteredData.length;
+        // Итог без поиска - из сводки с теми же фильтрами
+        const total = this.page?.count ?? (this.currentFilters.search ? null : this.dashboard?.total_clients);
+        if (shownCount) shownCount.textContent = this.clientsData.length;
+        if (totalCount) totalCount.textContent = total ?? '—';
     }
 
-    previousPage() {
-        if (this.currentPage > 1) {
-            this.currentPage--;
-            this.renderTable();
+    async previousPage() {
+        if (this.page?.previous) {
+            await this.loadPage(auth.apiPath(this.page.previous), this.currentPage - 1);
         }
     }
 
-    nextPage() {
-        const totalPages = Math.ceil(this.filteredData.length / this.rowsPerPage);
-        if (this.currentPage < totalPages) {
-            this.currentPage++;
-            this.renderTable();
+    async nextPage() {
+        if (this.page?.next) {
+            await this.loadPage(auth.apiPath(this.page.next), this.currentPage + 1);
         }
     }
 
@@ -360,7 +344,6 @@ class AdminInterface {
         this.initTypesChart();
         this.initServicesChart();
         this.initActivityChart();
-        this.initPrioritiesChart();
     }
 
     initTypesChart() {
@@ -439,148 +422,85 @@ class AdminInterface {
         });
     }
 
-    initPrioritiesChart() {
-        const ctx = document.getElementById('chart-priorities')?.getContext('2d');
-        if (!ctx) return;
+    // Ряды для графиков считает сервер (/api/dashboard/)
+    async loadDashboard() {
+        // Те же фильтры и поиск, что и у таблицы
+        const params = this.filterParams();
+        if (this.currentFilters.search) params.set('q', this.currentFilters.search);
 
-        this.charts.priorities = new Chart(ctx, {
-            type: 'doughnut',
-            data: {
-                labels: ['Высокий', 'Средний', 'Низкий'],
-                datasets: [{
-                    data: [0, 0, 0],
-                    backgroundColor: ['#e74c3c', '#f39c12', '#27ae60']
-                }]
-            },
-            options: {
-                responsive: true,
-                maintainAspectRatio: false
+        try {
+            const response = await auth.apiRequest(`/dashboard/?${params}`);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
             }
-        });
+            this.dashboard = await response.json();
+        } catch (error) {
+            console.error('Error loading dashboard:', error);
+            this.dashboard = null;
+        }
     }
 
-    updateCharts() {
+    async updateCharts() {
+        await this.loadDashboard();
+        if (!this.dashboard) return;
+
         this.updateTypesChart();
         this.updateServicesChart();
         this.updateActivityChart();
-        this.updatePrioritiesChart();
+        this.updateStats();
+        this.updateTableInfo();
     }
 
     updateTypesChart() {
         if (!this.charts.types) return;
 
-        const typesCount = {};
-
-        this.filteredData.forEach(client => {
-            const type = client.building_object?.object_type || 'other';
-            typesCount[type] = (typesCount[type] || 0) + 1;
-        });
-
-        const labels = Object.keys(typesCount).map(type => this.getTypeLabel(type));
-        const data = Object.values(typesCount);
+        const types = this.dashboard.types;
 
-        this.charts.types.data.labels = labels;
-        this.charts.types.data.datasets[0].data = data;
+        this.charts.types.data.labels = types.map(item => item.label);
+        this.charts.types.data.datasets[0].data = types.map(item => item.count);
         this.charts.types.update();
     }
 
     updateServicesChart() {
         if (!this.charts.services) return;
 
-        const servicesCount = {};
+        const services = this.dashboard.services;
 
-        this.filteredData.forEach(client => {
-            const services = client.interested_services || client.services || [];
-            services.forEach(service => {
-                servicesCount[service] = (servicesCount[service] || 0) + 1;
-            });
-        });
-
-        const labels = Object.keys(servicesCount).map(service => this.getServiceLabel(service));
-        const data = Object.values(servicesCount);
-
-        this.charts.services.data.labels = labels;
-        this.charts.services.data.datasets[0].data = data;
+        this.charts.services.data.labels = services.map(item => this.getServiceLabel(item.service));
+        this.charts.services.data.datasets[0].data = services.map(item => item.count);
         this.charts.services.update();
     }
 
     updateActivityChart() {
         if (!this.charts.activity) return;
 
-        // Группируем по дням за последние 7 дней
-        const last7Days = [];
-        for (let i = 6; i >= 0; i--) {
-            const date = new Date();
-            date.setDate(date.getDate() - i);
-            last7Days.push(date.toISOString().split('T')[0]);
-        }
-
-        const activityData = last7Days.map(date => {
-            return this.filteredData.filter(client => {
-                const clientDate = new Date(client.created_at || client.timestamp).toISOString().split('T')[0];
-                return clientDate === date;
-            }).length;
-        });
+        const activity = this.dashboard.activity;
 
-        const labels = last7Days.map(date => {
-            const d = new Date(date);
+        this.charts.activity.data.labels = activity.map(item => {
+            const d = new Date(item.date);
             return d.toLocaleDateString('ru-RU', { day: 'numeric', month: 'short' });
         });
-
-        this.charts.activity.data.labels = labels;
-        this.charts.activity.data.datasets[0].data = activityData;
+        this.charts.activity.data.datasets[0].data = activity.map(item => item.count);
         this.charts.activity.update();
     }
 
-    updatePrioritiesChart() {
-        if (!this.charts.priorities) return;
-
-        const prioritiesCount = {
-            high: 0,
-            medium: 0,
-            low: 0
-        };
-
-        this.filteredData.forEach(client => {
-            const priority = client.priority || 'medium';
-            prioritiesCount[priority]++;
-        });
-
-        this.charts.priorities.data.datasets[0].data = [
-            prioritiesCount.high,
-            prioritiesCount.medium,
-            prioritiesCount.low
-        ];
-        this.charts.priorities.update();
-    }
-
     updateStats() {
+        if (!this.dashboard) return;
+
         const totalClients = document.getElementById('total-clients');
         const newThisWeek = document.getElementById('new-this-week');
-        const highPriority = document.getElementById('high-priority');
-
-        if (totalClients) totalClients.textContent = this.filteredData.length;
 
-        // Новые за неделю
-        const weekAgo = new Date();
-        weekAgo.setDate(weekAgo.getDate() - 7);
-        const newThisWeekCount = this.filteredData.filter(client =>
-            new Date(client.created_at || client.timestamp) > weekAgo
-        ).length;
-        if (newThisWeek) newThisWeek.textContent = newThisWeekCount;
-
-        // Высокий приоритет
-        const highPriorityCount = this.filteredData.filter(client =>
-            (client.priority || 'medium') === 'high'
-        ).length;
-        if (highPriority) highPriority.textContent = highPriorityCount;
+        if (totalClients) totalClients.textContent = this.dashboard.total_clients;
+        if (newThisWeek) newThisWeek.textContent = this.dashboard.new_this_week;
     }
 
+    // Файл выгрузки формирует сервер потоком (/api/clients/export/)
     async exportData() {
         const format = document.getElementById('export-format').value;
         const range = document.getElementById('export-range').value;
 
-        let dataToExport = this.filteredData;
+        const params = this.filterParams();
+        params.set('file_format', format === 'excel' ? 'xlsx' : 'csv');
 
         // Применяем временной диапазон для экспорта
         if (range !== 'all') {
@@ -600,78 +520,38 @@ class AdminInterface {
             }
 
             if (startDate) {
-                dataToExport = dataToExport.filter(client =>
-                    new Date(client.created_at || client.timestamp) >= startDate
-                );
+                params.set('date_from', startDate.toISOString().split('T')[0]);
             }
         }
 
-        // Подготавливаем данные для экспорта
-        const exportData = dataToExport.map(client => ({
-            'Имя клиента': client.name || 'Не указано',
-            'Тип объекта': this.getTypeLabel(client.building_object?.object_type),
-            'Телефон': client.contact_phone || 'Не указан',
-            'Адрес': client.building_object_address || client.building_object?.address || 'Не указан',
-            'Услуги': (client.interested_services || client.services || []).map(s => this.getServiceLabel(s)).join(', '),
-            'Приоритет': this.getPriorityLabel(client.priority),
-            'Инженер': client.engineer_name || client.engineer || 'Не указан',
-            'Дата добавления': new Date(client.created_at || client.timestamp).toLocaleString('ru-RU'),
-            'Комментарии': client.notes || client.needs || ''
-        }));
-
-        if (format === 'excel') {
-            this.exportToExcel(exportData);
-        } else {
-            this.exportToCSV(exportData);
-        }
-    }
-
-    exportToExcel(data) {
         try {
-            const ws = XLSX.utils.json_to_sheet(data);
-            const wb = XLSX.utils.book_new();
-            XLSX.utils.book_append_sheet(wb, ws, 'Клиенты');
-            XLSX.writeFile(wb, `clients_export_${new Date().toISOString().split('T')[0]}.xlsx`);
-            auth.showMessage('Данные успешно экспортированы в Excel', 'success');
-        } catch (error) {
-            auth.showMessage('Ошибка при экспорте в Excel', 'error');
-            console.error('Export error:', error);
-        }
-    }
-
-    exportToCSV(data) {
-        if (data.length === 0) {
-            auth.showMessage('Нет данных для экспорта', 'error');
-            return;
-        }
-
-        const headers = Object.keys(data[0]);
-        const csvContent = [
-            headers.join(','),
-            ...data.map(row =>
-                headers.map(header =>
-                    `"${String(row[header] || '').replace(/"/g, '""')}"`
-                ).join(',')
-            )
-        ].join('\n');
+            const response = await auth.apiRequest(`/clients/export/?${params}`);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
 
-        const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
-        const link = document.createElement('a');
-        const url = URL.createObjectURL(blob);
+            const blob = await response.blob();
+            const link = document.createElement('a');
+            const url = URL.createObjectURL(blob);
 
-        link.setAttribute('href', url);
-        link.setAttribute('download', `clients_export_${new Date().toISOString().split('T')[0]}.csv`);
-        link.style.visibility = 'hidden';
+            link.setAttribute('href', url);
+            link.setAttribute('download', `clients_export_${new Date().toISOString().split('T')[0]}.${params.get('file_format')}`);
+            link.style.visibility = 'hidden';
 
-        document.body.appendChild(link);
-        link.click();
-        document.body.removeChild(link);
+            document.body.appendChild(link);
+            link.click();
+            document.body.removeChild(link);
+            URL.revokeObjectURL(url);
 
-        auth.showMessage('Данные успешно экспортированы в CSV', 'success');
+            auth.showMessage('Данные успешно экспортированы', 'success');
+        } catch (error) {
+            auth.showMessage('Ошибка при экспорте данных', 'error');
+            console.error('Export error:', error);
+        }
     }
 
     async refreshData() {
-        await this.loadClientsData();
+        await this.applyFilters();
         auth.showMessage('Данные обновлены', 'success');
     }
 
@@ -703,10 +583,7 @@ class AdminInterface {
             'mcd': 'МКД',
             'hotel': 'Отель',
             'cafe': 'Кафе',
-            'restaurant': 'Ресторан',
-            'office': 'Офис',
-            'private_house': 'Частный дом',
-            'other': 'Другое'
+            'restaurant': 'Ресторан'
         };
         return types[type] || type;
     }
@@ -229,6 +229,32 @@ class Auth {
         return response;
     }
 
+    // Загружает все страницы списка с курсорной пагинацией
+    async apiRequestAll(url) {
+        const results = [];
+        let nextUrl = url;
+
+        while (nextUrl) {
+            const response = await this.apiRequest(nextUrl);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+
+            const page = await response.json();
+            results.push(...page.results);
+
+            nextUrl = page.next ? this.apiPath(page.next) : null;
+        }
+
+        return results;
+    }
+
+    // Ссылка next/previous из ответа API -> путь для apiRequest
+    apiPath(link) {
+        const url = new URL(link, window.location.origin);
+        return url.pathname.replace(/^\/api/, '') + url.search;
+    }
+
     showMessage(message, type = 'info') {
         // Удаляем существующие сообщения
         const existingMessages = document.querySelectorAll('.message');
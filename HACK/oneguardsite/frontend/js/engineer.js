@@ -18,9 +18,9 @@ class EngineerInterface {
     async loadCitiesAndObjects() {
         try {
             // Загружаем города и объекты из API
-            const [citiesResponse, objectsResponse] = await Promise.all([
+            const [citiesResponse, objects] = await Promise.all([
                 auth.apiRequest('/cities/'),
-                auth.apiRequest('/objects/')
+                auth.apiRequestAll('/objects/?page_size=500')
             ]);
 
             if (citiesResponse.ok) {
@@ -28,10 +28,8 @@ class EngineerInterface {
                 this.populateCitiesFilter();
             }
 
-            if (objectsResponse.ok) {
-                this.objects = await objectsResponse.json();
-                this.populateObjectsFilter();
-            }
+            this.objects = objects;
+            this.populateObjectsFilter();
 
         } catch (error) {
             console.error('Error loading cities and objects:', error);
@@ -114,6 +112,9 @@ class EngineerInterface {
             this.setOnlineStatus(false);
         });
 
+        // Офлайн-менеджер догрузил изменения с сервера
+        window.addEventListener('serverDataChanged', () => this.loadRecentClients());
+
         // Устанавливаем начальный статус
         this.setOnlineStatus(this.isOnline);
     }
@@ -390,11 +391,18 @@ class EngineerInterface {
         try {
             let clients = [];
 
-            if (this.isOnline) {
-                // Загружаем с сервера
-                const response = await auth.apiRequest('/clients/');
+            if (window.offlineManager) {
+                // Локальная копия, которую офлайн-менеджер держит по /sync/changes/
+                clients = await offlineManager.getServerClients();
+            }
+
+            if (clients.length === 0 && this.isOnline) {
+                // Копия еще не загружена - берем с сервера
+                // Для списка последних клиентов достаточно первой страницы
+                const response = await auth.apiRequest('/clients/?page_size=5');
                 if (response.ok) {
-                    clients = await response.json();
+                    const page = await response.json();
+                    clients = page.results;
                 }
             }
 
@@ -16,6 +16,7 @@ class OfflineManager {
         await this.loadSyncQueue();
         this.initEventListeners();
         this.startPeriodicSync();
+        await this.refreshServerData();
     }
 
     initEventListeners() {
@@ -73,6 +74,12 @@ class OfflineManager {
     async saveClient(clientData) {
         if (!this.db) await this.initDatabase();
 
+        // Ключ идемпотентности: повторная отправка той же записи не создаст дубликат
+        clientData = {
+            ...clientData,
+            client_key: clientData.client_key || this.generateClientKey()
+        };
+
         return new Promise((resolve, reject) => {
             const transaction = this.db.transaction(['clients', 'syncQueue'], 'readwrite');
 
@@ -272,24 +279,7 @@ class OfflineManager {
 
             this.showSyncNotification('Синхронизация данных...', 'info');
 
-            let successCount = 0;
-            let errorCount = 0;
-
-            for (const item of pendingItems) {
-                try {
-                    await this.processSyncItem(item);
-                    successCount++;
-                } catch (error) {
-                    console.error('Sync error for item:', item, error);
-                    errorCount++;
-
-                    await this.updateSyncQueueItem(item.id, {
-                        retryCount: (item.retryCount || 0) + 1,
-                        lastError: error.message,
-                        status: item.retryCount >= 2 ? 'failed' : 'pending'
-                    });
-                }
-            }
+            const { successCount, errorCount } = await this.syncBatch(pendingItems);
 
             // Обновляем статус локальных клиентов после синхронизации
             if (successCount > 0) {
@@ -316,17 +306,71 @@ class OfflineManager {
         }
     }
 
-    async processSyncItem(item) {
-        if (item.type === 'create_client') {
-            return await this.syncClientToServer(item.data);
+    // Отправляет всю очередь одним запросом на /sync/offline/
+    async syncBatch(items) {
+        let successCount = 0;
+        let errorCount = 0;
+
+        const clientItems = items.filter(item => item.type === 'create_client');
+        for (const item of items) {
+            if (item.type !== 'create_client') {
+                console.error(`Unknown sync type: ${item.type}`);
+                errorCount++;
+            }
+        }
+
+        if (clientItems.length === 0) {
+            return { successCount, errorCount };
+        }
+
+        const token = localStorage.getItem('accessToken');
+        if (!token) {
+            throw new Error('No authentication token');
+        }
+
+        const response = await fetch(`${this.API_BASE_URL}/sync/offline/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${token}`
+            },
+            body: JSON.stringify({
+                data: clientItems.map(item => this.toApiData(item))
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
         }
 
-        throw new Error(`Unknown sync type: ${item.type}`);
+        const { results } = await response.json();
+
+        for (const result of results) {
+            const item = clientItems[result.index];
+
+            if (result.status === 'created' || result.status === 'duplicate') {
+                successCount++;
+                await this.updateSyncQueueItem(item.id, { status: 'synced', server_id: result.id });
+                await this.updateLocalClientAfterSync(item.data.id, { id: result.id });
+            } else {
+                errorCount++;
+                await this.updateSyncQueueItem(item.id, {
+                    retryCount: (item.retryCount || 0) + 1,
+                    lastError: JSON.stringify(result.errors),
+                    status: item.retryCount >= 2 ? 'failed' : 'pending'
+                });
+            }
+        }
+
+        return { successCount, errorCount };
     }
 
-    async syncClientToServer(clientData) {
+    toApiData(item) {
+        const clientData = item.data;
+
         // Преобразуем данные для Django API
-        const apiData = {
+        return {
+            client_key: clientData.client_key || `queue-${item.id}-${item.timestamp}`,
             building_object: clientData.building_object_id,
             apartment_number: clientData.apartment_number || '1',
             contact_phone: clientData.phone,
@@ -338,6 +382,10 @@ class OfflineManager {
             latitude: clientData.location?.latitude || null,
             longitude: clientData.location?.longitude || null
         };
+    }
+
+    async syncClientToServer(clientData) {
+        const apiData = this.toApiData({ data: clientData });
 
         const token = localStorage.getItem('accessToken');
         if (!token) {
@@ -441,6 +489,13 @@ class OfflineManager {
         });
     }
 
+    generateClientKey() {
+        if (window.crypto && typeof crypto.randomUUID === 'function') {
+            return crypto.randomUUID();
+        }
+        return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
+
     // === Обработчики событий сети ===
 
     async handleOnline() {
@@ -452,6 +507,7 @@ class OfflineManager {
         // Даем время на установление стабильного соединения
         setTimeout(async () => {
             await this.sync();
+            await this.refreshServerData();
         }, 2000);
 
         this.dispatchNetworkStatusChanged(true);
@@ -489,6 +545,87 @@ class OfflineManager {
         );
     }
 
+    // === Получение изменений с сервера ===
+
+    // Догружает только изменения с прошлого раза (/sync/changes/)
+    // и применяет их к локальным копиям клиентов и справочников
+    async pullChanges() {
+        if (!this.isOnline) return false;
+
+        const token = localStorage.getItem('accessToken');
+        if (!token) return false;
+
+        const datasets = {
+            clients: await this.getCachedData('server_clients') || {},
+            cities: await this.getCachedData('cities') || {},
+            objects: await this.getCachedData('objects') || {}
+        };
+        let watermark = await this.getCachedData('sync_watermark');
+        let hasMore = true;
+
+        // Сервер отдает только клиентов текущего пользователя:
+        // после смены пользователя копию собираем заново
+        const user = JSON.parse(localStorage.getItem('currentUser') || 'null');
+        const owner = user ? user.id : null;
+        if (await this.getCachedData('sync_owner') !== owner) {
+            watermark = null;
+            Object.keys(datasets).forEach(name => { datasets[name] = {}; });
+        }
+
+        while (hasMore) {
+            const params = watermark ? `?since=${encodeURIComponent(watermark)}` : '';
+            const response = await fetch(`${this.API_BASE_URL}/sync/changes/${params}`, {
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+
+            if (response.status === 400) {
+                // Отметка устарела или повреждена - начинаем с нуля
+                watermark = null;
+                Object.keys(datasets).forEach(name => { datasets[name] = {}; });
+                continue;
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+
+            const changes = await response.json();
+            for (const name of Object.keys(datasets)) {
+                for (const record of changes[name].updated) {
+                    datasets[name][record.id] = record;
+                }
+                for (const id of changes[name].deleted) {
+                    delete datasets[name][id];
+                }
+            }
+
+            watermark = changes.watermark;
+            hasMore = changes.has_more;
+        }
+
+        await this.cacheData('server_clients', datasets.clients);
+        await this.cacheData('cities', datasets.cities);
+        await this.cacheData('objects', datasets.objects);
+        await this.cacheData('sync_watermark', watermark);
+        await this.cacheData('sync_owner', owner);
+        return true;
+    }
+
+    // Подтягивает изменения и сообщает интерфейсу, что локальная копия обновилась
+    async refreshServerData() {
+        try {
+            if (await this.pullChanges()) {
+                window.dispatchEvent(new CustomEvent('serverDataChanged'));
+            }
+        } catch (error) {
+            console.error('Pull changes failed:', error);
+        }
+    }
+
+    async getServerClients() {
+        const clients = await this.getCachedData('server_clients') || {};
+        return Object.values(clients);
+    }
+
     // === Утилиты для работы с кэшем ===
 
     async cacheData(key, data) {
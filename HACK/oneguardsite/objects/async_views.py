@@ -0,0 +1,10 @@
+from oneguardsite.async_api import async_read_view
+from .views import (
+    CityListView, BuildingObjectListView, BuildingObjectDetailView, BuildingObjectsByCityView
+)
+
+
+city_list = async_read_view(CityListView)
+object_list = async_read_view(BuildingObjectListView)
+object_detail = async_read_view(BuildingObjectDetailView, 'retrieve')
+objects_by_city = async_read_view(BuildingObjectsByCityView)
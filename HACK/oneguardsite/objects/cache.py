@@ -0,0 +1,95 @@
+import hashlib
+
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from oneguardsite import metrics
+from oneguardsite.async_api import render
+from oneguardsite.caching import aget_version, bump_version, get_version
+
+
+REFERENCE_VERSION_KEY = 'objects:reference_version'
+
+# Сколько держать ответ в кэше; после изменения данных старые записи
+# просто перестают запрашиваться и вытесняются
+REFERENCE_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def get_reference_version():
+    """Текущая версия справочников (города и объекты)"""
+    return get_version(REFERENCE_VERSION_KEY)
+
+
+async def aget_reference_version():
+    return await aget_version(REFERENCE_VERSION_KEY)
+
+
+def bump_reference_version():
+    """Инвалидирует все закэшированные ответы справочников и их ETag"""
+    bump_version(REFERENCE_VERSION_KEY)
+
+
+class ReferenceCacheMixin:
+    """Кэш ответов справочников с ETag и условным GET
+
+    Вариант ответа определяется полным URL (путь, city_id, object_type,
+    курсор, размер страницы), поэтому каждый фильтр кэшируется отдельно.
+    ETag зависит только от версии справочников и URL: если клиент прислал
+    If-None-Match с актуальным тегом, отвечаем 304, не обращаясь к данным.
+    """
+
+    def get(self, request, *args, **kwargs):
+        etag, key = self.reference_etag(request, get_reference_version())
+
+        if self.not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = cache.get(key)
+            metrics.record_cache('reference', data)
+            if data is None:
+                response = super().get(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, REFERENCE_CACHE_TIMEOUT)
+            else:
+                response = Response(data)
+        return self.with_etag(response, etag)
+
+    async def acached(self, request, produce):
+        """То же для асинхронного представления; produce() отдает данные ответа"""
+        etag, key = self.reference_etag(request, await aget_reference_version())
+
+        if self.not_modified(request, etag):
+            response = render(None, status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = await cache.aget(key)
+            metrics.record_cache('reference', data)
+            if data is None:
+                data = await produce()
+                await cache.aset(key, data, REFERENCE_CACHE_TIMEOUT)
+            response = render(data)
+        return self.with_etag(response, etag)
+
+    @staticmethod
+    def reference_etag(request, version):
+        url = request.build_absolute_uri()
+        digest = hashlib.md5(f'{version}:{url}'.encode()).hexdigest()
+        return quote_etag(digest), f'objects:v{version}:{digest}'
+
+    @staticmethod
+    def not_modified(request, etag):
+        if_none_match = request.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        # Слабое сравнение: сжатый ответ уходит со слабым тегом W/"..."
+        etags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+        return '*' in etags or etag in etags
+
+    @staticmethod
+    def with_etag(response, etag):
+        response['ETag'] = etag
+        # Браузер хранит ответ, но перед использованием сверяет ETag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,112 @@
+from django.utils import timezone
+from oneguardsite.db import write_transaction
+from oneguardsite.importing import CHUNK_SIZE, Importer, update_rows
+from .cache import bump_reference_version
+from .models import BuildingObject, City
+from .serializers import BuildingObjectImportSerializer
+from .signals import objects_imported
+
+
+# Тип объекта можно указать кодом (mcd) или названием (МКД)
+OBJECT_TYPE_CODES = {label.lower(): code for code, label in BuildingObject.OBJECT_TYPES}
+
+
+class CityCache:
+    """Кэш «название города -> id» на время загрузки
+
+    Неизвестные названия ищутся одним запросом на пакет, недостающие города
+    при необходимости создаются сразу (в своей транзакции, чтобы откат
+    пакета строк не оставил в кэше id несуществующих городов).
+    """
+
+    def __init__(self):
+        self.ids = {}
+
+    def resolve(self, names, create=False):
+        missing = set(names) - set(self.ids)
+        if missing:
+            self.ids.update(City.objects.filter(name__in=missing).values_list('name', 'id'))
+            missing -= set(self.ids)
+        if missing and create:
+            self.create(missing)
+            self.ids.update(City.objects.filter(name__in=missing).values_list('name', 'id'))
+        return self.ids
+
+    @staticmethod
+    @write_transaction
+    def create(names):
+        # ignore_conflicts: тот же город мог создать параллельный запрос
+        City.objects.bulk_create([City(name=name) for name in names], ignore_conflicts=True)
+
+
+class ObjectImporter(Importer):
+    """Объекты: city_name, name, address, object_type
+
+    Ключ - (город, адрес): объект с таким адресом в городе обновляется,
+    иначе создается; новые города создаются по названию.
+    """
+    required_columns = ('city_name', 'name', 'address', 'object_type')
+
+    def __init__(self, user=None, chunk_size=CHUNK_SIZE):
+        super().__init__(user, chunk_size)
+        self.cities = CityCache()
+
+    def import_chunk(self, chunk):
+        valid = []
+        for number, record in chunk:
+            object_type = str(record.get('object_type', ''))
+            record['object_type'] = OBJECT_TYPE_CODES.get(object_type.lower(), object_type)
+            serializer = BuildingObjectImportSerializer(data=record)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                self.add_error(number, serializer.errors)
+        if not valid:
+            return
+
+        city_ids = self.cities.resolve({data['city_name'] for data in valid}, create=True)
+        created, updated = self.save([
+            dict(
+                name=data['name'], address=data['address'],
+                object_type=data['object_type'], city_id=city_ids[data['city_name']],
+            )
+            for data in valid
+        ])
+        self.report['created'] += created
+        self.report['updated'] += updated
+        bump_reference_version()
+        # Сигналы моделей при загрузке не срабатывают
+        objects_imported.send(sender=type(self))
+
+    @staticmethod
+    @write_transaction
+    def save(rows):
+        # Дубликаты адресов, заведенные раньше вручную, не трогаем -
+        # обновляется первый по id объект
+        existing = {}
+        for building_object in (
+            BuildingObject.objects
+            .filter(city_id__in={row['city_id'] for row in rows},
+                    address__in={row['address'] for row in rows})
+            .order_by('-id')
+        ):
+            existing[(building_object.city_id, building_object.address)] = building_object
+
+        new, changed = {}, {}
+        for row in rows:
+            key = (row['city_id'], row['address'])
+            building_object = existing.get(key) or new.get(key)
+            if building_object is None:
+                new[key] = BuildingObject(**row)
+                continue
+            building_object.name = row['name']
+            building_object.object_type = row['object_type']
+            if building_object.pk:
+                changed[building_object.pk] = building_object
+
+        now = timezone.now()
+        BuildingObject.objects.bulk_create(new.values())
+        for building_object in changed.values():
+            building_object.updated_at = now
+        update_rows(BuildingObject, changed.values(), ['name', 'object_type', 'updated_at'])
+        return len(new), len(rows) - len(new)
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('objects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='buildingobject',
+            index=models.Index(fields=['object_type', 'id'], name='buildingobject_type'),
+        ),
+    ]
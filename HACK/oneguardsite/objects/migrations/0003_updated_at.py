@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('objects', '0002_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='buildingobject',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='city',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='buildingobject',
+            index=models.Index(fields=['updated_at', 'id'], name='buildingobject_updated'),
+        ),
+    ]
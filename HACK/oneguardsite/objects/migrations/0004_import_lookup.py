@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('objects', '0003_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='buildingobject',
+            index=models.Index(fields=['city', 'address'], name='buildingobject_city_address'),
+        ),
+    ]
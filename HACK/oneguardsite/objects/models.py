@@ -3,6 +3,7 @@ from django.db import models
 
 class City(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'Город'
@@ -24,10 +25,17 @@ class BuildingObject(models.Model):
     address = models.TextField()
     object_type = models.CharField(max_length=20, choices=OBJECT_TYPES)
     city = models.ForeignKey(City, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'Объект'
         verbose_name_plural = 'Объекты'
+        indexes = [
+            models.Index(fields=['object_type', 'id'], name='buildingobject_type'),
+            models.Index(fields=['updated_at', 'id'], name='buildingobject_updated'),
+            # Поиск объекта по адресу при загрузке из файла
+            models.Index(fields=['city', 'address'], name='buildingobject_city_address'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.get_object_type_display()})"
\ No newline at end of file
@@ -22,4 +22,13 @@ class BuildingObjectListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = BuildingObject
-        fields = ['id', 'name', 'address', 'object_type', 'object_type_display', 'city_name']
\ No newline at end of file
+        fields = ['id', 'name', 'address', 'object_type', 'object_type_display', 'city_name']
+
+
+class BuildingObjectImportSerializer(serializers.ModelSerializer):
+    # Проверка строки файла загрузки: город передается названием
+    city_name = serializers.CharField(max_length=100)
+
+    class Meta:
+        model = BuildingObject
+        fields = ['name', 'address', 'object_type', 'city_name']
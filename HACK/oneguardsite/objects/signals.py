@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from .cache import bump_reference_version
+from .models import City, BuildingObject
+
+
+# Загрузка записала пачку объектов в обход save() (bulk_create и UPDATE)
+objects_imported = Signal()
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=BuildingObject)
+@receiver(post_delete, sender=BuildingObject)
+def invalidate_reference_cache(sender, **kwargs):
+    bump_reference_version()
@@ -1,3 +1,181 @@
-from django.test import TestCase
+import io
+import unittest
+from importlib.util import find_spec
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from clients.cache import get_activity_version, get_data_version
+from clients.tests import QueryCountTestCase, SeededTestCase
+from .cache import REFERENCE_VERSION_KEY, get_reference_version
+from .models import City, BuildingObject
+from .serializers import BuildingObjectListSerializer
+
+
+class ObjectQueryCountTests(QueryCountTestCase):
+    def test_city_list(self):
+        self.assertQueries(1, reverse('city-list'))
+
+    def test_object_list(self):
+        # страница объектов вместе с городом
+        response = self.assertQueries(1, reverse('object-list'))
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_object_list_filtered(self):
+        city_id = self.building_objects[0].city_id
+        self.assertQueries(1, reverse('object-list'), city_id=city_id, object_type='mcd')
+
+    def test_object_detail(self):
+        self.assertQueries(1, reverse('object-detail', args=[self.building_objects[0].pk]))
+
+    def test_objects_by_city(self):
+        city_id = self.building_objects[0].city_id
+        response = self.assertQueries(1, reverse('objects-by-city', args=[city_id]))
+        self.assertEqual(len(response.data), 4)
+
+
+class FastListSerializationTests(SeededTestCase):
+    def test_object_list_matches_model_serializer(self):
+        response = self.client.get(reverse('object-list'))
+        expected = BuildingObjectListSerializer(
+            BuildingObject.objects.order_by('id'), many=True
+        ).data
+        self.assertEqual(
+            JSONRenderer().render(response.data['results']),
+            JSONRenderer().render(expected)
+        )
+
+
+class ReferenceCacheTests(QueryCountTestCase):
+    def test_repeated_request_is_cached(self):
+        first = self.assertQueries(1, reverse('object-list'))
+        second = self.assertQueries(0, reverse('object-list'))
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_not_modified(self):
+        etag = self.client.get(reverse('city-list'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('city-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_not_modified_compressed(self):
+        # Сжатый ответ уходит со слабым ETag, клиент возвращает его как есть
+        response = self.client.get(reverse('object-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/'))
+        response = self.client.get(
+            reverse('object-list'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_version_shared_between_workers(self):
+        # Другой воркер - отдельный экземпляр кэша с теми же настройками
+        other_worker = caches.create_connection('default')
+        version = get_reference_version()
+        self.assertEqual(other_worker.get(REFERENCE_VERSION_KEY), version)
+        City.objects.create(name='Новый город')
+        self.assertNotEqual(other_worker.get(REFERENCE_VERSION_KEY), version)
+
+    def test_filter_variants_cached_separately(self):
+        city_id = self.building_objects[0].city_id
+        everything = self.client.get(reverse('object-list'))
+        filtered = self.client.get(reverse('object-list'), {'city_id': city_id})
+        self.assertNotEqual(everything['ETag'], filtered['ETag'])
+        self.assertEqual(len(filtered.data['results']), 4)
+        self.assertEqual(len(everything.data['results']), 12)
+
+    def test_change_invalidates_cache(self):
+        etag = self.client.get(reverse('city-list'))['ETag']
+        City.objects.create(name='Новый город')
+        response = self.client.get(reverse('city-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Новый город', [city['name'] for city in response.data])
+
+
+class AsyncReferenceTests(QueryCountTestCase):
+    def test_same_as_sync(self):
+        city_id = self.building_objects[0].city_id
+        for name, args, params in [
+            ('city-list', [], {}),
+            ('object-list', [], {'city_id': city_id, 'page_size': 2}),
+            ('object-detail', [self.building_objects[0].pk], {}),
+            ('objects-by-city', [city_id], {}),
+        ]:
+            expected = self.client.get(reverse(name, args=args), params)
+            response = self.client.get(reverse(f'async-{name}', args=args), params)
+            self.assertEqual(
+                response.content.replace(b'/api/async/', b'/api/'), expected.content, name
+            )
+
+    def test_not_modified(self):
+        response = self.client.get(reverse('async-city-list'))
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse('async-city-list'), HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+
+class ObjectImportTests(SeededTestCase):
+    def upload(self, text, name='objects.csv'):
+        upload = SimpleUploadedFile(name, text.encode('utf-8') if isinstance(text, str) else text)
+        return self.client.post(reverse('object-import'), {'file': upload}, format='multipart')
+
+    def test_import_objects(self):
+        text = (
+            'city_name;name;address;object_type\n'
+            'Город 0;Новое имя;ул. Ленина, 1;Кафе\n'
+            'Новый город;Дом 1;ул. Мира, 1;mcd\n'
+            'Новый город;;ул. Мира, 2;mcd\n'
+            'Новый город;Дом 3;ул. Мира, 3;zoo\n'
+        )
+        versions = get_data_version(), get_activity_version()
+        response = self.upload(text)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            (response.data['rows'], response.data['created'], response.data['updated'], response.data['invalid']),
+            (4, 1, 1, 2)
+        )
+        self.assertEqual([error['row'] for error in response.data['errors']], [4, 5])
+        self.assertIn('name', response.data['errors'][0]['errors'])
+        # Сводки клиентов сбрасываются, хотя save() объектов не вызывался
+        self.assertNotEqual(get_data_version(), versions[0])
+        self.assertNotEqual(get_activity_version(), versions[1])
+
+        # Объект найден по (город, адрес) и обновлен, дубликата нет
+        updated = BuildingObject.objects.get(city__name='Город 0', address='ул. Ленина, 1')
+        self.assertEqual((updated.name, updated.object_type), ('Новое имя', 'cafe'))
+        self.assertTrue(BuildingObject.objects.filter(city__name='Новый город', address='ул. Мира, 1').exists())
+
+        # Повторная загрузка только обновляет
+        response = self.upload(text)
+        self.assertEqual((response.data['created'], response.data['updated']), (0, 2))
+        self.assertEqual(City.objects.filter(name='Новый город').count(), 1)
+
+    def test_import_requires_admin(self):
+        self.authenticate(self.engineers[0])
+        response = self.upload('city_name;name;address;object_type\n')
+        self.assertEqual(response.status_code, 403)
+
+    @unittest.skipUnless(find_spec('openpyxl'), 'openpyxl не установлен')
+    def test_import_xlsx(self):
+        import openpyxl
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['city_name', 'name', 'address', 'object_type'])
+        sheet.append(['Город 0', 'Дом из книги', 'ул. Садовая, 12', 'МКД'])
+        sheet.append(['Город 0', '', 'ул. Садовая, 14', 'mcd'])
+        content = io.BytesIO()
+        workbook.save(content)
+
+        response = self.upload(content.getvalue(), name='objects.xlsx')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['created'], response.data['invalid']), (1, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 3)
+        self.assertEqual(
+            BuildingObject.objects.get(address='ул. Садовая, 12').object_type, 'mcd'
+        )
@@ -1,20 +1,41 @@
 from rest_framework import generics, permissions
+from oneguardsite.fastpath import FastListMixin, ValuesSerializer
+from oneguardsite.importing import ImportView
+from oneguardsite.pagination import KeysetPagination
+from .cache import ReferenceCacheMixin
+from .importer import ObjectImporter
 from .models import City, BuildingObject
 from .serializers import CitySerializer, BuildingObjectSerializer, BuildingObjectListSerializer
 
 
-class CityListView(generics.ListAPIView):
+OBJECT_TYPE_LABELS = dict(BuildingObject.OBJECT_TYPES)
+
+# Быстрый вывод BuildingObjectListSerializer для списков
+building_object_list_fast = ValuesSerializer(
+    BuildingObjectListSerializer,
+    overrides={
+        'object_type_display': (
+            'object_type', lambda value: OBJECT_TYPE_LABELS.get(value, value)
+        ),
+    }
+)
+
+
+class CityListView(ReferenceCacheMixin, generics.ListAPIView):
     queryset = City.objects.all()
     serializer_class = CitySerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
-class BuildingObjectListView(generics.ListAPIView):
+class BuildingObjectListView(ReferenceCacheMixin, FastListMixin, generics.ListAPIView):
     serializer_class = BuildingObjectListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
+    fast_serializer = building_object_list_fast
 
     def get_queryset(self):
-        queryset = BuildingObject.objects.all()
+        queryset = BuildingObject.objects.select_related('city')
 
         # Фильтрация по городу
         city_id = self.request.query_params.get('city_id')
@@ -29,16 +50,22 @@ class BuildingObjectListView(generics.ListAPIView):
         return queryset
 
 
-class BuildingObjectDetailView(generics.RetrieveAPIView):
-    queryset = BuildingObject.objects.all()
+class BuildingObjectDetailView(ReferenceCacheMixin, generics.RetrieveAPIView):
+    queryset = BuildingObject.objects.select_related('city')
     serializer_class = BuildingObjectSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
-class BuildingObjectsByCityView(generics.ListAPIView):
+class BuildingObjectsByCityView(ReferenceCacheMixin, FastListMixin, generics.ListAPIView):
     serializer_class = BuildingObjectListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    fast_serializer = building_object_list_fast
 
     def get_queryset(self):
         city_id = self.kwargs['city_id']
-        return BuildingObject.objects.filter(city_id=city_id)
\ No newline at end of file
+        return BuildingObject.objects.filter(city_id=city_id).select_related('city')
+
+
+class ObjectImportView(ImportView):
+    """Загрузка объектов из CSV или XLSX по ключу (город, адрес)"""
+    importer_class = ObjectImporter
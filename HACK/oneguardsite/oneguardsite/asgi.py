@@ -13,4 +13,61 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oneguardsite.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed  # noqa: E402
+from django.core.handlers.asgi import ASGIHandler  # noqa: E402
+from django.core.handlers.exception import convert_exception_to_response  # noqa: E402
+from django.utils.module_loading import import_string  # noqa: E402
+
+ASYNC_API_PREFIX = '/api/async/'
+
+
+class AsyncAPIHandler(ASGIHandler):
+    """Обработчик асинхронного API с коротким списком middleware
+
+    Цепочка собирается так же, как в BaseHandler.load_middleware, но из
+    ASYNC_API_MIDDLEWARE, без подмены глобального settings.MIDDLEWARE.
+    В списке допускаются только middleware, умеющие работать асинхронно:
+    синхронная потребовала бы перехода в поток на каждый запрос.
+    """
+
+    def load_middleware(self, is_async=False):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        get_response = self._get_response_async if is_async else self._get_response
+        handler = convert_exception_to_response(get_response)
+        for middleware_path in reversed(settings.ASYNC_API_MIDDLEWARE):
+            middleware = import_string(middleware_path)
+            if not getattr(middleware, 'async_capable', False):
+                raise ImproperlyConfigured(
+                    f'{middleware_path} не поддерживает async и не может стоять в ASYNC_API_MIDDLEWARE'
+                )
+            try:
+                instance = middleware(handler)
+            except MiddlewareNotUsed:
+                continue
+
+            if hasattr(instance, 'process_view'):
+                self._view_middleware.insert(0, self.adapt_method_mode(is_async, instance.process_view))
+            if hasattr(instance, 'process_template_response'):
+                self._template_response_middleware.append(
+                    self.adapt_method_mode(is_async, instance.process_template_response)
+                )
+            if hasattr(instance, 'process_exception'):
+                # Обработка исключений в Django пока всегда синхронная
+                self._exception_middleware.append(self.adapt_method_mode(False, instance.process_exception))
+            handler = convert_exception_to_response(instance)
+        self._middleware_chain = handler
+
+
+async_api_application = AsyncAPIHandler()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith(ASYNC_API_PREFIX):
+        return await async_api_application(scope, receive, send)
+    return await django_application(scope, receive, send)
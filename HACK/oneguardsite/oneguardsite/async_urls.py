@@ -0,0 +1,17 @@
+from django.urls import path
+from clients import async_views as clients
+from objects import async_views as objects
+from users import async_views as users
+
+# Асинхронные версии частых запросов на чтение (для запуска под ASGI).
+# Ответы совпадают с одноименными маршрутами /api/...
+urlpatterns = [
+    path('clients/', clients.client_list, name='async-client-list'),
+    path('clients/<int:pk>/', clients.client_detail, name='async-client-detail'),
+    path('reports/', clients.client_reports, name='async-client-reports'),
+    path('cities/', objects.city_list, name='async-city-list'),
+    path('objects/', objects.object_list, name='async-object-list'),
+    path('objects/<int:pk>/', objects.object_detail, name='async-object-detail'),
+    path('cities/<int:city_id>/objects/', objects.objects_by_city, name='async-objects-by-city'),
+    path('users/me/', users.current_user, name='async-current-user'),
+]
@@ -0,0 +1,54 @@
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+
+def _new_version():
+    # Версия на основе времени: после вытеснения ключа из кэша
+    # новая версия не совпадет ни с одной из старых
+    return time.time_ns()
+
+
+def get_version(key):
+    """Текущее значение счетчика версии key; создается при первом чтении"""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(key):
+    """get_version для асинхронных представлений"""
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _new_version(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(key):
+    """Меняет версию key: все ключи кэша, построенные на старой, больше не читаются"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+@contextmanager
+def cache_directory(directory):
+    """Переносит файловые кэши в каталог directory
+
+    Для тестов и временной базы: данные другой БД не должны попасть в рабочий
+    кэш, который читают воркеры сервера.
+    """
+    relocated = {
+        alias: {**options, 'LOCATION': os.path.join(directory, alias)}
+        for alias, options in settings.CACHES.items()
+    }
+    with override_settings(CACHES=relocated):
+        yield
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+re_accepts_brotli = _lazy_re_compile(r'\bbr\b')
+
+# Brotli только для ответов API: в них нет CSRF-токена, поэтому сжатие без
+# случайной добавки GZipMiddleware не открывает атаку BREACH на HTML-страницы
+BROTLI_CONTENT_TYPES = ('application/json', 'application/msgpack')
+
+# Форматы, уже сжатые внутри (XLSX - это zip): повторное сжатие только тратит
+# процессор, поэтому такие ответы не сжимаются ни brotli, ни gzip
+COMPRESSED_CONTENT_TYPES = (
+    'application/zip', 'application/gzip', 'application/x-gzip', 'application/x-bzip2',
+    'application/x-7z-compressed', 'application/vnd.rar', 'application/x-rar-compressed',
+    'application/vnd.openxmlformats-officedocument.', 'application/vnd.oasis.opendocument.',
+    'image/', 'video/', 'audio/', 'font/woff',
+)
+# Текстовые форматы среди перечисленных выше
+UNCOMPRESSED_CONTENT_TYPES = ('image/svg+xml',)
+
+
+def is_compressed(content_type):
+    content_type = content_type.split(';')[0].strip().lower()
+    return (
+        content_type.startswith(COMPRESSED_CONTENT_TYPES)
+        and content_type not in UNCOMPRESSED_CONTENT_TYPES
+    )
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Сжатие ответов от COMPRESSION_MIN_SIZE байт: brotli, если он установлен
+    и его принимает клиент, иначе gzip (потоковые выгрузки - всегда gzip)
+
+    Мелкие ответы не сжимаются: на коротком JSON выигрыш в байтах меньше,
+    чем затраты процессора на сжатие с обеих сторон. Уже сжатые форматы
+    (XLSX, zip, изображения) отдаются как есть.
+    """
+
+    def process_response(self, request, response):
+        if is_compressed(response.get('Content-Type', '')):
+            return response
+        if response.streaming:
+            return super().process_response(request, response)
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+        if brotli is None or response.has_header('Content-Encoding'):
+            return super().process_response(request, response)
+
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type not in BROTLI_CONTENT_TYPES:
+            return super().process_response(request, response)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not re_accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            return super().process_response(request, response)
+
+        compressed = brotli.compress(response.content, quality=getattr(settings, 'BROTLI_QUALITY', 5))
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,119 @@
+import functools
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from . import metrics
+from .caching import cache_directory
+
+
+logger = logging.getLogger(__name__)
+
+LOCK_ERRORS = ('database is locked', 'database table is locked', 'database is busy')
+
+# Счетчики процесса: сколько раз запись повторялась и сколько раз сдались
+write_stats = {'retries': 0, 'gave_up': 0}
+
+
+def is_lock_error(exc):
+    """Ошибка SQLite из-за занятой другим процессом или потоком базы"""
+    return isinstance(exc, OperationalError) and any(
+        message in str(exc).lower() for message in LOCK_ERRORS
+    )
+
+
+def retry_delay(attempt):
+    """Экспоненциальная задержка со случайным разбросом, чтобы воркеры не
+    просыпались одновременно и не сталкивались снова"""
+    base = getattr(settings, 'DATABASE_WRITE_RETRY_DELAY', 0.05)
+    cap = getattr(settings, 'DATABASE_WRITE_RETRY_MAX_DELAY', 2.0)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def write_transaction(func=None, using=DEFAULT_DB_ALIAS):
+    """Выполняет запись в транзакции и повторяет ее, если база заблокирована
+
+    С transaction_mode = IMMEDIATE в настройках БД транзакция сразу берет
+    блокировку записи (BEGIN IMMEDIATE), поэтому конфликт возможен только на
+    входе, до первого изменения, и повтор целиком безопасен. Внутри уже
+    открытой транзакции это обычная точка сохранения без повторов:
+    повторять может только внешний уровень.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if connections[using].in_atomic_block:
+                with transaction.atomic(using=using):
+                    return func(*args, **kwargs)
+            attempts = getattr(settings, 'DATABASE_WRITE_RETRIES', 5)
+            for attempt in range(attempts + 1):
+                try:
+                    with transaction.atomic(using=using):
+                        return func(*args, **kwargs)
+                except OperationalError as exc:
+                    if not is_lock_error(exc):
+                        raise
+                    if attempt == attempts:
+                        write_stats['gave_up'] += 1
+                        metrics.DB_WRITE_GAVE_UP.inc()
+                        raise
+                    write_stats['retries'] += 1
+                    metrics.DB_WRITE_RETRIES.inc()
+                    delay = retry_delay(attempt)
+                    logger.warning('%s: база заблокирована, повтор %d через %.3f с',
+                                   func.__qualname__, attempt + 1, delay)
+                    time.sleep(delay)
+        return wrapper
+
+    if func is None:
+        return decorator
+    return decorator(func)
+
+
+class WriteTransactionMixin:
+    """create/update/destroy generic-представлений через write_transaction
+
+    Сохранение, счетчики из сигналов и история коммитятся вместе и
+    повторяются целиком при блокировке базы.
+    """
+
+    def create(self, request, *args, **kwargs):
+        return write_transaction(super().create)(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        return write_transaction(super().update)(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        return write_transaction(super().destroy)(request, *args, **kwargs)
+
+
+@contextmanager
+def temporary_database(keep=False, using=DEFAULT_DB_ALIAS):
+    """Переключает соединение на новую базу во временном каталоге и создает схему
+
+    Для нагрузочных команд: рабочая база и рабочий кэш не затрагиваются (кэш
+    лежит рядом с базой, в каталоге cache). Возвращает путь к файлу базы; после
+    выхода соединение снова смотрит на настроенную базу.
+    """
+    connection = connections[using]
+    directory = tempfile.mkdtemp(prefix='oneguardsite_')
+    database = os.path.join(directory, 'db.sqlite3')
+    original = connection.settings_dict['NAME']
+    connection.close()
+    connection.settings_dict['NAME'] = database
+    try:
+        with cache_directory(os.path.join(directory, 'cache')):
+            call_command('migrate', database=using, verbosity=0)
+            yield database
+    finally:
+        connection.close()
+        connection.settings_dict['NAME'] = original
+        if not keep:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,112 @@
+from django.utils import timezone
+from rest_framework import ISO_8601, fields, relations
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+class ValuesSerializer:
+    """Быстрое представление для списков только на чтение
+
+    Строит тот же вывод, что и serializer_class, но читает строки через
+    .values() и собирает словари напрямую, без создания моделей и обхода
+    полей сериализатора на каждой строке. План полей (что выбирать и чем
+    преобразовывать) вычисляется один раз из самого сериализатора, поэтому
+    набор, порядок и формат полей совпадают с ним.
+
+    overrides: {имя поля: (путь для values(), функция преобразования)} - для
+    полей, источник которых не выражается путем в БД (например, get_FOO_display).
+    """
+
+    def __init__(self, serializer_class, overrides=None):
+        self.serializer_class = serializer_class
+        self.overrides = overrides or {}
+        self._plan = None
+
+    @property
+    def plan(self):
+        if self._plan is None:
+            self._plan = self.build_plan()
+        return self._plan
+
+    def build_plan(self):
+        plan = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if name in self.overrides:
+                lookup, convert = self.overrides[name]
+            elif isinstance(field, relations.PrimaryKeyRelatedField):
+                # values() сразу отдает первичный ключ связанной записи
+                lookup, convert = field.source, None
+            else:
+                lookup, convert = '__'.join(field.source_attrs), field
+            plan.append((name, lookup, convert))
+        return plan
+
+    def converters(self):
+        """План с функциями преобразования для текущего запроса"""
+        return [
+            (name, lookup, self.converter(convert) if isinstance(convert, fields.Field) else convert)
+            for name, lookup, convert in self.plan
+        ]
+
+    @staticmethod
+    def converter(field):
+        # Строки из текстовых колонок и разобранный JSON уже в нужном виде
+        if type(field) is fields.CharField or (
+            isinstance(field, fields.JSONField) and not field.binary
+        ):
+            return None
+        if isinstance(field, fields.DateTimeField):
+            return datetime_converter(field)
+        return field.to_representation
+
+    def rows(self, queryset):
+        """Набор словарей с нужными колонками (с JOIN вместо объектов)"""
+        return queryset.values(*{lookup for _, lookup, _ in self.plan})
+
+    def represent(self, rows):
+        plan = self.converters()
+        return [
+            {
+                name: row[lookup] if convert is None or row[lookup] is None
+                else convert(row[lookup])
+                for name, lookup, convert in plan
+            }
+            for row in rows
+        ]
+
+
+def datetime_converter(field):
+    """DateTimeField.to_representation с часовым поясом, найденным один раз
+
+    DRF на каждое значение заново определяет текущий часовой пояс, и на
+    больших списках это заметная часть времени.
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if hasattr(field, 'timezone') or output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+    field_timezone = field.default_timezone()
+    if field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if isinstance(value, str) or timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+class FastListMixin:
+    """list() через ValuesSerializer из атрибута fast_serializer"""
+    fast_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        rows = self.fast_serializer.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.fast_serializer.represent(page))
+        return Response(self.fast_serializer.represent(rows))
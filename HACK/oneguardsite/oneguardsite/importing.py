@@ -0,0 +1,243 @@
+import abc
+import codecs
+import csv
+import io
+import itertools
+import os
+import zipfile
+
+from django.conf import settings
+from django.db import connection
+from rest_framework import generics, permissions, status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+
+
+FORMATS = ('csv', 'xlsx')
+
+# Сколько строк файла проверяется и записывается за одну транзакцию
+CHUNK_SIZE = 2000
+
+# Сколько ошибок по строкам попадает в отчет; счетчик invalid учитывает все
+MAX_ERRORS = 1000
+
+
+class ImportUnavailable(Exception):
+    pass
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+class ImportTooLarge(Exception):
+    pass
+
+
+def open_rows(source, file_format, encoding='utf-8-sig'):
+    """Строки файла (списки значений) по одной; первая строка - заголовок"""
+    if file_format == 'csv':
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            raise ImportFormatError(f'Неизвестная кодировка: {encoding}')
+        return _csv_rows(source, encoding)
+    if file_format == 'xlsx':
+        try:
+            import openpyxl
+        except ImportError:
+            raise ImportUnavailable('Для загрузки XLSX нужен пакет openpyxl')
+        return _xlsx_rows(openpyxl, source)
+    raise ImportFormatError(f'Неизвестный формат загрузки: {file_format}')
+
+
+def _csv_rows(source, encoding):
+    text = io.TextIOWrapper(source, encoding=encoding, newline='')
+    try:
+        header = text.readline()
+        # Excel с русской локалью сохраняет CSV с точкой с запятой
+        delimiter = ';' if header.count(';') > header.count(',') else ','
+        yield from csv.reader(itertools.chain([header], text), delimiter=delimiter)
+    finally:
+        # Файл закрывает тот, кто его открыл
+        text.detach()
+
+
+def _xlsx_rows(openpyxl, source):
+    # read_only: строки читаются из архива по мере обхода, а не целиком
+    try:
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, openpyxl.utils.exceptions.InvalidFileException):
+        raise ImportFormatError('Файл не является книгой XLSX')
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield [_cell_value(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def _cell_value(value):
+    if value is None:
+        return ''
+    # Числа в XLSX приходят как float: номер квартиры 12.0 -> 12
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _plain(errors):
+    # ErrorDetail -> строки, чтобы отчет одинаково печатался и отдавался в JSON
+    if isinstance(errors, dict):
+        return {name: _plain(value) for name, value in errors.items()}
+    if isinstance(errors, list):
+        return [_plain(value) for value in errors]
+    return str(errors)
+
+
+def update_rows(model, objects, fields):
+    """Один подготовленный UPDATE на все записи (executemany)
+
+    bulk_update строит CASE на каждую запись и на больших пакетах заметно
+    медленнее; значения готовятся теми же полями модели, что и при save().
+    """
+    if not objects:
+        return
+    fields = [model._meta.get_field(name) for name in fields]
+    quote = connection.ops.quote_name
+    assignments = ', '.join(f'{quote(field.column)} = %s' for field in fields)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {quote(model._meta.db_table)} SET {assignments} '
+            f'WHERE {quote(model._meta.pk.column)} = %s',
+            [
+                [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields]
+                + [obj.pk]
+                for obj in objects
+            ]
+        )
+
+
+def file_format_for(name, file_format=None):
+    """Формат явно или по расширению файла"""
+    file_format = (file_format or os.path.splitext(name)[1].lstrip('.')).lower()
+    if file_format not in FORMATS:
+        raise ImportFormatError(f'Неизвестный формат загрузки: {file_format or name}')
+    return file_format
+
+
+class Importer(abc.ABC):
+    """Общий цикл загрузки: файл читается пачками по chunk_size строк,
+    каждая пачка проверяется и записывается своей транзакцией
+
+    Память не зависит от размера файла: в ней одна пачка строк, кэши
+    справочников и не больше MAX_ERRORS ошибок. Уже записанные пачки не
+    откатываются, если файл оборвался или следующая пачка упала.
+    Наследники задают required_columns и import_chunk.
+    """
+    required_columns = ()
+
+    def __init__(self, user=None, chunk_size=CHUNK_SIZE):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.report = {'rows': 0, 'created': 0, 'updated': 0, 'invalid': 0, 'errors': []}
+
+    def run(self, source, file_format, encoding='utf-8-sig', progress=None, max_rows=None):
+        """Загружает файл; с max_rows файл длиннее лимита отклоняется целиком"""
+        rows = open_rows(source, file_format, encoding)
+        try:
+            header = [str(name).strip().lower() for name in next(rows)]
+        except StopIteration:
+            raise ImportFormatError('Файл пуст')
+        except UnicodeDecodeError:
+            raise ImportFormatError(f'Файл не в кодировке {encoding}')
+        self.check_header(header)
+
+        # Номера строк - как в Excel: заголовок первая строка
+        records = (
+            (number, {name: value.strip() if isinstance(value, str) else value
+                      for name, value in zip(header, row)})
+            for number, row in enumerate(rows, start=2)
+            if any(value not in ('', None) for value in row)
+        )
+        if max_rows is not None:
+            # Лимит проверяется до первой пачки: иначе часть файла уже была бы записана
+            head = self.read(records, max_rows + 1, encoding)
+            if len(head) > max_rows:
+                raise ImportTooLarge(
+                    f'В файле больше {max_rows} строк: загрузите его командой manage.py import_data'
+                )
+            records = iter(head)
+        while True:
+            chunk = self.read(records, self.chunk_size, encoding)
+            if not chunk:
+                break
+            self.report['rows'] += len(chunk)
+            self.import_chunk(chunk)
+            if progress:
+                progress(self.report)
+        return self.report
+
+    def read(self, records, count, encoding):
+        try:
+            return list(itertools.islice(records, count))
+        except UnicodeDecodeError:
+            raise ImportFormatError(
+                f'Файл не в кодировке {encoding} (после строки {self.report["rows"] + 1})'
+            )
+
+    def check_header(self, header):
+        missing = [name for name in self.required_columns if name not in header]
+        if missing:
+            raise ImportFormatError(f'В файле нет колонок: {", ".join(missing)}')
+
+    def add_error(self, number, errors):
+        self.report['invalid'] += 1
+        if len(self.report['errors']) < MAX_ERRORS:
+            self.report['errors'].append({'row': number, 'errors': _plain(errors)})
+
+    @abc.abstractmethod
+    def import_chunk(self, chunk):
+        """Проверяет и записывает пачку строк [(номер строки, {колонка: значение})]"""
+
+
+class ImportView(generics.GenericAPIView):
+    """Загрузка из CSV или XLSX (поле file) пачками; отвечает отчетом с
+    числом созданных и обновленных записей и ошибками по строкам
+
+    Загрузка идет внутри запроса, поэтому файл ограничен размером и числом
+    строк, которые воркер успевает записать до таймаута. Большие файлы
+    загружаются командой import_data.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+    importer_class = None
+
+    def post(self, request):
+        if request.user.role != 'admin':
+            return Response(
+                {'error': 'Только администраторы могут загружать данные'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Не передан файл'}, status=status.HTTP_400_BAD_REQUEST)
+        max_size = getattr(settings, 'IMPORT_MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
+        if upload.size > max_size:
+            return Response(
+                {'error': f'Файл больше {max_size // 1024} КБ: загрузите его командой manage.py import_data'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+
+        job = self.importer_class(user=request.user)
+        try:
+            file_format = file_format_for(upload.name, request.data.get('file_format'))
+            report = job.run(
+                upload.file, file_format, encoding=request.data.get('encoding') or 'utf-8-sig',
+                max_rows=getattr(settings, 'IMPORT_MAX_ROWS', 20000)
+            )
+        except ImportTooLarge as e:
+            return Response({'error': str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except (ImportUnavailable, ImportFormatError) as e:
+            # Пачки, записанные до ошибки, остаются - отчет показывает сколько
+            return Response(dict(job.report, error=str(e)), status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
@@ -0,0 +1,405 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Границы корзин времени ответа и времени БД, с
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    """Счетчики и гистограммы процесса в памяти
+
+    Значение хранится по ключу (метрика, значения меток): у счетчика - число,
+    у гистограммы - список [попадания в каждую корзину..., в +Inf, сумма].
+    Если задан METRICS_DIR, процесс раз в METRICS_FLUSH_INTERVAL секунд
+    записывает свои значения в собственный файл каталога (через временный
+    файл и os.replace, чтобы читатель не увидел половину), а collect()
+    суммирует файлы всех воркеров.
+
+    Пока процесс жив, он держит flock на своем файле .lock. Файлы
+    завершившихся воркеров (замок свободен) collect() и shutdown() сливают в
+    общий aggregate.json и удаляют, поэтому каталог не растет с каждым
+    перезапуском воркера, а счетчики не уменьшаются. В aggregate.json
+    записаны и имена слитых файлов: читатель, успевший увидеть такой файл
+    до удаления, не посчитает его дважды. Без fcntl (Windows) файлы не
+    сливаются и остаются в каталоге.
+    """
+
+    AGGREGATE = 'aggregate.json'
+
+    def __init__(self):
+        self.metrics = {}
+        self.reset()
+
+    def reset(self):
+        # После fork потомок начинает с нуля и пишет в свой файл,
+        # иначе значения родителя посчитались бы дважды. Унаследованный
+        # дескриптор замка закрываем: замок остается за родителем
+        if getattr(self, 'lock_file', None) is not None:
+            self.lock_file.close()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.values = {}
+        self.path = None
+        self.lock_file = None
+        self.flushed = time.monotonic()
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'Метрика {metric.name} уже зарегистрирована')
+        self.metrics[metric.name] = metric
+
+    def add(self, name, labels, amount):
+        with self.lock:
+            self.values[name, labels] = self.values.get((name, labels), 0) + amount
+
+    def observe(self, name, labels, index, size, value):
+        with self.lock:
+            entry = self.values.get((name, labels))
+            if entry is None:
+                entry = self.values[name, labels] = [0] * size + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    @staticmethod
+    def directory():
+        return getattr(settings, 'METRICS_DIR', None)
+
+    def snapshot(self):
+        with self.lock:
+            return {key: list(value) if isinstance(value, list) else value
+                    for key, value in self.values.items()}
+
+    def maybe_flush(self):
+        """Сбрасывает значения в файл процесса, если прошел интервал"""
+        directory = self.directory()
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)
+        if directory and time.monotonic() - self.flushed >= interval:
+            self.flush(directory)
+
+    def flush(self, directory):
+        # Под lock только копия значений: запись файла не задерживает
+        # потоки, считающие метрики. flush_lock упорядочивает сами записи,
+        # чтобы более старая копия не легла поверх новой
+        with self.flush_lock:
+            self.flushed = time.monotonic()
+            values = self.snapshot()
+            if self.path is None:
+                os.makedirs(directory, exist_ok=True)
+                # Время в имени: новый процесс с тем же pid не затрет файл прежнего
+                self.path = os.path.join(directory, f'{os.getpid()}-{time.time_ns()}.json')
+                if fcntl is not None:
+                    self.lock_file = open(_lock_path(self.path), 'w')
+                    fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            _write_json(self.path, _dump_values(values))
+
+    def shutdown(self):
+        """Перед выходом процесса сливает его значения в общий файл"""
+        directory = self.directory()
+        if not directory:
+            return
+        if fcntl is None:
+            if self.values:
+                self.flush(directory)
+            return
+        with self.flush_lock:
+            # Забираем значения целиком: то, что насчитают после, пойдет в новый файл
+            with self.lock:
+                values, self.values = self.values, {}
+            if values or self.path:
+                os.makedirs(directory, exist_ok=True)
+                self.fold(directory, values, own=self.path)
+            if self.lock_file is not None:
+                self.lock_file.close()
+            self.path = self.lock_file = None
+
+    def fold(self, directory, values=None, own=None):
+        """Сливает файлы завершившихся воркеров (и values) в aggregate.json"""
+        with open(os.path.join(directory, f'{self.AGGREGATE}.lock'), 'w') as guard:
+            fcntl.flock(guard, fcntl.LOCK_EX)
+            aggregate = self.read_aggregate(directory)
+            merged = {}
+            _merge(merged, aggregate['values'])
+            # Уже учтенные файлы, которые прошлое слияние не успело удалить
+            folded = set(aggregate['folded'])
+            for filename in folded:
+                _remove_worker_file(os.path.join(directory, filename))
+            names = []
+            for filename in _worker_files(directory):
+                path = os.path.join(directory, filename)
+                if filename in folded or path == own or not _finished(path):
+                    continue
+                try:
+                    data = _read_json(path)
+                except (OSError, ValueError):
+                    continue
+                _merge(merged, data)
+                names.append(filename)
+            if values:
+                _merge(merged, _dump_values(values))
+            if own:
+                names.append(os.path.basename(own))
+            if not names and not values:
+                return
+
+            _write_json(os.path.join(directory, self.AGGREGATE), {
+                'folded': names, 'values': _dump_values(merged),
+            })
+            for filename in names:
+                _remove_worker_file(os.path.join(directory, filename))
+
+    def read_aggregate(self, directory):
+        try:
+            return _read_json(os.path.join(directory, self.AGGREGATE))
+        except (OSError, ValueError):
+            return {'folded': [], 'values': []}
+
+    def collect(self):
+        """Значения всех процессов: {(метрика, метки): значение}"""
+        directory = self.directory()
+        if not directory:
+            return self.snapshot()
+
+        self.flush(directory)
+        if fcntl is not None:
+            self.fold(directory)
+        # Файл, слитый другим процессом между чтением aggregate.json и
+        # самого файла, пропадает - тогда читаем каталог заново
+        for attempt in range(3):
+            filenames = list(_worker_files(directory))
+            aggregate = self.read_aggregate(directory)
+            merged = {}
+            _merge(merged, aggregate['values'])
+            folded = set(aggregate['folded'])
+            vanished = False
+            for filename in filenames:
+                if filename in folded:
+                    continue
+                try:
+                    _merge(merged, _read_json(os.path.join(directory, filename)))
+                except FileNotFoundError:
+                    vanished = True
+                except (OSError, ValueError):
+                    continue
+            if not vanished:
+                break
+        return merged
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        samples = {}
+        for (name, labels), value in self.collect().items():
+            samples.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {_escape_help(metric.documentation)}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for labels, value in sorted(samples.get(name, ())):
+                lines.extend(metric.samples(dict(zip(metric.labels, labels)), value))
+        return '\n'.join(lines) + '\n'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.registry = REGISTRY if registry is None else registry
+        self.registry.register(self)
+
+    def label_values(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(self.name, self.label_values(labels), amount)
+
+    def samples(self, labels, value):
+        return [f'{self.name}{_format_labels(labels)} {_format_number(value)}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labels, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        # Корзина le - первая граница, не меньшая значения
+        index = bisect.bisect_left(self.buckets, value)
+        self.registry.observe(self.name, self.label_values(labels), index, len(self.buckets) + 1, value)
+
+    def samples(self, labels, value):
+        lines = []
+        count = 0
+        for bound, hits in zip(self.buckets + (float('inf'),), value):
+            count += hits
+            le = '+Inf' if bound == float('inf') else _format_number(bound)
+            lines.append(f'{self.name}_bucket{_format_labels({**labels, "le": le})} {count}')
+        lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_number(value[-1])}')
+        lines.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return lines
+
+
+def _worker_files(directory):
+    for filename in os.listdir(directory):
+        if filename.endswith('.json') and filename != Registry.AGGREGATE:
+            yield filename
+
+
+def _lock_path(path):
+    return f'{os.path.splitext(path)[0]}.lock'
+
+
+def _finished(path):
+    """Процесс, писавший файл, завершился: его замок никто не держит"""
+    try:
+        lock_file = open(_lock_path(path), 'r+')
+    except FileNotFoundError:
+        return True
+    with lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+
+def _remove_worker_file(path):
+    for filename in (path, _lock_path(path)):
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+
+def _dump_values(values):
+    return [[name, list(labels), value] for (name, labels), value in values.items()]
+
+
+def _merge(merged, data):
+    for name, labels, value in data:
+        key = (name, tuple(labels))
+        current = merged.get(key)
+        if current is None:
+            merged[key] = value
+        elif isinstance(current, list):
+            merged[key] = [left + right for left, right in zip(current, value)]
+        else:
+            merged[key] = current + value
+
+
+def _read_json(path):
+    with open(path) as source:
+        return json.load(source)
+
+
+def _write_json(path, data):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as output:
+        json.dump(data, output)
+    os.replace(temporary, path)
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return f'{value:.1f}'
+    return repr(value)
+
+
+def _escape_help(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{label}="{_escape_label(value)}"' for label, value in labels.items())
+    return '{' + pairs + '}'
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REGISTRY = Registry()
+os.register_at_fork(after_in_child=REGISTRY.reset)
+atexit.register(REGISTRY.shutdown)
+
+
+HTTP_REQUESTS = Counter(
+    'oneguard_http_requests_total', 'Запросы по имени маршрута, методу и коду ответа',
+    ('view', 'method', 'status'),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'oneguard_http_request_duration_seconds', 'Время ответа по имени маршрута', ('view',),
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    'oneguard_http_request_db_queries', 'Число запросов к БД за один HTTP-запрос', ('view',),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    'oneguard_http_request_db_seconds', 'Время запросов к БД за один HTTP-запрос', ('view',),
+)
+CACHE_REQUESTS = Counter(
+    'oneguard_cache_requests_total', 'Обращения к кэшу: попадания и промахи', ('cache', 'result'),
+)
+SYNC_BATCH_SIZE = Histogram(
+    'oneguard_sync_offline_batch_size', 'Число записей в пакете офлайн-синхронизации',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+SYNC_RECORDS = Counter(
+    'oneguard_sync_offline_records_total', 'Записи офлайн-синхронизации по результату', ('status',),
+)
+DB_WRITE_RETRIES = Counter(
+    'oneguard_db_write_retries_total', 'Повторы записи из-за заблокированной базы',
+)
+DB_WRITE_GAVE_UP = Counter(
+    'oneguard_db_write_gave_up_total', 'Записи, не прошедшие после всех повторов',
+)
+
+
+def route_name(request):
+    """Метка маршрута: имя URL API (client-list, login) или page для страниц SPA"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    # Страницы фронтенда (в том числе /login/) - одна метка, чтобы не смешивать
+    # их с одноименными маршрутами API и не плодить метки на каждый путь
+    if not request.path.startswith('/api/'):
+        return 'page'
+    return match.url_name or 'unnamed'
+
+
+def record_request(request, response, total, queries, db_time):
+    view = route_name(request)
+    HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+    HTTP_REQUEST_SECONDS.observe(total, view=view)
+    HTTP_REQUEST_DB_QUERIES.observe(queries, view=view)
+    HTTP_REQUEST_DB_SECONDS.observe(db_time, view=view)
+    REGISTRY.maybe_flush()
+
+
+def record_cache(cache_name, value):
+    """Учитывает результат cache.get: None - промах"""
+    CACHE_REQUESTS.inc(cache=cache_name, result='miss' if value is None else 'hit')
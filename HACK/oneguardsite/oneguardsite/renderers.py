@@ -0,0 +1,80 @@
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Типы, которых нет в JSON и MessagePack (даты, Decimal, ленивые строки),
+# переводятся так же, как у DRF, поэтому ответы совпадают байт в байт
+_encode = JSONEncoder().default
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer на orjson: тот же вывод в несколько раз быстрее
+
+    Ответ с отступами (Accept: application/json; indent=4) и среда без
+    orjson обслуживаются обычным JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        content = orjson.dumps(
+            data, default=_encode,
+            # Ключи-числа становятся строками, как в json.dumps
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+        # Как у DRF: U+2028 и U+2029 ломают JavaScript внутри <script>
+        if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+            content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return content
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser на orjson: большие пакеты офлайн-синхронизации разбираются быстрее"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """Ответ в MessagePack (Accept: application/msgpack); нужен пакет msgpack"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_encode, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    """Тело запроса в MessagePack (Content-Type: application/msgpack)"""
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError, msgpack.exceptions.UnpackException) as exc:
+            # Обрезанные данные, лишние байты после объекта, слишком глубокая
+            # вложенность или ключ словаря недопустимого типа
+            raise ParseError(f'MessagePack parse error - {exc}')
@@ -1,5 +1,6 @@
 
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,6 +27,8 @@ INSTALLED_APPS = [
     'clients',
 ]
 MIDDLEWARE = [
+    'oneguardsite.timing.ServerTimingMiddleware',
+    'oneguardsite.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -36,6 +39,15 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Middleware для асинхронного API /api/async/ под ASGI (oneguardsite/asgi.py).
+# Сессии, CSRF и сообщения JWT-клиентам не нужны, а каждая синхронная
+# middleware в асинхронном стеке - это лишние переходы в поток на запрос.
+ASYNC_API_MIDDLEWARE = [
+    'oneguardsite.timing.ServerTimingMiddleware',
+    'oneguardsite.compression.CompressionMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+]
+
 ROOT_URLCONF = 'oneguardsite.urls'
 AUTH_USER_MODEL = 'users.User'
 
@@ -69,13 +81,90 @@ STATICFILES_DIRS = [
 WSGI_APPLICATION = 'oneguardsite.wsgi.application'
 
 
+# SQLite под несколькими воркерами: WAL (читатели не ждут писателя),
+# BEGIN IMMEDIATE для транзакций (блокировка записи берется сразу, без
+# взаимных блокировок при повышении) и постоянные соединения, чтобы
+# PRAGMA выполнялись один раз на соединение, а не на каждый запрос.
+# timeout - это busy_timeout SQLite: сколько секунд ждать занятую базу.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 10,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-20000;'  # 20 МБ
+                'PRAGMA mmap_size=134217728;'  # 128 МБ
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
     }
 }
 
+# Повтор записи, если база все же осталась занятой после timeout (oneguardsite/db.py)
+DATABASE_WRITE_RETRIES = 5
+DATABASE_WRITE_RETRY_DELAY = 0.05  # с, удваивается с каждой попыткой
+DATABASE_WRITE_RETRY_MAX_DELAY = 2.0  # с
+
+
+# Server-Timing по каждому запросу и журнал медленных запросов (oneguardsite/timing.py)
+SLOW_REQUEST_THRESHOLD = 0.5  # с; None - не писать журнал
+SLOW_REQUEST_TOP_SQL = 3  # сколько самых повторяющихся SQL в записи журнала
+
+# Метрики Prometheus (oneguardsite/metrics.py, /api/metrics/). Без каталога
+# счетчики живут в памяти процесса; с несколькими воркерами gunicorn задайте
+# общий каталог - каждый воркер пишет туда свой файл, а /api/metrics/ их
+# суммирует. Файлы завершившихся воркеров сливаются в aggregate.json.
+# Каталог очищают перед запуском сервера, иначе счетчики продолжатся с
+# прошлого запуска.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 1.0  # с
+
+
+# Кэш отчетов, справочников и версий данных - в файлах, общих для всех воркеров
+# gunicorn на машине: смена версии в одном воркере сразу видна остальным, и
+# отдельный сервер кэша не нужен. Тесты и нагрузочные команды переносят кэш во
+# временный каталог (oneguardsite/caching.py).
+CACHE_DIR = Path(os.environ.get('CACHE_DIR') or BASE_DIR / 'cache')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR / 'default',
+        # Сверх этого числа файлов треть случайно удаляется; потеря версии
+        # безопасна - новая версия на основе времени сбрасывает кэш
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Отзыв access-токенов (users/authentication.py) - отдельно от отчетов:
+    # их записи не должны вытеснить отзыв при чистке лишних файлов. Записей
+    # не больше, чем пользователей, поэтому до предела дело не доходит.
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR / 'auth',
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+}
+
+TEST_RUNNER = 'oneguardsite.testing.TestRunner'
+
+
+# Загрузка файлов через API (/api/clients/import/, /api/objects/import/) идет
+# внутри запроса: клиенты пишутся со скоростью ~1200 строк/с, и лимиты держат
+# загрузку в пределах таймаута воркера. Большие файлы - командой import_data.
+IMPORT_MAX_UPLOAD_SIZE = 5 * 1024 * 1024  # байт
+IMPORT_MAX_ROWS = 20000
+
+
+# Запись истории клиентов пакетами в фоновом потоке (clients/audit.py)
+CLIENT_HISTORY_ASYNC = True
+CLIENT_HISTORY_BATCH_SIZE = 100
+CLIENT_HISTORY_FLUSH_INTERVAL = 1.0  # с
+CLIENT_HISTORY_MAX_QUEUE = 10000
+
 
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -107,13 +196,30 @@ USE_TZ = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    # JSON через orjson; MessagePack по Accept/Content-Type application/msgpack,
+    # если установлен необязательный пакет msgpack (oneguardsite/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'oneguardsite.renderers.ORJSONRenderer',
+        *(['oneguardsite.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'oneguardsite.renderers.ORJSONParser',
+        *(['oneguardsite.renderers.MessagePackParser'] if find_spec('msgpack') else []),
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Ответы от этого размера сжимаются brotli (если установлен пакет brotli) или gzip
+COMPRESSION_MIN_SIZE = 1024  # байт
+BROTLI_QUALITY = 5  # 0-11: 5 сжимает почти как 11, но во много раз быстрее
+
 STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
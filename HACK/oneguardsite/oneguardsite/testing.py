@@ -0,0 +1,21 @@
+import shutil
+import tempfile
+from contextlib import ExitStack
+
+from django.test.runner import DiscoverRunner
+from .caching import cache_directory
+
+
+class TestRunner(DiscoverRunner):
+    """Тесты с кэшем во временном каталоге, а не в общем кэше сервера"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_stack = ExitStack()
+        directory = tempfile.mkdtemp(prefix='oneguardsite_cache_')
+        self.cache_stack.callback(shutil.rmtree, directory, ignore_errors=True)
+        self.cache_stack.enter_context(cache_directory(directory))
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_stack.close()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,184 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.functional import LazyObject
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Замеры текущего запроса; sync_to_async копирует контекст, поэтому запросы
+# к БД из потока асинхронного представления попадают в тот же объект
+_current = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """Замеры одного запроса: время по метрикам и запросы к БД"""
+    __slots__ = ('started', 'durations', 'queries', 'db_time', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.queries = 0
+        self.db_time = 0.0
+        # SQL -> [сколько раз, суммарное время]; параметры не различаем,
+        # поэтому N+1 видно как один и тот же SQL много раз
+        self.statements = {}
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+
+@contextmanager
+def measure(name):
+    """Добавляет время блока к метрике name текущего запроса (auth, serialize)"""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        timing.queries += 1
+        timing.db_time += elapsed
+        entry = timing.statements.get(sql)
+        if entry is None:
+            timing.statements[sql] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+
+def install_query_timer(connection):
+    # В начало списка: execute_wrapper() в тестах снимает последний элемент
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@receiver(connection_created)
+def time_new_connection(sender, connection, **kwargs):
+    install_query_timer(connection)
+
+
+def view_name(request):
+    """Имя представления: класс (ClientDataListView) или функция (client_reports)"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view = getattr(match.func, 'view_class', match.func)
+    return getattr(view, '__name__', match.view_name)
+
+
+class ServerTimingMiddleware:
+    """Заголовок Server-Timing по каждому запросу и журнал медленных запросов
+
+    Те же замеры попадают в гистограммы по имени маршрута (oneguardsite/metrics.py).
+    Метрики: total - весь запрос, db - запросы к БД (число в desc), auth -
+    проверка токена, serialize - рендеринг ответа в JSON, app - остальное
+    (код представления, в том числе to_representation сериализаторов).
+    Запросы дольше SLOW_REQUEST_THRESHOLD пишутся в журнал одной JSON-строкой
+    с именем представления и самыми повторяющимися SQL.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Соединения, открытые до загрузки middleware (например, при запуске тестов)
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timing = RequestTiming()
+        token = _current.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = RequestTiming()
+        token = _current.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing)
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся после представления: засекаем до и после render()
+        timing = _current.get()
+        if timing is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: timing.add('serialize', time.perf_counter() - started)
+            )
+        return response
+
+    def finish(self, request, response, timing):
+        total = time.perf_counter() - timing.started
+        auth = timing.durations.get('auth', 0.0)
+        serialize = timing.durations.get('serialize', 0.0)
+        app = max(total - timing.db_time - auth - serialize, 0.0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timing.db_time * 1000:.1f};desc="{timing.queries} SQL"',
+            f'auth;dur={auth * 1000:.1f}',
+            f'serialize;dur={serialize * 1000:.1f}',
+            f'app;dur={app * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD', 0.5)
+        if threshold is not None and total >= threshold:
+            self.log_slow_request(request, response, timing, total, auth, serialize)
+        metrics.record_request(request, response, total, timing.queries, timing.db_time)
+        return response
+
+    def log_slow_request(self, request, response, timing, total, auth, serialize):
+        top = sorted(timing.statements.items(), key=lambda item: item[1][0], reverse=True)
+        user = request.__dict__.get('user')
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view': view_name(request),
+            # Ленивого пользователя сессии не вычисляем - это лишний запрос
+            'user': None if user is None or isinstance(user, LazyObject) else user.pk,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(timing.db_time * 1000, 1),
+            'queries': timing.queries,
+            'auth_ms': round(auth * 1000, 1),
+            'serialize_ms': round(serialize * 1000, 1),
+            'top_sql': [
+                {'count': count, 'ms': round(elapsed * 1000, 1), 'sql': sql[:500]}
+                for sql, (count, elapsed) in top[:getattr(settings, 'SLOW_REQUEST_TOP_SQL', 3)]
+            ],
+        }
+        logger.warning('Медленный запрос: %s', json.dumps(record, ensure_ascii=False))
@@ -10,6 +10,7 @@ urlpatterns = [
     path('api/', include('users.urls')),
     path('api/', include('objects.urls')),
     path('api/', include('clients.urls')),
+    path('api/async/', include('oneguardsite.async_urls')),
 
 
     path('', TemplateView.as_view(template_name='index.html'), name='index'),
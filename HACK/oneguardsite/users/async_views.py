@@ -0,0 +1,9 @@
+from oneguardsite.async_api import async_api_view, render
+from .authentication import aget_user_instance
+from .serializers import UserSerializer
+
+
+@async_api_view
+async def current_user(request):
+    """Асинхронная версия /users/me/"""
+    return render(UserSerializer(await aget_user_instance(request.user)).data)
@@ -0,0 +1,167 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from oneguardsite import metrics
+from oneguardsite.timing import measure
+from .models import User
+
+
+# Поля пользователя, которые кладутся в токен
+USER_CLAIMS = ('username', 'role', 'first_name', 'last_name', 'city')
+
+# Сколько держать в кэше процесса полную модель пользователя и сколько
+# пользователей в нем помнить. Модель с хешем пароля не уходит в общий
+# кэш на диске: каждый воркер держит свою короткую копию в памяти
+USER_CACHE_TIMEOUT = 60
+USER_CACHE_SIZE = 1000
+
+# pk -> (момент устаревания по time.monotonic, пользователь)
+_user_cache = {}
+
+# Кэш с актуальными claims: общий для всех воркеров, см. CACHES в settings.py
+REVOCATION_CACHE = 'auth'
+
+# Признак «отзыва нет» при чтении кэша отзыва
+_NOT_REVOKED = object()
+
+
+def add_user_claims(token, user):
+    for claim, value in user_claims(user).items():
+        token[claim] = value
+    return token
+
+
+def _claims_key(user_id):
+    return f'users:claims:{user_id}'
+
+
+def user_claims(user):
+    return {claim: getattr(user, claim) for claim in USER_CLAIMS}
+
+
+def _cached_user(user_id):
+    entry = _user_cache.get(user_id)
+    instance = entry[1] if entry and entry[0] > time.monotonic() else None
+    metrics.record_cache('user', instance)
+    return instance
+
+
+def _remember_user(instance):
+    if len(_user_cache) >= USER_CACHE_SIZE:
+        # Сначала выбрасываем устаревшие, а если их нет - самые старые записи
+        now = time.monotonic()
+        for user_id, (expires, _) in list(_user_cache.items()):
+            if expires <= now:
+                _user_cache.pop(user_id, None)
+        for user_id in list(_user_cache)[:len(_user_cache) - USER_CACHE_SIZE + 1]:
+            _user_cache.pop(user_id, None)
+    _user_cache[instance.pk] = (time.monotonic() + USER_CACHE_TIMEOUT, instance)
+
+
+def clear_user_cache():
+    _user_cache.clear()
+
+
+def get_user_instance(user):
+    """Полная модель пользователя (из короткого кэша процесса, если пришел ClaimsUser)"""
+    if isinstance(user, User):
+        return user
+    instance = _cached_user(user.pk)
+    if instance is None:
+        instance = User.objects.get(pk=user.pk)
+        _remember_user(instance)
+    return instance
+
+
+async def aget_user_instance(user):
+    """get_user_instance для асинхронных представлений"""
+    if isinstance(user, User):
+        return user
+    instance = _cached_user(user.pk)
+    if instance is None:
+        instance = await User.objects.aget(pk=user.pk)
+        _remember_user(instance)
+    return instance
+
+
+def invalidate_user(user_id, claims=None):
+    """Сбрасывает кэш пользователя и отзывает access-токены с устаревшими claims
+
+    Пока выданные токены не истекли, помним актуальные claims: токен с другими
+    значениями отклоняется, клиент получает 401, обновляет токен и получает
+    claims с новой ролью. claims=None - пользователь удален или отключен.
+    Запись попадает в общий для воркеров кэш, поэтому отзыв действует сразу
+    во всех процессах, а не только в том, что сохранил пользователя; копия
+    модели в памяти других воркеров устаревает сама за USER_CACHE_TIMEOUT.
+    """
+    _user_cache.pop(user_id, None)
+    lifetime = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+    caches[REVOCATION_CACHE].set(_claims_key(user_id), claims, int(lifetime) + 1)
+
+
+class ClaimsUser(TokenUser):
+    """Пользователь, собранный из claims access-токена без запроса к БД"""
+
+    @cached_property
+    def id(self):
+        # simplejwt хранит id строкой, а модели и сравнения ждут число
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @property
+    def role(self):
+        return self.token['role']
+
+    def __str__(self):
+        return f"{self.username} ({dict(User.ROLE_CHOICES).get(self.role, self.role)})"
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWT-аутентификация без чтения пользователя из БД на каждый запрос
+
+    Роль и имя берутся из claims токена. Токены без claims (выданные до их
+    появления) по-прежнему проверяются через БД.
+    """
+
+    def authenticate(self, request):
+        with measure('auth'):
+            return super().authenticate(request)
+
+    @staticmethod
+    def has_claims(validated_token):
+        return all(claim in validated_token for claim in USER_CLAIMS)
+
+    def get_user(self, validated_token):
+        if not self.has_claims(validated_token):
+            return super().get_user(validated_token)
+
+        user = ClaimsUser(validated_token)
+        current = caches[REVOCATION_CACHE].get(_claims_key(user.pk), _NOT_REVOKED)
+        return self.check_claims(user, current)
+
+    async def aget_user(self, validated_token):
+        """get_user для асинхронных представлений: ни БД, ни кэш отзыва
+        не читаются синхронно в цикле событий"""
+        if not self.has_claims(validated_token):
+            return await sync_to_async(super().get_user)(validated_token)
+
+        user = ClaimsUser(validated_token)
+        current = await caches[REVOCATION_CACHE].aget(_claims_key(user.pk), _NOT_REVOKED)
+        return self.check_claims(user, current)
+
+    @staticmethod
+    def check_claims(user, current):
+        """Отклоняет токен, если claims пользователя с тех пор изменились"""
+        if current is not _NOT_REVOKED and current != {
+            claim: user.token[claim] for claim in USER_CLAIMS
+        }:
+            raise AuthenticationFailed(
+                'Данные пользователя изменились, обновите токен',
+                code='user_changed'
+            )
+        return user
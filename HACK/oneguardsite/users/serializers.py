@@ -1,7 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import add_user_claims
 from .models import User
+from .statistics import GRANULARITIES
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -62,6 +65,11 @@ class LoginSerializer(serializers.Serializer):
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Роль и имя в самом токене: запросам не нужно читать пользователя из БД
+        return add_user_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         data = super().validate(attrs)
 
@@ -75,4 +83,30 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
             'last_name': self.user.last_name
         })
 
-        return data
\ No newline at end of file
+        return data
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+
+        # Claims берем из БД, а не из refresh-токена: роль могла измениться
+        access = AccessToken(data['access'])
+        user = User.objects.filter(pk=access['user_id']).first()
+        if user is not None:
+            data['access'] = str(add_user_claims(access, user))
+
+        return data
+
+
+class UserStatisticsQuerySerializer(serializers.Serializer):
+    # Период продуктивности инженеров и разбивка по дням, неделям или месяцам
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    granularity = serializers.ChoiceField(choices=GRANULARITIES, required=False, default='total')
+
+    def validate(self, attrs):
+        date_from, date_to = attrs.get('date_from'), attrs.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError({'date_to': 'Дата окончания раньше даты начала'})
+        return attrs
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from clients.cache import bump_data_version
+from .authentication import invalidate_user, user_claims
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_claims(sender, instance, **kwargs):
+    # Отключенный пользователь теряет доступ сразу, не дожидаясь истечения токена
+    invalidate_user(instance.pk, user_claims(instance) if instance.is_active else None)
+
+
+# Поля, от которых зависит статистика пользователей (users/statistics.py);
+# сохранение одного last_login при входе кэш не сбрасывает
+STATISTICS_FIELDS = {'username', 'first_name', 'last_name', 'role', 'city'}
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_statistics(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or STATISTICS_FIELDS & set(update_fields):
+        bump_data_version()
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+    bump_data_version()
@@ -0,0 +1,120 @@
+import datetime
+
+from django.core.cache import cache
+from django.db.models import Count, FilteredRelation, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from clients.cache import versioned_key
+from oneguardsite import metrics
+from .models import User
+
+
+STATISTICS_CACHE_TIMEOUT = 10 * 60
+
+GRANULARITIES = ['total', 'day', 'week', 'month']
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def statistics_rows(date_from=None, date_to=None, granularity='total'):
+    """Пользователи с показателями их клиентов за период - одним запросом
+
+    Условие по датам стоит в ON соединения (FilteredRelation), поэтому
+    пользователи без записей за период тоже попадают в результат, а записи
+    выбираются по индексу (engineer, created_at). С granularity строка
+    приходится на пару (пользователь, период).
+    """
+    condition = Q()
+    if date_from:
+        condition &= Q(clientdata__created_at__gte=_day_start(date_from))
+    if date_to:
+        condition &= Q(clientdata__created_at__lt=_day_start(date_to + datetime.timedelta(days=1)))
+
+    fields = ['id', 'username', 'first_name', 'last_name', 'role', 'city']
+    queryset = User.objects.annotate(visit=FilteredRelation('clientdata', condition=condition))
+    if granularity != 'total':
+        queryset = queryset.annotate(period=Trunc('visit__created_at', granularity))
+        fields.append('period')
+    return (
+        queryset
+        .values(*fields)
+        .annotate(
+            clients=Count('visit'),
+            rating_sum=Sum('visit__provider_rating'),
+            rating_count=Count('visit__provider_rating'),
+            interested=Count('visit', filter=~Q(visit__interested_services_mask=0)),
+        )
+        .order_by(*fields)
+    )
+
+
+def _productivity(clients, rating_sum, rating_count, interested):
+    return {
+        'clients': clients,
+        'average_rating': round(rating_sum / rating_count, 2) if rating_count else None,
+        'interested_share': round(interested / clients, 3) if clients else None,
+    }
+
+
+def build_user_statistics(date_from=None, date_to=None, granularity='total'):
+    """Роли, пользователи по городам и продуктивность инженеров за один проход"""
+    users = {}
+    totals = {}
+    periods = {}
+    for row in statistics_rows(date_from, date_to, granularity):
+        user = users.setdefault(row['id'], row)
+        total = totals.setdefault(row['id'], [0, 0, 0, 0])
+        for index, field in enumerate(['clients', 'rating_sum', 'rating_count', 'interested']):
+            total[index] += row[field] or 0
+        if row.get('period') is not None:
+            periods.setdefault(user['id'], []).append({
+                # Начало периода в местной зоне: день, понедельник недели или 1-е число
+                'period': row['period'].date(),
+                **_productivity(row['clients'], row['rating_sum'] or 0, row['rating_count'], row['interested']),
+            })
+
+    roles = {}
+    cities = {}
+    productivity = []
+    for user in users.values():
+        roles[user['role']] = roles.get(user['role'], 0) + 1
+        cities[user['city']] = cities.get(user['city'], 0) + 1
+        clients = totals[user['id']][0]
+        # Администраторы попадают в список, только если сами вносили клиентов
+        if user['role'] != 'engineer' and not clients:
+            continue
+        entry = {
+            'engineer': user['id'],
+            'username': user['username'],
+            'name': f'{user["first_name"]} {user["last_name"]}'.strip() or user['username'],
+            'city': user['city'],
+            **_productivity(*totals[user['id']]),
+        }
+        if granularity != 'total':
+            entry['periods'] = periods.get(user['id'], [])
+        productivity.append(entry)
+    productivity.sort(key=lambda entry: (-entry['clients'], entry['engineer']))
+
+    return {
+        'total_users': len(users),
+        'engineers_count': roles.get('engineer', 0),
+        'admins_count': roles.get('admin', 0),
+        'users_by_city': [{'city': city, 'count': count} for city, count in sorted(cities.items())],
+        'date_from': date_from,
+        'date_to': date_to,
+        'granularity': granularity,
+        'productivity': productivity,
+    }
+
+
+def get_user_statistics(date_from=None, date_to=None, granularity='total'):
+    """Закэшированная статистика (сбрасывается с версией данных клиентов)"""
+    key = versioned_key('users', 'statistics', date_from, date_to, granularity)
+    data = cache.get(key)
+    metrics.record_cache('user-statistics', data)
+    if data is None:
+        data = build_user_statistics(date_from, date_to, granularity)
+        cache.set(key, data, STATISTICS_CACHE_TIMEOUT)
+    return data
@@ -1,3 +1,149 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.db.models import Avg, Count
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from clients.models import ClientData
+from clients.tests import QueryCountTestCase, SeededTestCase
+from .authentication import REVOCATION_CACHE, _claims_key
+from .serializers import CustomTokenObtainPairSerializer
+
+
+class UserQueryCountTests(QueryCountTestCase):
+    def test_user_list(self):
+        response = self.assertQueries(1, reverse('user-list'))
+        self.assertEqual(len(response.data), 4)
+
+    def test_current_user(self):
+        self.assertQueries(1, reverse('current-user'))
+        # полная модель берется из короткого кэша
+        self.assertQueries(0, reverse('current-user'))
+
+    def test_current_user_cache_in_process(self):
+        self.assertQueries(1, reverse('current-user'))
+        # Модель с хешем пароля не попадает в общие кэши на диске
+        for backend in caches.all():
+            self.assertIsNone(backend.get(f'users:user:{self.admin.pk}'))
+        # Сохранение пользователя сбрасывает копию в памяти
+        self.admin.phone = '+7 900 555-00-00'
+        self.admin.save()
+        response = self.assertQueries(1, reverse('current-user'))
+        self.assertEqual(response.data['phone'], '+7 900 555-00-00')
+
+    def test_user_detail(self):
+        self.assertQueries(1, reverse('user-detail', args=[self.engineers[0].pk]))
+
+    def test_token_without_claims(self):
+        # Токены, выданные до появления claims, проверяются через БД
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertQueries(2, reverse('user-list'))
+
+
+class ClaimsAuthenticationTests(SeededTestCase):
+    def test_role_change_revokes_access_token(self):
+        engineer = self.engineers[0]
+        refresh = CustomTokenObtainPairSerializer.get_token(engineer)
+        self.authenticate(engineer)
+        self.assertEqual(self.client.get(reverse('user-statistics')).status_code, 403)
+
+        engineer.role = 'admin'
+        engineer.save()
+        self.assertEqual(self.client.get(reverse('user-statistics')).status_code, 401)
+
+        # обновленный токен несет новую роль
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)})
+        self.assertEqual(AccessToken(response.data['access'])['role'], 'admin')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get(reverse('user-statistics')).status_code, 200)
+
+    def test_revocation_shared_between_workers(self):
+        engineer = self.engineers[0]
+        self.authenticate(engineer)
+        engineer.is_active = False
+        engineer.save()
+        # Другой воркер - отдельный экземпляр кэша с теми же настройками
+        other_worker = caches.create_connection(REVOCATION_CACHE)
+        self.assertIsNone(other_worker.get(_claims_key(engineer.pk), 'missing'))
+        # Чистка кэша отчетов отзыв не теряет
+        cache.clear()
+        self.assertEqual(self.client.get(reverse('current-user')).status_code, 401)
+
+    def test_async_current_user(self):
+        self.authenticate(self.engineers[0])
+        expected = self.client.get(reverse('current-user')).json()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('async-current-user'))
+        self.assertEqual(response.json(), expected)
+
+    def test_async_revoked_token(self):
+        engineer = self.engineers[0]
+        self.authenticate(engineer)
+        engineer.role = 'admin'
+        engineer.save()
+        # Отзыв читается из кэша асинхронно, но действует так же
+        self.assertEqual(self.client.get(reverse('async-current-user')).status_code, 401)
+
+        # Токен без claims проверяется через БД
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get(reverse('async-current-user')).json()['username'], 'admin')
+
+
+class UserStatisticsTests(QueryCountTestCase):
+    def test_statistics(self):
+        # пользователи вместе с клиентами - одним сгруппированным запросом
+        response = self.assertQueries(1, reverse('user-statistics'))
+        self.assertEqual(
+            (response.data['total_users'], response.data['engineers_count'], response.data['admins_count']),
+            (4, 3, 1)
+        )
+        self.assertIn({'city': 'Город 0', 'count': 1}, response.data['users_by_city'])
+
+        engineer = self.engineers[0]
+        expected = ClientData.objects.filter(engineer=engineer).aggregate(
+            clients=Count('id'), rating=Avg('provider_rating'),
+        )
+        interested = sum(
+            1 for services in ClientData.objects.filter(engineer=engineer).values_list('interested_services', flat=True)
+            if services
+        )
+        row = next(entry for entry in response.data['productivity'] if entry['engineer'] == engineer.pk)
+        self.assertEqual(row['clients'], expected['clients'])
+        self.assertEqual(row['average_rating'], round(expected['rating'], 2))
+        self.assertEqual(row['interested_share'], round(interested / expected['clients'], 3))
+        self.assertEqual(len(response.data['productivity']), 3)
+
+        # повтор - из кэша, новая запись клиента его сбрасывает
+        self.assertQueries(0, reverse('user-statistics'))
+        self.client.post(reverse('client-list'), {
+            'building_object': self.building_objects[0].pk, 'apartment_number': '900',
+            'contact_phone': '+7 900 000-00-00',
+        }, format='json')
+        response = self.assertQueries(1, reverse('user-statistics'))
+        self.assertEqual(response.data['productivity'][-1]['engineer'], self.admin.pk)
+
+    def test_statistics_by_period(self):
+        engineer = self.engineers[0]
+        today = timezone.localdate()
+        old = ClientData.objects.filter(engineer=engineer)[:5]
+        ClientData.objects.filter(pk__in=[client.pk for client in old]).update(
+            created_at=timezone.now() - datetime.timedelta(days=40)
+        )
+        response = self.assertQueries(
+            1, reverse('user-statistics'),
+            date_from=today - datetime.timedelta(days=7), date_to=today, granularity='day'
+        )
+        row = next(entry for entry in response.data['productivity'] if entry['engineer'] == engineer.pk)
+        self.assertEqual(row['clients'], ClientData.objects.filter(engineer=engineer).count() - 5)
+        self.assertEqual(row['periods'], [{
+            'period': today, 'clients': row['clients'],
+            'average_rating': row['average_rating'], 'interested_share': row['interested_share'],
+        }])
+
+        response = self.client.get(reverse('user-statistics'), {'date_from': today, 'date_to': today - datetime.timedelta(days=1)})
+        self.assertEqual(response.status_code, 400)
+        self.authenticate(engineer)
+        self.assertEqual(self.client.get(reverse('user-statistics')).status_code, 403)
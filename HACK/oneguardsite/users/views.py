@@ -1,20 +1,27 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.db import transaction
-from django.db.models import Count
+from oneguardsite.db import WriteTransactionMixin, is_lock_error, write_transaction
 from .models import User
 from .serializers import (
     UserSerializer, UserCreateSerializer,
-    LoginSerializer, CustomTokenObtainPairSerializer
+    LoginSerializer, CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer,
+    UserStatisticsQuerySerializer
 )
+from .authentication import get_user_instance
+from .statistics import get_user_statistics
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
+
 class UserListView(generics.ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -29,7 +36,7 @@ class UserListView(generics.ListAPIView):
             return User.objects.filter(id=user.id)
 
 
-class UserCreateView(generics.CreateAPIView):
+class UserCreateView(WriteTransactionMixin, generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -41,7 +48,7 @@ class UserCreateView(generics.CreateAPIView):
         serializer.save()
 
 
-class UserDetailView(generics.RetrieveUpdateAPIView):
+class UserDetailView(WriteTransactionMixin, generics.RetrieveUpdateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -60,11 +67,12 @@ class CurrentUserView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        return get_user_instance(self.request.user)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@write_transaction
 def register_engineer(request):
     """Регистрация нового инженера (доступно без авторизации)"""
     serializer = UserCreateSerializer(data=request.data)
@@ -82,6 +90,9 @@ def register_engineer(request):
                 }, status=status.HTTP_201_CREATED)
 
         except Exception as e:
+            if is_lock_error(e):
+                # Базу занял другой процесс - запрос целиком повторит write_transaction
+                raise
             return Response(
                 {'error': f'Ошибка при создании пользователя: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -93,20 +104,13 @@ def register_engineer(request):
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_statistics(request):
-    """Статистика пользователей (только для администраторов)"""
+    """Статистика пользователей и продуктивность инженеров (только для администраторов)"""
     if request.user.role != 'admin':
         return Response(
             {'error': 'Только администраторы могут просматривать статистику'},
             status=status.HTTP_403_FORBIDDEN
         )
 
-    total_users = User.objects.count()
-    engineers_count = User.objects.filter(role='engineer').count()
-    admins_count = User.objects.filter(role='admin').count()
-
-    return Response({
-        'total_users': total_users,
-        'engineers_count': engineers_count,
-        'admins_count': admins_count,
-        'users_by_city': User.objects.values('city').annotate(count=Count('id'))
-    })
\ No newline at end of file
+    params = UserStatisticsQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    return Response(get_user_statistics(**params.validated_data))
\ No newline at end of file